@@ -0,0 +1,213 @@
+"""
+📊 Agregações de relatórios - Quilometragem por veículo e por motorista
+
+Os totais de /relatorios são calculados no banco (GROUP BY placa e
+GROUP BY motorista_id sobre km_chegada - km_saida), com os filtros de
+período, veículo, motorista e evento aplicados na própria consulta.
+
+Sem filtros, com RELATORIOS_ROLLUPS ligado, os totais vêm de
+`rollups_diarios` (ver rollups.py): algumas linhas por dia em vez das
+viagens do período. Os filtros de motorista e evento são buscas por
+trecho de texto e combinam dimensões, então os relatórios filtrados
+continuam agregando as viagens.
+
+Cada resultado fica no cache da aplicação (Flask-Caching) sob uma chave
+com o período e os filtros. As chaves incluem uma geração que é
+trocada quando uma viagem é finalizada, o que invalida todos os
+relatórios de uma vez sem precisar listar as chaves existentes.
+"""
+
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import func, or_
+
+import rollups
+from models import db, Usuario, Viagem
+
+CHAVE_GERACAO = 'relatorio_km:geracao'
+TIMEOUT_CACHE = 600  # segundos
+
+TIPOS_PERIODO = ('dia', 'semana', 'mes', 'intervalo')
+
+
+@dataclass(frozen=True)
+class Periodo:
+    """Intervalo de datas de saída das viagens, com as duas pontas inclusivas"""
+    inicio: date
+    fim: date
+
+    @classmethod
+    def do_dia(cls, dia):
+        return cls(dia, dia)
+
+    @classmethod
+    def da_semana(cls, dia):
+        """Semana de segunda a domingo que contém o dia"""
+        inicio = dia - timedelta(days=dia.weekday())
+        return cls(inicio, inicio + timedelta(days=6))
+
+    @classmethod
+    def do_mes(cls, dia):
+        inicio = dia.replace(day=1)
+        proximo = (inicio + timedelta(days=32)).replace(day=1)
+        return cls(inicio, proximo - timedelta(days=1))
+
+    def rotulo(self):
+        if self.inicio == self.fim:
+            return self.inicio.strftime('%d/%m/%Y')
+        return f'{self.inicio.strftime("%d/%m/%Y")} a {self.fim.strftime("%d/%m/%Y")}'
+
+
+def resolver_periodo(tipo='dia', dia=None, de=None, ate=None):
+    """Monta o Periodo pedido na tela de relatórios.
+
+    `dia` é a data de referência para dia/semana/mês; `de`/`ate` definem um
+    intervalo livre (ex: a duração de um evento). Datas ausentes caem para
+    hoje e um intervalo invertido é corrigido.
+    """
+    dia = dia or date.today()
+    if tipo == 'semana':
+        return Periodo.da_semana(dia)
+    if tipo == 'mes':
+        return Periodo.do_mes(dia)
+    if tipo == 'intervalo':
+        inicio, fim = de or ate or dia, ate or de or dia
+        return Periodo(min(inicio, fim), max(inicio, fim))
+    return Periodo.do_dia(dia)
+
+
+def _filtros(periodo, placa=None, motorista=None, evento=None):
+    """Condições WHERE comuns às duas agregações"""
+    condicoes = [
+        Viagem.data_chegada != None,
+        Viagem.data_saida >= datetime.combine(periodo.inicio, time.min),
+        Viagem.data_saida < datetime.combine(periodo.fim + timedelta(days=1), time.min),
+    ]
+    if placa:
+        condicoes.append(Viagem.placa == placa.strip().upper())
+    if motorista:
+        termo = f'%{motorista.strip()}%'
+        condicoes.append(Viagem.motorista_id.in_(
+            db.select(Usuario.id).where(or_(Usuario.nome.ilike(termo), Usuario.email.ilike(termo)))
+        ))
+    if evento:
+        condicoes.append(Viagem.producao_evento.ilike(f'%{evento.strip()}%'))
+    return condicoes
+
+
+def calcular_relatorio_km(periodo, placa=None, motorista=None, evento=None):
+    """Executa as agregações no banco, sem cache.
+
+    Retorna {'viagens_total', 'km_por_veiculo', 'km_por_motorista'}; os
+    motoristas são identificados pelo nome (ou email, se não houver nome).
+    """
+    condicoes = _filtros(periodo, placa, motorista, evento)
+    km = func.coalesce(func.sum(Viagem.km_chegada - Viagem.km_saida), 0)
+
+    por_placa = db.session.execute(
+        db.select(Viagem.placa, km, func.count(Viagem.id))
+        .where(*condicoes)
+        .group_by(Viagem.placa)
+    ).all()
+
+    por_motorista = db.session.execute(
+        db.select(Viagem.motorista_id, func.coalesce(Usuario.nome, Usuario.email), km)
+        .outerjoin(Usuario, Usuario.id == Viagem.motorista_id)
+        .where(*condicoes)
+        .group_by(Viagem.motorista_id, Usuario.nome, Usuario.email)
+    ).all()
+
+    km_por_motorista = {}
+    for _, nome, total in por_motorista:
+        nome = nome or 'N/A'
+        km_por_motorista[nome] = km_por_motorista.get(nome, 0) + float(total)
+
+    return {
+        'viagens_total': sum(quantidade for _, _, quantidade in por_placa),
+        'km_por_veiculo': {placa: float(total) for placa, total, _ in por_placa},
+        'km_por_motorista': km_por_motorista,
+    }
+
+
+def relatorio_dos_rollups(periodo):
+    """O relatório sem filtros (mesmo formato de calcular_relatorio_km), somando rollups_diarios"""
+    por_placa = rollups.totais(rollups.VEICULO, periodo.inicio, periodo.fim)
+    por_motorista = rollups.totais(rollups.MOTORISTA, periodo.inicio, periodo.fim)
+    nomes = dict(db.session.execute(
+        db.select(Usuario.id, func.coalesce(Usuario.nome, Usuario.email)).where(Usuario.id.in_(list(por_motorista)))
+    ).all()) if por_motorista else {}
+
+    km_por_motorista = {}
+    for motorista_id, metricas in por_motorista.items():
+        if metricas['viagens']:
+            nome = nomes.get(motorista_id) or 'N/A'
+            km_por_motorista[nome] = km_por_motorista.get(nome, 0) + float(metricas['km'])
+
+    # Linhas de veículo só com abastecimento/manutenção (0 viagens) ficam de fora, como no GROUP BY das viagens
+    return {
+        'viagens_total': sum(int(metricas['viagens']) for metricas in por_placa.values()),
+        'km_por_veiculo': {placa: float(metricas['km']) for placa, metricas in por_placa.items() if metricas['viagens']},
+        'km_por_motorista': km_por_motorista,
+    }
+
+
+def _calcular(periodo, placa=None, motorista=None, evento=None):
+    if not (placa or motorista or evento) and has_app_context() and current_app.config.get('RELATORIOS_ROLLUPS'):
+        return relatorio_dos_rollups(periodo)
+    return calcular_relatorio_km(periodo, placa, motorista, evento)
+
+
+# ==================== CACHE ====================
+
+def _cache():
+    """Backend do Flask-Caching da aplicação atual, se houver"""
+    if not has_app_context():
+        return None
+    backends = current_app.extensions.get('cache') or {}
+    return next(iter(backends.values()), None)
+
+
+def _nova_geracao():
+    # Valor único em vez de um contador: se a chave da geração expirar ou for
+    # despejada do cache, a nova geração nunca coincide com uma anterior
+    return uuid.uuid4().hex
+
+
+def _geracao(cache):
+    geracao = cache.get(CHAVE_GERACAO)
+    if geracao is None:
+        cache.add(CHAVE_GERACAO, _nova_geracao(), timeout=0)
+        geracao = cache.get(CHAVE_GERACAO)
+    return geracao
+
+
+def chave_relatorio(geracao, periodo, placa=None, motorista=None, evento=None):
+    partes = [periodo.inicio.isoformat(), periodo.fim.isoformat(),
+              (placa or '').strip().upper(), (motorista or '').strip().lower(),
+              (evento or '').strip().lower()]
+    return f'relatorio_km:{geracao}:' + '|'.join(partes)
+
+
+def relatorio_km(periodo, placa=None, motorista=None, evento=None):
+    """Relatório de quilometragem do período, lido do cache quando possível"""
+    cache = _cache()
+    if cache is None:
+        return _calcular(periodo, placa, motorista, evento)
+
+    chave = chave_relatorio(_geracao(cache), periodo, placa, motorista, evento)
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = _calcular(periodo, placa, motorista, evento)
+        cache.set(chave, resultado, timeout=TIMEOUT_CACHE)
+    return resultado
+
+
+def invalidar_relatorios():
+    """Descarta os relatórios em cache (chamar ao finalizar uma viagem)"""
+    cache = _cache()
+    if cache is None:
+        return
+    cache.set(CHAVE_GERACAO, _nova_geracao(), timeout=0)
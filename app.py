@@ -4,15 +4,17 @@ Versão 2.0 - PostgreSQL + Redis + SQLAlchemy
 Sprint 1 - Nova Arquitetura
 """
 import os
+import click
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 # pytz substituído por zoneinfo nativa
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_migrate import Migrate
 from flask_caching import Cache
 from flask_bcrypt import Bcrypt
+from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
 import logging
 from logging.handlers import RotatingFileHandler
@@ -33,6 +35,10 @@ else:
 app = Flask(__name__)
 app.config.from_object(Config)
 
+import config as configuracao
+configuracao.verificar_banco(app.config, config_name)
+configuracao.definir_secret_key(app, config_name)
+
 # Importar modelos primeiro
 import models
 from models import db, bcrypt as models_bcrypt
@@ -42,8 +48,33 @@ db.init_app(app)
 models_bcrypt.init_app(app)
 migrate = Migrate(app, db)
 
+# Réplica de leitura (DATABASE_REPLICA_URL): usada pelas rotas @somente_leitura
+import replicas
+from replicas import somente_leitura
+roteador_replica = replicas.RoteadorReplica(app, db)
+
+# Com PgBouncer o statement_timeout não vai na abertura da conexão: é aplicado por transação
+if app.config.get('DB_PGBOUNCER') and app.config.get('DB_STATEMENT_TIMEOUT_MS'):
+    with app.app_context():
+        for engine in (db.engine, roteador_replica.engine):
+            if engine is not None and engine.dialect.name == 'postgresql':
+                configuracao.registrar_timeout_por_transacao(engine, app.config['DB_STATEMENT_TIMEOUT_MS'])
+
 # Importar classes de modelo
 from models import Usuario, Veiculo, Agendamento, Viagem, Manutencao, Abastecimento, Auditoria
+from status import StatusVeiculo, StatusViagem, StatusAgendamento
+import resumo_frota
+import conflitos
+import consultas
+import agregacoes
+import rollups
+import cache_usuarios
+import sessoes
+import senhas
+import limites
+import auditoria
+import particoes
+import exportacao
 
 # Database - já inicializado acima
 # db = SQLAlchemy(app)
@@ -51,7 +82,7 @@ from models import Usuario, Veiculo, Agendamento, Viagem, Manutencao, Abastecime
 # bcrypt = Bcrypt(app)
 
 # Cache
-cache = Cache(app, config={'CACHE_TYPE': app.config.get('CACHE_TYPE', 'simple')})
+cache = Cache(app, config={'CACHE_TYPE': app.config.get('CACHE_TYPE', 'SimpleCache')})
 
 # Login Manager
 login_manager = LoginManager()
@@ -81,52 +112,89 @@ if not app.debug and not app.testing:
     app.logger.setLevel(logging.INFO)
     app.logger.info('🚀 Frota Globo iniciando...')
 
+# Cache de usuários do Flask-Login (LRU em memória + Redis opcional)
+usuarios_cache = cache_usuarios.criar_cache(
+    app.config.get('CACHE_TYPE'),
+    app.config.get('CACHE_REDIS_URL'),
+    ttl=app.config.get('CACHE_USUARIOS_TTL', cache_usuarios.TTL_PADRAO),
+    max_itens=app.config.get('CACHE_USUARIOS_MAX', cache_usuarios.MAX_ITENS_PADRAO)
+)
+cache_usuarios.registrar_invalidacao_orm(usuarios_cache)
+
+# Sessões no servidor: o cookie só leva o id, e o usuário logado fica na sessão
+app.session_interface = sessoes.criar_interface(app.config.get('SESSION_REDIS_URL'), config_name)
+
+# Hash de senhas com o algoritmo/custo configurados, em pool de threads limitado
+senhas.configurar(app.config)
+
+# Limites de tentativas de login (Flask-Limiter, RATELIMIT_STORAGE_URL)
+limites.iniciar(app)
+
+# Trilha de auditoria de Veiculo/Agendamento/Viagem, gravada em lote fora da requisição
+escritor_auditoria = auditoria.iniciar(app, db)
+
 @login_manager.user_loader
 def load_user(user_id):
-    from sqlalchemy import select
-    stmt = select(Usuario).where(Usuario.id == user_id)
-    return db.session.execute(stmt).scalar_one_or_none()
+    return sessoes.carregar_principal(usuarios_cache, user_id, ttl=app.config.get('SESSAO_PRINCIPAL_TTL', 60))
 
 # ==================== CONTEXT PROCESSOR ====================
 @app.context_processor
 def inject_now():
     return {'now': datetime.now(TZ)}
 
+@app.template_filter('format_date')
+def format_date_filter(valor, format='%d/%m/%Y'):
+    """Formata datas (datetime ou string ISO) no padrão brasileiro"""
+    if not valor:
+        return 'N/A'
+    if isinstance(valor, str):
+        try:
+            valor = datetime.fromisoformat(valor)
+        except ValueError:
+            return valor
+    return valor.strftime(format)
+
+# Guarda de N+1 nos testes: falha requisições com SQL demais
+if app.config.get('SQL_MAX_QUERIES_POR_REQUEST'):
+    consultas.registrar_guarda_sql(app, app.config['SQL_MAX_QUERIES_POR_REQUEST'])
+
 # ==================== ROUTES ====================
 
 @app.route('/')
+@somente_leitura
 def index():
     """Dashboard principal"""
     if not current_user.is_authenticated:
         return redirect(url_for('login'))
     
     now = datetime.now(TZ)
+    page = max(request.args.get('page', 1, type=int), 1)
+    por_pagina = 10
     
-    # Estatísticas e dados detalhados
-    veiculos_disponiveis = db.session.execute(
-        db.select(Veiculo).where(db.func.lower(Veiculo.status) == 'disponível').order_by(Veiculo.placa)
-    ).scalars().all()
-    viagens_em_rota = db.session.execute(
-        db.select(Viagem)
-        .where(Viagem.data_chegada == None, db.func.lower(Viagem.status) == 'em andamento')
-        .order_by(Viagem.data_saida.desc())
-    ).scalars().all()
+    # Estatísticas: contadores materializados (mantidos pelas rotas de escrita)
+    resumo = resumo_frota.obter_resumo(now.date())
     
-    viagens_hoje = db.session.query(Viagem).filter(
-        db.func.date(Viagem.data_saida) == now.date()
-    ).count()
+    # Listas detalhadas limitadas a uma página
+    veiculos_disponiveis = consultas.veiculos_disponiveis(limite=por_pagina, offset=(page - 1) * por_pagina)
+    viagens_em_rota = consultas.viagens_em_rota(limite=por_pagina, offset=(page - 1) * por_pagina)
+    
+    maior_lista = max(resumo['veiculos_disponiveis'], resumo['viagens_em_rota'])
+    total_pages = max((maior_lista + por_pagina - 1) // por_pagina, 1)
     
     return render_template(
         'index.html',
-        veiculos_disponiveis=len(veiculos_disponiveis),
-        viagens_em_rota=len(viagens_em_rota),
-        viagens_hoje=viagens_hoje,
+        veiculos_disponiveis=resumo['veiculos_disponiveis'],
+        viagens_em_rota=resumo['viagens_em_rota'],
+        viagens_hoje=resumo['viagens_hoje'],
         veiculos_disponiveis_lista=veiculos_disponiveis,
         viagens_em_rota_lista=viagens_em_rota,
+        page=page,
+        total_pages=total_pages,
         usuario=current_user
     )
 
 @app.route('/login', methods=['GET', 'POST'])
+@limites.limitar_login
 def login():
     """Login de usuários"""
     if current_user.is_authenticated:
@@ -143,6 +211,9 @@ def login():
         usuario = db.session.execute(stmt).scalar_one_or_none()
         
         if usuario and usuario.verificar_senha(password) and usuario.ativo:
+            if usuario in db.session.dirty:
+                db.session.commit()  # hash regravado com o algoritmo/custo atuais
+            sessoes.entrar(usuario)
             login_user(usuario, remember=request.form.get('lembrar'))
             app.logger.info(f'✅ Usuário {username} fez login')
             return redirect(request.args.get('next') or url_for('index'))
@@ -185,6 +256,7 @@ def editar_perfil():
                 current_user.telefone = telefone
             
             db.session.commit()
+            sessoes.guardar_principal(current_user)
             flash('Perfil atualizado com sucesso!', 'success')
             app.logger.info(f'✏️ Usuário {current_user.email} atualizou seu perfil')
             return redirect(url_for('editar_perfil'))
@@ -201,9 +273,7 @@ def editar_perfil():
 def agendamentos():
     """Lista agendamentos"""
     page = request.args.get('page', 1, type=int)
-    from sqlalchemy import select
-    stmt = select(Agendamento)
-    agendamentos_page = db.paginate(stmt, page=page, per_page=20)
+    agendamentos_page = consultas.agendamentos_paginados(page, per_page=20)
     
     return render_template('agendamentos.html', 
                          agendamentos=agendamentos_page.items,
@@ -214,11 +284,8 @@ def agendamentos():
 @login_required
 def cronograma():
     """Cronograma de viagens"""
-    from sqlalchemy import select
-    
-    # Buscar viagens em andamento (sem chegada)
-    stmt = select(Viagem).where(Viagem.data_chegada == None).order_by(Viagem.data_saida.desc())
-    viagens = db.session.execute(stmt).scalars().all()
+    # Buscar viagens em andamento (sem chegada), já com motorista e veículo
+    viagens = consultas.viagens_em_aberto()
     
     return render_template('cronograma.html', viagens=viagens)
 
@@ -226,18 +293,14 @@ def cronograma():
 @login_required
 def registrar_saida():
     """Registrar saída de veículo"""
-    from sqlalchemy import select
-    
+
+    def formulario():
+        """Formulário com os agendamentos confirmados e os motoristas"""
+        return render_template('registrar_saida.html', agendamentos=consultas.agendamentos_confirmados(),
+                               motoristas=consultas.motoristas())
+
     if request.method == 'GET':
-        # Buscar agendamentos confirmados
-        stmt = select(Agendamento).where(Agendamento.status == 'Confirmado')
-        agendamentos = db.session.execute(stmt).scalars().all()
-        
-        # Buscar motoristas
-        stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-        motoristas = db.session.execute(stmt_motoristas).scalars().all()
-        
-        return render_template('registrar_saida.html', agendamentos=agendamentos, motoristas=motoristas)
+        return formulario()
     
     elif request.method == 'POST':
         try:
@@ -249,39 +312,23 @@ def registrar_saida():
             # Validar dados
             if not agendamento_id or not km_inicial or not motorista_id:
                 flash('Agendamento, motorista e KM inicial são obrigatórios', 'danger')
-                stmt = select(Agendamento).where(Agendamento.status == 'Confirmado')
-                agendamentos = db.session.execute(stmt).scalars().all()
-                stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-                motoristas = db.session.execute(stmt_motoristas).scalars().all()
-                return render_template('registrar_saida.html', agendamentos=agendamentos, motoristas=motoristas)
+                return formulario()
             
             # Buscar agendamento
             agendamento = db.session.get(Agendamento, int(agendamento_id))
             if not agendamento:
                 flash('Agendamento não encontrado', 'danger')
-                stmt = select(Agendamento).where(Agendamento.status == 'Confirmado')
-                agendamentos = db.session.execute(stmt).scalars().all()
-                stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-                motoristas = db.session.execute(stmt_motoristas).scalars().all()
-                return render_template('registrar_saida.html', agendamentos=agendamentos, motoristas=motoristas)
+                return formulario()
             
-            if agendamento.status != 'Confirmado':
+            if agendamento.status != StatusAgendamento.CONFIRMADO:
                 flash('Agendamento não está confirmado', 'danger')
-                stmt = select(Agendamento).where(Agendamento.status == 'Confirmado')
-                agendamentos = db.session.execute(stmt).scalars().all()
-                stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-                motoristas = db.session.execute(stmt_motoristas).scalars().all()
-                return render_template('registrar_saida.html', agendamentos=agendamentos, motoristas=motoristas)
+                return formulario()
             
             # Verificar se motorista existe
             motorista = db.session.get(Usuario, motorista_id)
             if not motorista or motorista.role != 'motorista':
                 flash('Motorista não encontrado ou inválido', 'danger')
-                stmt = select(Agendamento).where(Agendamento.status == 'Confirmado')
-                agendamentos = db.session.execute(stmt).scalars().all()
-                stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-                motoristas = db.session.execute(stmt_motoristas).scalars().all()
-                return render_template('registrar_saida.html', agendamentos=agendamentos, motoristas=motoristas)
+                return formulario()
             
             # Criar viagem
             viagem = Viagem(
@@ -292,13 +339,14 @@ def registrar_saida():
                 km_saida=float(km_inicial),
                 destino=agendamento.destinos,
                 observacoes=observacoes,
-                status='Em Andamento'
+                status=StatusViagem.EM_ANDAMENTO
             )
             
             # Atualizar status do agendamento
-            agendamento.status = 'Em Uso'
+            agendamento.status = StatusAgendamento.EM_USO
             
             db.session.add(viagem)
+            resumo_frota.registrar_saida_viagem(viagem)
             db.session.commit()
             
             flash(f'Saída registrada com sucesso! Viagem #{viagem.id}', 'success')
@@ -307,11 +355,7 @@ def registrar_saida():
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao registrar saída: {str(e)}', 'danger')
-            stmt = select(Agendamento).where(Agendamento.status == 'Confirmado')
-            agendamentos = db.session.execute(stmt).scalars().all()
-            stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-            motoristas = db.session.execute(stmt_motoristas).scalars().all()
-            return render_template('registrar_saida.html', agendamentos=agendamentos, motoristas=motoristas)
+            return formulario()
 
 @app.route('/registrar-chegada', endpoint='registrar_chegada', methods=['GET', 'POST'])
 @login_required
@@ -368,7 +412,7 @@ def registrar_chegada():
             # Atualizar viagem com chegada
             viagem.data_chegada = datetime.now(timezone.utc).astimezone(ZoneInfo('America/Sao_Paulo'))
             viagem.km_chegada = km_final_float
-            viagem.status = 'Finalizada'
+            viagem.status = StatusViagem.FINALIZADA
             if observacoes:
                 viagem.observacoes = observacoes
             
@@ -376,15 +420,21 @@ def registrar_chegada():
             if viagem.agendamento_id:
                 agendamento = db.session.get(Agendamento, viagem.agendamento_id)
                 if agendamento:
-                    agendamento.status = 'Finalizado'
+                    agendamento.status = StatusAgendamento.FINALIZADO
             
             # Atualizar status do veículo para disponível
             stmt_veiculo = select(Veiculo).where(Veiculo.placa == viagem.placa)
             veiculo_obj = db.session.execute(stmt_veiculo).scalars().first()
             if veiculo_obj:
-                veiculo_obj.status = 'disponível'
+                # Status aplicado antes do ajuste: se o contador ainda não existir, a contagem já o vê
+                status_anterior = veiculo_obj.status
+                veiculo_obj.status = StatusVeiculo.DISPONIVEL
+                resumo_frota.alterar_status_veiculo(status_anterior, veiculo_obj.status)
             
+            resumo_frota.registrar_chegada_viagem(viagem)
+            rollups.registrar_viagem_finalizada(viagem)
             db.session.commit()
+            agregacoes.invalidar_relatorios()
             
             flash(f'Chegada registrada com sucesso! Viagem finalizada.', 'success')
             return redirect(url_for('historico'))
@@ -397,18 +447,43 @@ def registrar_chegada():
 
 @app.route('/historico')
 @login_required
+@somente_leitura
 def historico():
-    """Histórico de viagens"""
-    from sqlalchemy import select
+    """Histórico de viagens (paginado por cursor)"""
+    from datetime import datetime
     
-    # Buscar viagens finalizadas (com data_chegada registrada)
-    stmt = select(Viagem).where(Viagem.data_chegada != None).order_by(Viagem.data_chegada.desc())
-    viagens = db.session.execute(stmt).scalars().all()
+    def ler_data(nome):
+        try:
+            return datetime.strptime(request.args.get(nome, ''), '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    
+    filtros = {
+        'de': request.args.get('de', ''),
+        'ate': request.args.get('ate', ''),
+        'placa': request.args.get('placa', '').strip(),
+        'motorista': request.args.get('motorista', '').strip(),
+    }
+    viagens, proximo_cursor = consultas.historico_paginado(
+        cursor=request.args.get('apos'),
+        de=ler_data('de'),
+        ate=ler_data('ate'),
+        placa=filtros['placa'],
+        motorista=filtros['motorista'],
+        per_page=20
+    )
     
-    return render_template('historico.html', viagens=viagens)
+    return render_template(
+        'historico.html',
+        viagens=viagens,
+        filtros=filtros,
+        cursor_atual=request.args.get('apos'),
+        proximo_cursor=proximo_cursor
+    )
 
 @app.route('/gerenciar')
 @login_required
+@somente_leitura
 def gerenciar():
     """Gerenciar usuários e veículos"""
     from sqlalchemy import select
@@ -438,9 +513,10 @@ def novo_veiculo():
                 marca=marca,
                 modelo=modelo,
                 ano=int(ano) if ano else None,
-                status='disponível'
+                status=StatusVeiculo.DISPONIVEL
             )
             db.session.add(novo)
+            resumo_frota.alterar_status_veiculo(None, novo.status)
             db.session.commit()
             flash(f'Veículo {placa} adicionado com sucesso!', 'success')
             return redirect(url_for('gerenciar'))
@@ -462,11 +538,13 @@ def editar_veiculo(veiculo_id):
         return redirect(url_for('gerenciar'))
     
     if request.method == 'POST':
+        status_anterior = veiculo.status
         veiculo.placa = request.form.get('placa', veiculo.placa).upper()
         veiculo.marca = request.form.get('marca', veiculo.marca)
         veiculo.modelo = request.form.get('modelo', veiculo.modelo)
         veiculo.status = request.form.get('status', veiculo.status)
         
+        resumo_frota.alterar_status_veiculo(status_anterior, veiculo.status)
         db.session.commit()
         flash(f'Veículo atualizado!', 'success')
         return redirect(url_for('gerenciar'))
@@ -482,7 +560,9 @@ def deletar_veiculo(veiculo_id):
     veiculo = db.session.execute(stmt).scalar_one_or_none()
     
     if veiculo:
+        status_anterior = veiculo.status
         db.session.delete(veiculo)
+        resumo_frota.alterar_status_veiculo(status_anterior, None)
         db.session.commit()
         flash(f'Veículo deletado!', 'success')
     
@@ -490,79 +570,34 @@ def deletar_veiculo(veiculo_id):
 
 @app.route('/relatorios')
 @login_required
+@somente_leitura
 def relatorios():
     """Relatórios do sistema"""
-    from sqlalchemy import select, and_, func
-    from datetime import datetime, date
+    from sqlalchemy import select
+    from datetime import datetime
+    
+    def ler_data(nome):
+        try:
+            return datetime.strptime(request.args.get(nome, ''), '%Y-%m-%d').date()
+        except ValueError:
+            return None
     
     # Parâmetros de busca
-    data_param = request.args.get('data')
+    tipo_periodo = request.args.get('periodo', 'dia')
+    if tipo_periodo not in agregacoes.TIPOS_PERIODO:
+        tipo_periodo = 'dia'
     veiculo_filter = request.args.get('veiculo')
     motorista_filter = request.args.get('motorista')
+    evento_filter = request.args.get('evento', '').strip()
     
-    # Data a exibir
-    if data_param:
-        try:
-            data_busca = datetime.strptime(data_param, '%Y-%m-%d').date()
-            data_display = data_busca.strftime('%d/%m/%Y')
-            data_input_value = data_param
-        except ValueError:
-            data_busca = date.today()
-            data_display = data_busca.strftime('%d/%m/%Y')
-            data_input_value = data_busca.isoformat()
-    else:
-        data_busca = date.today()
-        data_display = data_busca.strftime('%d/%m/%Y')
-        data_input_value = data_busca.isoformat()
-    
-    # Buscar viagens finalizadas no dia (ignora viagens sem chegada para não poluir métricas)
-    stmt = select(Viagem).where(
-        func.date(Viagem.data_saida) == data_busca,
-        Viagem.data_chegada != None
+    periodo = agregacoes.resolver_periodo(
+        tipo_periodo, dia=ler_data('data'), de=ler_data('de'), ate=ler_data('ate')
     )
-    viagens = db.session.execute(stmt).scalars().all()
-    
-    # Filtrar por veículo se especificado
-    if veiculo_filter:
-        viagens = [v for v in viagens if v.placa.lower() == veiculo_filter.lower()]
-    
-    # Filtrar por motorista se especificado
-    if motorista_filter:
-        filtro_lower = motorista_filter.lower()
-        viagens = [
-            v for v in viagens
-            if (
-                v.motorista
-                and (
-                    (v.motorista.nome and filtro_lower in v.motorista.nome.lower())
-                    or (v.motorista.email and filtro_lower in v.motorista.email.lower())
-                )
-            )
-        ]
-    
-    # Processar relatórios
-    relatorio_veiculos = {}
-    relatorio_motoristas = {}
     
-    for viagem in viagens:
-        # Calcular KM rodados
-        km_rodados = 0
-        if viagem.km_chegada is not None and viagem.km_saida is not None:
-            km_rodados = viagem.km_chegada - viagem.km_saida
-        
-        # Agrupar por veículo
-        if viagem.placa not in relatorio_veiculos:
-            relatorio_veiculos[viagem.placa] = 0
-        relatorio_veiculos[viagem.placa] += km_rodados
-        
-        # Agrupar por motorista
-        motorista_nome = 'N/A'
-        if viagem.motorista:
-            motorista_nome = viagem.motorista.nome if viagem.motorista.nome else viagem.motorista.email
-        
-        if motorista_nome not in relatorio_motoristas:
-            relatorio_motoristas[motorista_nome] = 0
-        relatorio_motoristas[motorista_nome] += km_rodados
+    # Somas por veículo e por motorista calculadas no banco (com cache)
+    relatorio = agregacoes.relatorio_km(
+        periodo, placa=veiculo_filter, motorista=motorista_filter, evento=evento_filter
+    )
     
     # Buscar lista de veículos e motoristas para filtros
     stmt_veiculos = select(Veiculo)
@@ -573,19 +608,32 @@ def relatorios():
     
     return render_template(
         'relatorios.html',
-        relatorio_veiculos=relatorio_veiculos,
-        relatorio_motoristas=relatorio_motoristas,
-        data_display=data_display,
-        data_input_value=data_input_value,
+        relatorio_veiculos=relatorio['km_por_veiculo'],
+        relatorio_motoristas=relatorio['km_por_motorista'],
+        data_display=periodo.rotulo(),
+        data_input_value=periodo.inicio.isoformat(),
+        periodo=periodo,
+        tipo_periodo=tipo_periodo,
+        evento_filter=evento_filter,
         todos_veiculos=todos_veiculos,
         todos_motoristas=todos_motoristas,
-        viagens_total=len(viagens)
+        viagens_total=relatorio['viagens_total']
     )
 
 @app.route('/agendar-veiculo', endpoint='agendar_veiculo', methods=['GET', 'POST'])
 @login_required
 def agendar_veiculo():
     """Agendar veículo"""
+    from sqlalchemy import select
+
+    def renderizar_formulario():
+        """Carrega veículos disponíveis e motoristas para o formulário"""
+        stmt_veiculos = select(Veiculo).where(Veiculo.status == StatusVeiculo.DISPONIVEL)
+        veiculos = db.session.execute(stmt_veiculos).scalars().all()
+        stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
+        motoristas = db.session.execute(stmt_motoristas).scalars().all()
+        return render_template('agendar_veiculo.html', veiculos=veiculos, motoristas=motoristas)
+
     if request.method == 'POST':
         # Processar formulário de agendamento
         from datetime import datetime, date, time
@@ -602,12 +650,7 @@ def agendar_veiculo():
         # Validar dados obrigatórios
         if not placa or not motorista_id or not data_solicitada or not hora_inicio or not hora_fim:
             flash('Preencha todos os campos obrigatórios!', 'danger')
-            from sqlalchemy import select
-            stmt_veiculos = select(Veiculo).where(Veiculo.status == 'disponível')
-            veiculos = db.session.execute(stmt_veiculos).scalars().all()
-            stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-            motoristas = db.session.execute(stmt_motoristas).scalars().all()
-            return render_template('agendar_veiculo.html', veiculos=veiculos, motoristas=motoristas)
+            return renderizar_formulario()
         
         # Converter strings para tipos Python apropriados
         try:
@@ -619,12 +662,17 @@ def agendar_veiculo():
             hora_fim_obj = datetime.strptime(hora_fim, '%H:%M').time()
         except ValueError as e:
             flash(f'Erro ao processar data/hora: {str(e)}', 'danger')
-            from sqlalchemy import select
-            stmt_veiculos = select(Veiculo).where(Veiculo.status == 'disponível')
-            veiculos = db.session.execute(stmt_veiculos).scalars().all()
-            stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-            motoristas = db.session.execute(stmt_motoristas).scalars().all()
-            return render_template('agendar_veiculo.html', veiculos=veiculos, motoristas=motoristas)
+            return renderizar_formulario()
+        
+        # Verificar conflito com agendamentos ativos do mesmo veículo no dia
+        resultado = conflitos.verificar_conflito(placa, data_obj, hora_inicio_obj, hora_fim_obj)
+        if resultado.erro:
+            flash(resultado.erro, 'danger')
+            return renderizar_formulario()
+        if resultado.conflito:
+            flash(f'Veículo {placa} já está agendado neste horário '
+                  f'({conflitos.descrever_conflito(resultado.conflito)}).', 'danger')
+            return renderizar_formulario()
         
         # Criar agendamento
         novo_agendamento = Agendamento(
@@ -636,24 +684,64 @@ def agendar_veiculo():
             destinos=destinos,
             passageiros=int(passageiros) if passageiros else None,
             observacoes=observacoes,
-            status='Agendado'
+            status=StatusAgendamento.AGENDADO
         )
         
         db.session.add(novo_agendamento)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Constraint de exclusão do PostgreSQL: outro agendamento entrou ao mesmo tempo
+            db.session.rollback()
+            flash(f'Veículo {placa} já está agendado neste horário.', 'danger')
+            return renderizar_formulario()
         
         flash('Agendamento realizado com sucesso!', 'success')
         return redirect(url_for('agendamentos'))
     
     # GET: Carregar formulário com lista de veículos e motoristas
-    from sqlalchemy import select
-    stmt_veiculos = select(Veiculo).where(Veiculo.status == 'disponível')
-    veiculos = db.session.execute(stmt_veiculos).scalars().all()
-    
-    stmt_motoristas = select(Usuario).where(Usuario.role == 'motorista')
-    motoristas = db.session.execute(stmt_motoristas).scalars().all()
+    return renderizar_formulario()
+
+@app.route('/agendamentos/validar-lote', endpoint='validar_lote_agendamentos', methods=['POST'])
+@login_required
+def validar_lote_agendamentos():
+    """Valida um lote de agendamentos (ex: todos os carros de um evento) sem gravá-los"""
+    from datetime import datetime
+    
+    corpo = request.get_json(silent=True)
+    itens = corpo.get('agendamentos', []) if isinstance(corpo, dict) else None
+    if not isinstance(itens, list):
+        return jsonify({'erro': 'Envie um objeto JSON com a lista "agendamentos"'}), 400
+    resultados = [None] * len(itens)
+    pedidos = []
+    for posicao, item in enumerate(itens):
+        referencia = item.get('referencia', posicao) if isinstance(item, dict) else posicao
+        try:
+            pedidos.append((posicao, conflitos.PedidoAgendamento(
+                placa=item['placa'],
+                data_solicitada=datetime.strptime(item['data_solicitada'], '%Y-%m-%d').date(),
+                hora_inicio=datetime.strptime(item['hora_inicio'], '%H:%M').time(),
+                hora_fim=datetime.strptime(item['hora_fim'], '%H:%M').time(),
+                referencia=referencia
+            )))
+        except (KeyError, TypeError, ValueError) as e:
+            resultados[posicao] = {'referencia': referencia, 'valido': False, 'erro': f'Dados inválidos: {e}'}
+    
+    validados = conflitos.validar_lote(pedido for _, pedido in pedidos)
+    for (posicao, _), resultado in zip(pedidos, validados):
+        resultados[posicao] = {
+            'referencia': resultado.pedido.referencia,
+            'valido': resultado.valido,
+            'erro': resultado.erro or (
+                conflitos.descrever_conflito(resultado.conflito) if resultado.conflito else None
+            )
+        }
     
-    return render_template('agendar_veiculo.html', veiculos=veiculos, motoristas=motoristas)
+    return jsonify({
+        'total': len(itens),
+        'validos': sum(1 for r in resultados if r['valido']),
+        'resultados': resultados
+    })
 
 @app.route('/confirmar-agendamento/<agendamento_id>', endpoint='confirmar_agendamento', methods=['POST'])
 @login_required
@@ -667,7 +755,7 @@ def confirmar_agendamento(agendamento_id):
         flash('Agendamento não encontrado!', 'danger')
         return redirect(url_for('agendamentos'))
     
-    agendamento.status = 'Confirmado'
+    agendamento.status = StatusAgendamento.CONFIRMADO
     db.session.commit()
     flash('Agendamento confirmado com sucesso!', 'success')
     return redirect(url_for('agendamentos'))
@@ -689,7 +777,7 @@ def cancelar_agendamento(agendamento_id):
         flash('Você não tem permissão para cancelar este agendamento!', 'danger')
         return redirect(url_for('agendamentos'))
     
-    agendamento.status = 'Cancelado'
+    agendamento.status = StatusAgendamento.CANCELADO
     agendamento.motivo_cancelamento = request.form.get('motivo_cancelamento', '')
     db.session.commit()
     flash('Agendamento cancelado com sucesso!', 'success')
@@ -784,18 +872,123 @@ def novo_motorista():
     
     return render_template('novo_motorista.html')
 
+@app.route('/metricas')
+@login_required
+def metricas():
+    """Métricas de operação em JSON (só admin): hash de senhas, tentativas recusadas e auditoria"""
+    if current_user.role != 'admin':
+        return jsonify({'erro': 'Acesso negado'}), 403
+    return jsonify({'senhas': senhas.servico.metricas(), 'limites': limites.metricas(),
+                    'auditoria': escritor_auditoria.metricas()})
+
+@app.route('/exportar/<tabela>')
+@login_required
+def exportar_tabela(tabela):
+    """Stream Arrow IPC da tabela para análise (só admin); ?marca=id&desde=N exporta só o que é novo"""
+    if current_user.role != 'admin':
+        return jsonify({'erro': 'Acesso negado'}), 403
+    marca = request.args.get('marca', 'id')
+    desde = request.args.get('desde')
+    try:
+        if desde is not None:
+            if marca == 'data_chegada':
+                datetime.fromisoformat(desde)
+                desde = {'data_chegada': desde, 'id': int(request.args.get('desde_id', 0))}
+            else:
+                desde = int(desde)
+        dados = exportacao.stream_arrow(tabela, marca, desde, app.config['EXPORTACAO_LOTE'])
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    except RuntimeError as e:  # pyarrow não instalado
+        return jsonify({'erro': str(e)}), 501
+    return Response(stream_with_context(dados), mimetype=exportacao.MIMETYPE_ARROW,
+                    headers={'Content-Disposition': f'attachment; filename={tabela}.arrows'})
+
 # ==================== ERROR HANDLERS ====================
 
 @app.errorhandler(404)
 def not_found(error):
     return render_template('404.html'), 404
 
+@app.errorhandler(senhas.FilaSenhasCheia)
+def fila_senhas_cheia(error):
+    # Pico de logins: recusa na hora em vez de enfileirar até o timeout do gunicorn
+    app.logger.warning(f'⏳ Login recusado: {error}')
+    return 'Sistema ocupado no momento. Tente novamente em alguns segundos.', 503, {'Retry-After': '5'}
+
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     app.logger.error(f'❌ Erro 500: {str(error)}')
     return render_template('500.html'), 500
 
+# ==================== CLI COMMANDS ====================
+
+@app.cli.command('recalcular-resumo')
+def recalcular_resumo_command():
+    """Recalcula os contadores do dashboard a partir das tabelas"""
+    resumo = resumo_frota.recalcular_resumo()
+    print(f"✅ Resumo recalculado: {resumo}")
+
+@app.cli.command('backfill-rollups')
+@click.option('--de', 'inicio', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Primeiro dia (AAAA-MM-DD). Padrão: todo o histórico')
+@click.option('--ate', 'fim', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Último dia (AAAA-MM-DD)')
+def backfill_rollups_command(inicio, fim):
+    """Recalcula os rollups diários a partir das tabelas de origem"""
+    linhas = rollups.backfill(inicio.date() if inicio else None, fim.date() if fim else None)
+    print(f"✅ Rollups recalculados: {linhas} linhas")
+
+@app.cli.command('auditoria-reenviar')
+def auditoria_reenviar_command():
+    """Grava os registros de auditoria que ficaram no arquivo de pendentes"""
+    registros = escritor_auditoria.reenviar_pendentes()
+    print(f"✅ Auditoria: {registros} registros reenviados")
+
+@app.cli.command('particoes-criar')
+@click.option('--meses', type=int, default=None, help='Meses à frente. Padrão: PARTICOES_MESES_A_FRENTE')
+def particoes_criar_command(meses):
+    """Cria as partições mensais dos próximos meses (viagens e auditoria)"""
+    meses = app.config['PARTICOES_MESES_A_FRENTE'] if meses is None else meses
+    for tabela in particoes.TABELAS:
+        criadas = particoes.criar_particoes(db.engine, tabela, meses)
+        print(f"✅ {tabela}: {len(criadas)} partições criadas {criadas if criadas else ''}")
+
+@app.cli.command('particoes-arquivar')
+@click.option('--tabela', type=click.Choice(list(particoes.TABELAS)), default=None,
+              help='Só esta tabela. Padrão: todas')
+@click.option('--meses', type=int, default=None,
+              help='Meses mantidos no banco. Padrão: RETENCAO_VIAGENS_MESES / RETENCAO_AUDITORIA_MESES')
+def particoes_arquivar_command(tabela, meses):
+    """Exporta para CSV gzip e remove as partições mais antigas que a retenção"""
+    for nome in [tabela] if tabela else particoes.TABELAS:
+        retencao = app.config[f'RETENCAO_{nome.upper()}_MESES'] if meses is None else meses
+        if not retencao:
+            print(f"⏭️ {nome}: sem retenção configurada")
+            continue
+        arquivadas = particoes.arquivar_particoes(db.engine, nome, retencao, app.config['ARQUIVO_PARTICOES_DIR'])
+        for particao, linhas, caminho in arquivadas:
+            print(f"✅ {particao}: {linhas} linhas em {caminho}")
+        print(f"✅ {nome}: {len(arquivadas)} partições arquivadas")
+
+@app.cli.command('exportar')
+@click.option('--tabela', 'tabelas', multiple=True, type=click.Choice(list(exportacao.TABELAS)),
+              help='Tabela a exportar (pode repetir). Padrão: todas')
+@click.option('--formato', type=click.Choice(exportacao.FORMATOS), default='parquet')
+@click.option('--marca', type=click.Choice(exportacao.MARCAS), default='id',
+              help="Marca d'água incremental; data_chegada só vale para viagens")
+@click.option('--pasta', default=None, help='Destino. Padrão: EXPORTACAO_DIR')
+@click.option('--completa', is_flag=True, help="Ignora a marca d'água e exporta tudo de novo")
+def exportar_command(tabelas, formato, marca, pasta, completa):
+    """Exporta as tabelas de histórico em Parquet/Arrow particionado por mês"""
+    for tabela in tabelas or exportacao.TABELAS:
+        resumo = exportacao.exportar(tabela, pasta or app.config['EXPORTACAO_DIR'],
+                                     marca if tabela == 'viagens' else 'id', formato,
+                                     app.config['EXPORTACAO_LOTE'], completa)
+        print(f"✅ {tabela}: {resumo['linhas']} linhas em {len(resumo['arquivos'])} arquivos "
+              f"(marca: {resumo['marca']})")
+
 # ==================== SHELL CONTEXT ====================
 
 @app.shell_context_processor
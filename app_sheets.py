@@ -3,7 +3,7 @@ Frota Globo - Sistema de Gestão de Frotas
 Versão: Supabase (PostgreSQL Database)
 """
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
@@ -11,6 +11,8 @@ from dotenv import load_dotenv
 import logging
 from logging.handlers import RotatingFileHandler
 from supabase_db import SupabaseDB
+import cache_usuarios
+import limites
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -43,6 +45,9 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-123')
 # Inicializar SupabaseDB
 db = SupabaseDB()
 
+# Limites de tentativas de login/cadastro (RATELIMIT_STORAGE_URL; padrão memory://)
+limites.iniciar(app)
+
 # Login Manager Configuration
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -84,9 +89,25 @@ class SheetsUser(UserMixin):
     def is_active(self):
         return self.ativo
 
+# Cache de usuários do Flask-Login: evita uma ida ao Supabase por requisição
+usuarios_cache = cache_usuarios.criar_cache(
+    os.getenv('CACHE_TYPE'),
+    os.getenv('CACHE_REDIS_URL') or os.getenv('REDIS_URL'),
+    ttl=int(os.getenv('CACHE_USUARIOS_TTL', cache_usuarios.TTL_PADRAO)),
+    max_itens=int(os.getenv('CACHE_USUARIOS_MAX', cache_usuarios.MAX_ITENS_PADRAO))
+)
+
+# Colunas que o SheetsUser usa fora do login: a senha nunca vai para o cache
+COLUNAS_SESSAO = ('Email', 'email', 'Nome', 'nome', 'Cargo', 'role', 'Telefone', 'telefone', 'Ativo')
+
+def _dados_sessao(user_data):
+    if not user_data:
+        return None
+    return {coluna: valor for coluna, valor in user_data.items() if coluna in COLUNAS_SESSAO}
+
 @login_manager.user_loader
 def load_user(user_id):
-    user_data = db.get_user_by_email(user_id)
+    user_data = usuarios_cache.obter(user_id, lambda: _dados_sessao(db.get_user_by_email(user_id)))
     if user_data:
         return SheetsUser(user_data)
     return None
@@ -129,36 +150,17 @@ def index():
                 # Normalize keys to lowercase for consistency
                 setattr(self, k.lower().replace(' ', '_'), v)
     
-    veiculos = db.get_veiculos()
-    viagens = db.get_viagens()
-    
-    # Convert to objects
-    veiculos_objs = [MockObj(v) for v in veiculos]
-    viagens_objs = [MockObj(v) for v in viagens]
-    
-    # Filtrar dados para dashboard
-    veiculos_disponiveis = [v for v in veiculos_objs if hasattr(v, 'status') and str(v.status).lower() == 'disponível']
-    
-    viagens_em_rota = [v for v in viagens_objs if hasattr(v, 'status') and str(v.status) == 'Em Andamento']
+    # Filtros aplicados no Supabase: só os veículos disponíveis e as viagens em rota
+    veiculos_disponiveis = [MockObj(v) for v in db.get_veiculos(status=['Disponível', 'disponível'])]
+    viagens_em_rota = [MockObj(v) for v in db.get_viagens(status='Em Andamento')]
     
-    # Viagens hoje (precisa parsear data)
+    # Viagens hoje: só o id das viagens com saída a partir de hoje
     now_date = datetime.now(TZ).date()
-    viagens_hoje = 0
-    for v in viagens_objs:
-        try:
-            data_saida_str = getattr(v, 'data_saída', '')
-            if not data_saida_str:
-                continue
-            # Tentar formatos comuns
-            if 'T' in data_saida_str:
-                dt = datetime.fromisoformat(data_saida_str).date()
-            else:
-                dt = datetime.strptime(data_saida_str, '%Y-%m-%d').date()
-            
-            if dt == now_date:
-                viagens_hoje += 1
-        except:
-            pass
+    viagens_hoje = len(db.get_viagens(
+        columns=['id'],
+        data_saida__gte=now_date.isoformat(),
+        data_saida__lt=(now_date + timedelta(days=1)).isoformat()
+    ))
 
     return render_template(
         'index.html',
@@ -171,6 +173,7 @@ def index():
     )
 
 @app.route('/login', methods=['GET', 'POST'])
+@limites.limitar_login
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -192,6 +195,7 @@ def login():
     return render_template('login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
+@limites.limitar_registro
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -226,12 +230,15 @@ def logout():
 @login_required
 def agendamentos():
     all_agendamentos = db.get_agendamentos()
-    veiculos = db.get_veiculos()
-    usuarios = db.get_users()
+    # Only the vehicles and users referenced by the agendamentos (no password column)
+    placas = sorted({a.get('Placa') for a in all_agendamentos if a.get('Placa')})
+    emails = sorted({a.get('Usuario Email') for a in all_agendamentos if a.get('Usuario Email')})
+    veiculos = db.get_veiculos(placa=placas, columns=['placa', 'marca', 'modelo', 'status'])
+    usuarios = db.get_users(email=emails, columns=['email', 'nome', 'telefone', 'role'])
     
     # Create lookup dictionaries
-    veiculos_dict = {v.get('Placa'): v for v in veiculos}
-    usuarios_dict = {u.get('Email'): u for u in usuarios}
+    veiculos_dict = {v.get('Placa') or v.get('placa'): v for v in veiculos}
+    usuarios_dict = {u.get('Email') or u.get('email'): u for u in usuarios}
     
     # Helper class
     class MockObj:
@@ -241,9 +248,9 @@ def agendamentos():
     
     # Convert and enrich agendamentos
     agendamentos_objs = []
-    for idx, agend in enumerate(all_agendamentos, start=1):
+    for agend in all_agendamentos:
         obj = MockObj(agend)
-        obj.id = idx  # Add id for template compatibility
+        obj.id = agend.get('_id')  # UUID: stable even when new agendamentos are created
         # Add related veiculo object
         placa = agend.get('Placa')
         if placa and placa in veiculos_dict:
@@ -289,13 +296,8 @@ def registrar_saida():
             flash('Todos os campos obrigatórios devem ser preenchidos.', 'danger')
             return redirect(url_for('registrar_saida'))
         
-        # Get agendamento to extract placa and destino
-        agendamentos = db.get_agendamentos()
-        agendamento = None
-        for idx, a in enumerate(agendamentos, start=1):
-            if str(idx) == str(agendamento_id):
-                agendamento = a
-                break
+        # Get agendamento to extract placa and destino (UUID, or legacy numeric id)
+        agendamento = db.get_agendamento(agendamento_id)
         
         if not agendamento:
             flash('Agendamento não encontrado.', 'danger')
@@ -309,7 +311,7 @@ def registrar_saida():
             'km_saida': km_inicial,
             'destino': agendamento.get('Destinos', 'N/A'),
             'observacoes': observacoes,
-            'agendamento_id': agendamento_id  # Include agendamento_id to update its status
+            'agendamento_id': agendamento.get('_id')  # Include agendamento_id to update its status
         }
         
         if db.create_viagem(trip_data):
@@ -321,27 +323,26 @@ def registrar_saida():
     
     # GET - Load agendamentos and motoristas
     all_agendamentos = db.get_agendamentos()
-    motoristas = [u for u in db.get_users() if u.get('Cargo', '').lower() == 'motorista']
+    # Só o que o formulário mostra: o id (UUID) e a senha ficam de fora
+    motoristas = db.get_users(role='motorista', columns=['email', 'nome'])
     
     class MockObj:
         def __init__(self, d):
             for k, v in d.items():
                 setattr(self, k.lower().replace(' ', '_'), v)
     
-    # Add IDs to agendamentos (index-based, starting at 1)
+    # Agendamentos are addressed by UUID
     agendamentos_objs = []
-    for idx, a in enumerate(all_agendamentos, start=1):
+    for a in all_agendamentos:
         obj = MockObj(a)
-        obj.id = idx  # Add sequential ID
+        obj.id = a.get('_id')
         agendamentos_objs.append(obj)
     
-    # Add IDs to motoristas (using email as id)
+    # The form posts m.id, saved as viagens.motorista_email: use the email as id
     motoristas_objs = []
     for m in motoristas:
         obj = MockObj(m)
-        # Ensure id attribute exists (use email as id)
-        if not hasattr(obj, 'id'):
-            obj.id = obj.email if hasattr(obj, 'email') else ''
+        obj.id = m.get('email', '')
         motoristas_objs.append(obj)
         
     return render_template('registrar_saida.html', agendamentos=agendamentos_objs, motoristas=motoristas_objs)
@@ -365,13 +366,12 @@ def registrar_chegada():
             flash('Erro ao registrar chegada. Verifique se há viagem em andamento.', 'danger')
             return redirect(url_for('registrar_chegada'))
     
-    # GET - Load vehicles currently in use
-    viagens = db.get_viagens()
-    viagens_em_andamento = [v for v in viagens if v.get('Status') == 'Em Andamento']
+    # GET - Load vehicles currently in use (only the placas of open trips)
+    viagens_em_andamento = db.get_viagens(status='Em Andamento', columns=['placa'])
+    placas_em_uso = sorted({v.get('Placa') for v in viagens_em_andamento if v.get('Placa')})
     
     # Get full vehicle data for vehicles in use
-    all_veiculos = db.get_veiculos()
-    veiculos_dict = {v.get('Placa'): v for v in all_veiculos}
+    veiculos_dict = {v.get('placa'): v for v in db.get_veiculos(placa=placas_em_uso)}
     
     class MockObj:
         def __init__(self, d):
@@ -395,11 +395,12 @@ def registrar_chegada():
 @login_required
 def cronograma():
     # Load active trips (viagens em andamento)
-    all_viagens = db.get_viagens()
-    usuarios = db.get_users()
+    all_viagens = db.get_viagens(status='Em Andamento')
+    emails = sorted({v.get('Motorista Email') for v in all_viagens if v.get('Motorista Email')})
+    usuarios = db.get_users(email=emails, columns=['email', 'nome', 'telefone', 'role'])
     
     # Create usuario lookup dict
-    usuarios_dict = {u.get('Email'): u for u in usuarios}
+    usuarios_dict = {u.get('Email') or u.get('email'): u for u in usuarios}
     
     class MockObj:
         def __init__(self, d):
@@ -408,13 +409,9 @@ def cronograma():
     
     # Filter and enrich viagens
     viagens_objs = []
-    for idx, v in enumerate(all_viagens, start=1):
-        # Only include trips that are "Em Andamento"
-        if v.get('Status') != 'Em Andamento':
-            continue
-            
+    for v in all_viagens:
         obj = MockObj(v)
-        obj.id = idx  # Add sequential ID
+        obj.id = v.get('_id')
         
         # Add motorista object
         motorista_email = v.get('Motorista Email') or v.get('motorista_email')
@@ -456,15 +453,15 @@ def relatorios():
     
     # Add IDs to all objects for consistency
     viagens_objs = []
-    for idx, v in enumerate(viagens, start=1):
+    for v in viagens:
         obj = MockObj(v)
-        obj.id = idx
+        obj.id = v.get('_id')
         viagens_objs.append(obj)
     
     agendamentos_objs = []
-    for idx, a in enumerate(agendamentos, start=1):
+    for a in agendamentos:
         obj = MockObj(a)
-        obj.id = idx
+        obj.id = a.get('_id')
         agendamentos_objs.append(obj)
     
     veiculos_objs = []
@@ -497,6 +494,7 @@ def editar_perfil():
         update_data = {k: v for k, v in update_data.items() if v is not None}
         
         if db.update_user(current_user.email, update_data):
+            usuarios_cache.invalidar(current_user.email)
             flash('Perfil atualizado com sucesso!', 'success')
             return redirect(url_for('index'))
         else:
@@ -547,9 +545,9 @@ def historico():
     
     # Add IDs to viagens for consistency
     viagens_objs = []
-    for idx, v in enumerate(viagens, start=1):
+    for v in viagens:
         obj = MockObj(v)
-        obj.id = idx
+        obj.id = v.get('_id')
         viagens_objs.append(obj)
     
     return render_template('historico.html', viagens=viagens_objs)
@@ -640,6 +638,7 @@ def novo_usuario():
         }
         
         if db.create_user(usuario_data):
+            usuarios_cache.invalidar(usuario_data['email'])
             flash(f'Usuário {usuario_data["nome"]} criado com sucesso!', 'success')
             return redirect(url_for('gerenciar'))
         else:
@@ -660,6 +659,7 @@ def novo_motorista():
         }
         
         if db.create_user(motorista_data):
+            usuarios_cache.invalidar(motorista_data['email'])
             flash(f'Motorista {motorista_data["nome"]} criado com sucesso!', 'success')
             return redirect(url_for('gerenciar'))
         else:
@@ -667,7 +667,7 @@ def novo_motorista():
             return redirect(url_for('novo_motorista'))
     return render_template('novo_motorista.html')
 
-@app.route('/confirmar-agendamento/<int:agendamento_id>', methods=['POST'])
+@app.route('/confirmar-agendamento/<agendamento_id>', methods=['POST'])
 @login_required
 def confirmar_agendamento(agendamento_id):
     if db.update_agendamento_status(agendamento_id, 'Confirmado'):
@@ -676,11 +676,11 @@ def confirmar_agendamento(agendamento_id):
         flash('Erro ao confirmar agendamento.', 'danger')
     return redirect(url_for('agendamentos'))
 
-@app.route('/cancelar-agendamento/<int:agendamento_id>', methods=['POST'])
+@app.route('/cancelar-agendamento/<agendamento_id>', methods=['POST'])
 @login_required
 def cancelar_agendamento(agendamento_id):
     motivo = request.form.get('motivo_cancelamento', '')
-    if db.update_agendamento_status(agendamento_id, 'Cancelado'):
+    if db.cancelar_agendamento(agendamento_id, motivo):
         flash(f'Agendamento cancelado com sucesso! {motivo}', 'success')
     else:
         flash('Erro ao cancelar agendamento.', 'danger')
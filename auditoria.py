@@ -0,0 +1,350 @@
+"""
+📜 Auditoria - trilha de alterações gravada em lote, fora da requisição
+
+Toda inserção, alteração e remoção de Veiculo, Agendamento e Viagem vira
+um registro de Auditoria com o antes/depois das colunas alteradas. Os
+registros são montados nos eventos da sessão do SQLAlchemy (after_flush,
+quando o histórico dos atributos ainda existe) e só seguem adiante no
+commit; um rollback os descarta.
+
+Gravar um INSERT a mais dentro de cada transação das rotas custaria uma
+ida ao banco por ação, então os registros vão para uma fila limitada em
+memória, esvaziada por uma thread em segundo plano que grava até
+AUDITORIA_LOTE registros por INSERT de várias linhas, a cada
+AUDITORIA_INTERVALO segundos (ou antes, se o lote encher).
+
+Nada é descartado:
+- fila cheia: quem registra espera até AUDITORIA_ESPERA segundos e, se
+  ainda não houver espaço, grava o registro na hora;
+- banco indisponível: o lote é tentado de novo e, depois de
+  AUDITORIA_TENTATIVAS falhas, vai para AUDITORIA_ARQUIVO_PENDENTES (JSON
+  por linha), de onde `flask auditoria-reenviar` o grava depois;
+- encerramento do processo: a fila é esvaziada no atexit.
+
+AUDITORIA_MODO: 'assincrono' (padrão), 'sincrono' (grava no commit, útil
+em testes e scripts) ou 'desligado'.
+"""
+
+import atexit
+import enum
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, time as hora
+from decimal import Decimal
+
+from sqlalchemy import event, inspect as sa_inspect, insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+LOTE_PADRAO = 100
+INTERVALO_PADRAO = 1.0  # segundos
+MAX_FILA_PADRAO = 10000
+ESPERA_PADRAO = 0.5  # segundos esperando espaço na fila antes de gravar na hora
+TENTATIVAS_PADRAO = 3
+ARQUIVO_PENDENTES_PADRAO = os.path.join('logs', 'auditoria_pendente.jsonl')
+MODOS = ('assincrono', 'sincrono', 'desligado')
+
+_FIM = object()  # sentinela de encerramento da thread
+
+# Modelos auditados (o nome da classe vai para Auditoria.entidade)
+ENTIDADES_AUDITADAS = ('Veiculo', 'Agendamento', 'Viagem')
+
+
+def _valor(valor):
+    """Valor de coluna em forma serializável em JSON"""
+    if isinstance(valor, enum.Enum):
+        return valor.value
+    if isinstance(valor, (datetime, date, hora)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+class EscritorAuditoria:
+    """Fila limitada de registros de Auditoria, gravados em lote por uma thread"""
+
+    def __init__(self, obter_engine, tabela, tamanho_lote=LOTE_PADRAO, intervalo=INTERVALO_PADRAO,
+                 max_fila=MAX_FILA_PADRAO, espera=ESPERA_PADRAO, tentativas=TENTATIVAS_PADRAO,
+                 arquivo_pendentes=ARQUIVO_PENDENTES_PADRAO, modo='assincrono'):
+        if modo not in MODOS:
+            raise ValueError(f'AUDITORIA_MODO inválido: {modo} (use {", ".join(MODOS)})')
+        self.obter_engine = obter_engine  # chamado na thread de gravação
+        self.tabela = tabela
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.max_fila = max_fila
+        self.espera = espera
+        self.tentativas = tentativas
+        self.arquivo_pendentes = arquivo_pendentes
+        self.modo = modo
+
+        self._fila = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._contadores = {'enfileirados': 0, 'gravados': 0, 'lotes': 0, 'gravados_na_hora': 0,
+                         'falhas': 0, 'pendentes_em_arquivo': 0}
+
+    # ---------- registro ----------
+
+    def registrar(self, registros):
+        if self.modo == 'desligado' or not registros:
+            return
+        if self.modo == 'sincrono':
+            self._gravar(registros)
+            return
+
+        fila = self._garantir_thread()
+        for registro in registros:
+            try:
+                fila.put(registro, timeout=self.espera)
+            except queue.Full:
+                # Fila cheia por tempo demais: grava este registro na hora, sem perder a trilha
+                self._contar('gravados_na_hora')
+                self._gravar([registro])
+            else:
+                self._contar('enfileirados')
+
+    def _contar(self, nome, quantidade=1):
+        with self._lock:
+            self._contadores[nome] += quantidade
+
+    def _garantir_thread(self):
+        """Cria a fila e a thread no primeiro uso de cada processo (depois do fork do gunicorn)"""
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._fila = queue.Queue(maxsize=self.max_fila)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._drenar, args=(self._fila,),
+                                                name='auditoria', daemon=True)
+                self._thread.start()
+            return self._fila
+
+    # ---------- gravação ----------
+
+    def _drenar(self, fila):
+        encerrar = False
+        while not encerrar:
+            lote = []
+            try:
+                primeiro = fila.get(timeout=self.intervalo)
+            except queue.Empty:
+                continue
+            prazo = time.monotonic() + self.intervalo
+            item = primeiro
+            while True:
+                if item is _FIM:
+                    encerrar = True
+                else:
+                    lote.append(item)
+                if encerrar or len(lote) >= self.tamanho_lote:
+                    break
+                try:
+                    item = fila.get(timeout=max(prazo - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            try:
+                self._gravar(lote)
+            finally:
+                for _ in range(len(lote) + (1 if encerrar else 0)):
+                    fila.task_done()
+
+    def _gravar(self, lote):
+        """INSERT de várias linhas, com novas tentativas; se tudo falhar, vai para o arquivo"""
+        if not lote:
+            return
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                with self.obter_engine().begin() as conn:
+                    conn.execute(insert(self.tabela), lote)
+            except Exception as e:
+                self._contar('falhas')
+                logger.warning(f'Auditoria: falha ao gravar {len(lote)} registros '
+                               f'(tentativa {tentativa}/{self.tentativas}): {e}')
+                if tentativa < self.tentativas:
+                    time.sleep(min(0.5 * 2 ** (tentativa - 1), 5))
+            else:
+                self._contar('gravados', len(lote))
+                self._contar('lotes')
+                return
+        self._guardar_pendentes(lote)
+
+    def _guardar_pendentes(self, lote):
+        try:
+            pasta = os.path.dirname(self.arquivo_pendentes)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            with self._lock, open(self.arquivo_pendentes, 'a', encoding='utf-8') as f:
+                for registro in lote:
+                    f.write(json.dumps(registro, default=_valor, ensure_ascii=False) + '\n')
+            self._contar('pendentes_em_arquivo', len(lote))
+            logger.error(f'Auditoria: {len(lote)} registros guardados em {self.arquivo_pendentes}')
+        except OSError as e:
+            logger.critical(f'Auditoria: {len(lote)} registros perdidos ({e}): {lote!r}')
+
+    def reenviar_pendentes(self):
+        """Grava os registros do arquivo de pendentes. Retorna quantos foram gravados"""
+        if not os.path.exists(self.arquivo_pendentes):
+            return 0
+        processando = self.arquivo_pendentes + '.reenviando'
+        os.replace(self.arquivo_pendentes, processando)
+        with open(processando, encoding='utf-8') as f:
+            registros = [json.loads(linha) for linha in f if linha.strip()]
+        for registro in registros:
+            registro['timestamp'] = datetime.fromisoformat(registro['timestamp'])
+        for inicio in range(0, len(registros), self.tamanho_lote):
+            self._gravar(registros[inicio:inicio + self.tamanho_lote])
+        os.remove(processando)
+        return len(registros)
+
+    # ---------- esvaziamento ----------
+
+    def esvaziar(self):
+        """Espera a fila deste processo ser gravada"""
+        with self._lock:
+            fila = self._fila if self._pid == os.getpid() else None
+        if fila is not None and self._thread is not None and self._thread.is_alive():
+            fila.join()
+
+    def encerrar(self, timeout=10):
+        """Grava o que estiver na fila e para a thread (registrado no atexit)"""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._fila.put(_FIM)
+            thread.join(timeout)
+
+    def metricas(self):
+        with self._lock:
+            fila = self._fila.qsize() if self._fila is not None and self._pid == os.getpid() else 0
+            return {'modo': self.modo, 'fila': fila, 'max_fila': self.max_fila, **self._contadores}
+
+
+# ==================== CAPTURA PELOS EVENTOS DA SESSÃO ====================
+
+def _colunas(objeto):
+    """Colunas já carregadas do objeto (sem SELECT no meio do flush)"""
+    estado = sa_inspect(objeto)
+    return {atributo.key: _valor(estado.dict.get(atributo.key)) for atributo in estado.mapper.column_attrs}
+
+
+def _diferencas(objeto):
+    """(antes, depois) só das colunas alteradas de um objeto modificado"""
+    estado = sa_inspect(objeto)
+    antes, depois = {}, {}
+    for atributo in estado.mapper.column_attrs:
+        historico = estado.attrs[atributo.key].history
+        if not historico.has_changes():
+            continue
+        antes[atributo.key] = _valor(historico.deleted[0]) if historico.deleted else None
+        depois[atributo.key] = _valor(historico.added[0]) if historico.added else None
+    return antes, depois
+
+
+def _contexto_requisicao():
+    """Quem fez a alteração: usuário logado, IP e user agent (None fora de requisições)"""
+    from flask import has_request_context, request
+    if not has_request_context():
+        return None, None, None
+    from flask_login import current_user
+    usuario_id = current_user.get_id() if current_user and current_user.is_authenticated else None
+    return usuario_id, request.remote_addr, request.user_agent.string or None
+
+
+def _escritor_atual():
+    from flask import current_app, has_app_context
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('auditoria')
+
+
+def _capturar(session, flush_context):
+    """after_flush: monta os registros enquanto o histórico dos atributos existe"""
+    if _escritor_atual() is None:
+        return
+    from models import TZ
+    usuario_id = ip = user_agent = None
+    contexto_lido = False
+    registros = session.info.setdefault('auditoria_pendente', [])
+    for operacao, objetos in (('Criar', session.new), ('Editar', session.dirty), ('Excluir', session.deleted)):
+        for objeto in objetos:
+            entidade = type(objeto).__name__
+            if entidade not in ENTIDADES_AUDITADAS:
+                continue
+            if operacao == 'Criar':
+                antes, depois = None, _colunas(objeto)
+            elif operacao == 'Excluir':
+                antes, depois = _colunas(objeto), None
+            else:
+                antes, depois = _diferencas(objeto)
+                if not depois:
+                    continue  # só relacionamentos mudaram
+            if not contexto_lido:
+                usuario_id, ip, user_agent = _contexto_requisicao()
+                contexto_lido = True
+            registros.append({
+                'timestamp': datetime.now(TZ),
+                'usuario_id': usuario_id,
+                'acao': f'{operacao} {entidade}',
+                'entidade': entidade,
+                'entidade_id': sa_inspect(objeto).dict.get('id'),
+                'detalhes': json.dumps({'antes': antes, 'depois': depois}, default=str, ensure_ascii=False),
+                'ip_address': ip,
+                'user_agent': user_agent,
+            })
+
+
+def _enviar(session):
+    """after_commit: os registros da transação seguem para o escritor"""
+    registros = session.info.pop('auditoria_pendente', None)
+    escritor = _escritor_atual()
+    if registros and escritor is not None:
+        escritor.registrar(registros)
+
+
+def _descartar(session, previous_transaction):
+    """after_soft_rollback: nada foi gravado, nada é auditado"""
+    if not session.in_transaction():
+        session.info.pop('auditoria_pendente', None)
+
+
+def registrar_eventos():
+    """Liga a captura a todas as sessões (uma vez por processo)"""
+    if not event.contains(Session, 'after_flush', _capturar):
+        event.listen(Session, 'after_flush', _capturar)
+        event.listen(Session, 'after_commit', _enviar)
+        event.listen(Session, 'after_soft_rollback', _descartar)
+
+
+def iniciar(app, db):
+    """Escritor configurado pelo app (AUDITORIA_*), com os eventos e o esvaziamento no atexit"""
+    from models import Auditoria
+
+    def obter_engine():
+        with app.app_context():
+            return db.engine
+
+    escritor = EscritorAuditoria(
+        obter_engine,
+        Auditoria.__table__,
+        tamanho_lote=int(app.config.get('AUDITORIA_LOTE', LOTE_PADRAO)),
+        intervalo=float(app.config.get('AUDITORIA_INTERVALO', INTERVALO_PADRAO)),
+        max_fila=int(app.config.get('AUDITORIA_MAX_FILA', MAX_FILA_PADRAO)),
+        espera=float(app.config.get('AUDITORIA_ESPERA', ESPERA_PADRAO)),
+        tentativas=int(app.config.get('AUDITORIA_TENTATIVAS', TENTATIVAS_PADRAO)),
+        arquivo_pendentes=app.config.get('AUDITORIA_ARQUIVO_PENDENTES', ARQUIVO_PENDENTES_PADRAO),
+        modo=app.config.get('AUDITORIA_MODO', 'assincrono'),
+    )
+    if escritor.modo != 'desligado':
+        registrar_eventos()
+        atexit.register(escritor.encerrar)
+    app.extensions['auditoria'] = escritor
+    return escritor
@@ -0,0 +1,94 @@
+"""
+⏱️ Benchmark do hash de senhas - logins por segundo por núcleo
+
+Simula um pico de logins: `--clientes` requisições simultâneas verificando
+senhas pelo ServicoSenhas (mesmo pool limitado usado pelo app) durante
+`--duracao` segundos. Use para escolher o custo: o tempo de um login deve
+ficar aceitável para o usuário e os logins/s por núcleo devem cobrir o
+pico de troca de turno.
+
+Uso:
+    python bench_senhas.py [--algoritmo bcrypt|argon2id] [--custo 12]
+                           [--memoria 65536] [--tempo 3] [--paralelismo 1]
+                           [--threads N] [--clientes N] [--duracao 10]
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from senhas import FilaSenhasCheia, ServicoSenhas
+
+
+def medir(servico, clientes, duracao):
+    senha = 'senha-do-benchmark'
+    senha_hash = servico.gerar_hash_agora(senha)
+    latencias, recusados = [], [0]
+    lock = threading.Lock()
+    fim = time.perf_counter() + duracao
+
+    def cliente():
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                assert servico.verificar(senha_hash, senha)
+            except FilaSenhasCheia:
+                with lock:
+                    recusados[0] += 1
+                continue
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+
+    threads = [threading.Thread(target=cliente) for _ in range(clientes)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencias, recusados[0], time.perf_counter() - inicio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do hash de senhas (logins/s por núcleo)')
+    parser.add_argument('--algoritmo', default='bcrypt', choices=['bcrypt', 'argon2id'])
+    parser.add_argument('--custo', type=int, default=12, help='custo do bcrypt (log2 das rodadas)')
+    parser.add_argument('--memoria', type=int, default=65536, help='memória do argon2id, em KiB')
+    parser.add_argument('--tempo', type=int, default=3, help='iterações do argon2id')
+    parser.add_argument('--paralelismo', type=int, default=1, help='paralelismo do argon2id')
+    parser.add_argument('--threads', type=int, default=0, help='threads do pool (0 = número de CPUs)')
+    parser.add_argument('--clientes', type=int, default=0, help='logins simultâneos (0 = 2x as threads)')
+    parser.add_argument('--duracao', type=float, default=10, help='segundos de medição')
+    args = parser.parse_args(argv)
+
+    servico = ServicoSenhas(algoritmo=args.algoritmo, custo_bcrypt=args.custo,
+                            argon2_memoria_kib=args.memoria, argon2_tempo=args.tempo,
+                            argon2_paralelismo=args.paralelismo, threads=args.threads or None,
+                            max_fila=10 ** 6)
+    clientes = args.clientes or servico.threads * 2
+    nucleos = min(servico.threads, os.cpu_count() or 1)
+
+    parametros = (f'custo {args.custo}' if args.algoritmo == 'bcrypt'
+                  else f'{args.memoria} KiB, t={args.tempo}, p={args.paralelismo}')
+    print(f'{args.algoritmo} ({parametros}) | {servico.threads} threads, {clientes} clientes, {args.duracao:g}s')
+
+    try:
+        latencias, recusados, segundos = medir(servico, clientes, args.duracao)
+    finally:
+        servico.encerrar()
+
+    if not latencias:
+        print('Nenhum login concluído: aumente --duracao')
+        return
+    por_segundo = len(latencias) / segundos
+    latencias.sort()
+    print(f'  logins:            {len(latencias)} em {segundos:.1f}s ({recusados} recusados)')
+    print(f'  logins/s:          {por_segundo:.1f}')
+    print(f'  logins/s/núcleo:   {por_segundo / nucleos:.1f} ({nucleos} núcleos)')
+    print(f'  latência p50/p95:  {statistics.median(latencias) * 1000:.0f} / '
+          f'{latencias[int(len(latencias) * 0.95) - 1] * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+👤 Cache de usuários - Flask-Login sem consulta ao banco a cada requisição
+
+O `user_loader` das duas versões do sistema consultava o usuário em toda
+requisição autenticada (SELECT no app.py, ida e volta ao Supabase no
+app_sheets.py). Aqui os dados do usuário ficam em um LRU em memória com
+TTL e, opcionalmente, em um segundo nível no Redis compartilhado entre
+workers (CACHE_TYPE=redis + CACHE_REDIS_URL).
+
+Com o Redis ativo, o TTL do nível local é curto: a invalidação feita em
+um worker apaga a chave do Redis, e os outros workers deixam de ver o
+dado antigo quando a entrada local expira.
+
+Invalidação: editar_perfil, novo_usuario/novo_motorista e qualquer
+alteração de Usuario pelo ORM (inclusive desativação), ver
+`registrar_invalidacao_orm`.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+TTL_PADRAO = 60  # segundos
+TTL_LOCAL_COM_REDIS = 5
+MAX_ITENS_PADRAO = 1024
+TIPOS_REDIS = ('redis', 'rediscache')
+
+
+class CacheUsuarios:
+    """LRU com TTL por processo, com um nível remoto opcional (backend cachelib)"""
+
+    def __init__(self, max_itens=MAX_ITENS_PADRAO, ttl=TTL_PADRAO, remoto=None, ttl_local=None):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.remoto = remoto
+        if ttl_local is None:
+            ttl_local = min(ttl, TTL_LOCAL_COM_REDIS) if remoto is not None else ttl
+        self.ttl_local = ttl_local
+        self._itens = OrderedDict()  # chave -> (expira_em, dados)
+        self._lock = threading.Lock()
+
+    def _chave_remota(self, chave):
+        return f'usuario:{chave}'
+
+    def _ler_local(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira_em, dados = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return dados
+
+    def _gravar_local(self, chave, dados):
+        if self.ttl_local <= 0:
+            return
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl_local, dados)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def _ler_remoto(self, chave):
+        if self.remoto is None:
+            return None
+        try:
+            return self.remoto.get(self._chave_remota(chave))
+        except Exception as e:
+            # Redis fora do ar não pode derrubar o login: segue para a origem
+            logger.warning(f'Cache de usuários (Redis) indisponível: {e}')
+            return None
+
+    def _gravar_remoto(self, chave, dados):
+        if self.remoto is None:
+            return
+        try:
+            self.remoto.set(self._chave_remota(chave), dados, timeout=self.ttl)
+        except Exception as e:
+            logger.warning(f'Cache de usuários (Redis) indisponível: {e}')
+
+    def obter(self, chave, carregar):
+        """Dados do usuário `chave`; em caso de falta chama `carregar()` (None não é guardado)"""
+        if chave is None:
+            return None
+        dados = self._ler_local(chave)
+        if dados is not None:
+            return dados
+        dados = self._ler_remoto(chave)
+        if dados is None:
+            dados = carregar()
+            if dados is None:
+                return None
+            self._gravar_remoto(chave, dados)
+        self._gravar_local(chave, dados)
+        return dados
+
+    def invalidar(self, *chaves):
+        """Remove usuários do cache (local e remoto)"""
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+        if self.remoto is not None:
+            try:
+                self.remoto.delete_many(*(self._chave_remota(chave) for chave in chaves))
+            except Exception as e:
+                logger.warning(f'Cache de usuários (Redis) indisponível: {e}')
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+def criar_cache(tipo=None, url_redis=None, ttl=TTL_PADRAO, max_itens=MAX_ITENS_PADRAO):
+    """Cria o cache a partir da configuração (CACHE_TYPE / CACHE_REDIS_URL)"""
+    remoto = None
+    if url_redis and str(tipo or '').lower() in TIPOS_REDIS:
+        try:
+            import redis
+            from cachelib.redis import RedisCache
+            remoto = RedisCache(host=redis.from_url(url_redis), key_prefix='frota_globo:', default_timeout=ttl)
+        except ImportError:
+            logger.warning('Pacote redis não instalado: cache de usuários só em memória')
+    return CacheUsuarios(max_itens=max_itens, ttl=ttl, remoto=remoto)
+
+
+# ==================== INTEGRAÇÃO COM O ORM (app.py) ====================
+
+# password_hash fica fora do cache; se for acessado, é carregado sob demanda
+_COLUNAS_CACHEADAS = ('id', 'nome', 'role', 'telefone', 'email', 'ativo', 'data_criacao')
+
+
+def dados_usuario(usuario):
+    """Colunas do Usuario que vão para o cache"""
+    return {coluna: getattr(usuario, coluna) for coluna in _COLUNAS_CACHEADAS}
+
+
+def carregar_usuario(cache, user_id):
+    """Usuario para o Flask-Login, reconstruído do cache sem SELECT.
+
+    O objeto é anexado à sessão como persistente, então alterações feitas
+    nele (ex: editar_perfil) são gravadas normalmente no commit.
+    """
+    from models import db, Usuario
+
+    existente = db.session.identity_map.get(db.session.identity_key(Usuario, user_id)) \
+        if user_id is not None else None
+    if existente is not None:
+        return existente
+
+    def consultar():
+        usuario = db.session.get(Usuario, user_id)
+        return dados_usuario(usuario) if usuario else None
+
+    dados = cache.obter(user_id, consultar)
+    if dados is None:
+        return None
+    return anexar_usuario(dados)
+
+
+def anexar_usuario(dados):
+    """Usuario persistente reconstruído de `dados_usuario`, sem SELECT"""
+    from sqlalchemy.orm import make_transient_to_detached
+    from models import db, Usuario
+
+    existente = db.session.identity_map.get(db.session.identity_key(Usuario, dados['id']))
+    if existente is not None:
+        # Já carregado nesta sessão (ex: por consultar() em carregar_usuario)
+        return existente
+
+    usuario = Usuario(**dados)
+    make_transient_to_detached(usuario)
+    db.session.add(usuario)
+    return usuario
+
+
+def registrar_invalidacao_orm(cache):
+    """Invalida o cache após o commit de qualquer inserção, alteração ou remoção de Usuario"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from models import Usuario
+
+    @event.listens_for(Session, 'after_flush')
+    def _marcar_usuarios(session, flush_context):
+        alterados = session.info.setdefault('usuarios_alterados', set())
+        for objeto in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(objeto, Usuario) and objeto.id is not None:
+                alterados.add(objeto.id)
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidar_usuarios(session):
+        alterados = session.info.pop('usuarios_alterados', None)
+        if alterados:
+            cache.invalidar(*alterados)
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def _descartar_marcas(session, previous_transaction):
+        if not session.in_transaction():
+            session.info.pop('usuarios_alterados', None)
+
+    return _marcar_usuarios, _invalidar_usuarios, _descartar_marcas
@@ -0,0 +1,171 @@
+"""
+📅 Conflitos de agendamento - Índice de intervalos por veículo e dia
+
+Impede que o mesmo veículo seja agendado duas vezes no mesmo horário.
+Para cada (placa, data) os agendamentos ativos ficam ordenados pelo início,
+junto com o maior fim acumulado; assim uma verificação de sobreposição é
+feita com duas buscas binárias (O(log n)).
+
+No PostgreSQL a regra também é garantida pela constraint de exclusão
+`excl_agendamento_sem_sobreposicao` (tsrange + GiST), que cobre inserções
+concorrentes entre workers.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, time
+
+from models import db, Agendamento
+from status import StatusAgendamento
+
+# Status que ocupam o veículo no horário agendado
+STATUS_ATIVOS = (StatusAgendamento.AGENDADO, StatusAgendamento.CONFIRMADO, StatusAgendamento.EM_USO)
+
+
+def _minutos(hora):
+    """Converte um `time` em minutos desde a meia-noite"""
+    return hora.hour * 60 + hora.minute
+
+
+class IntervalosDoDia:
+    """Agendamentos de um veículo em um dia, ordenados pelo início.
+
+    `_fim_maximo[i]` guarda o maior fim entre os intervalos 0..i, o que
+    permite achar uma sobreposição por busca binária mesmo quando os dados
+    legados já contêm intervalos sobrepostos.
+    """
+
+    def __init__(self):
+        self._intervalos = []  # (inicio, fim, sequencia, referencia)
+        self._inicios = []
+        self._fim_maximo = []
+        self._sequencia = 0
+
+    def __len__(self):
+        return len(self._intervalos)
+
+    def conflito(self, inicio, fim):
+        """Retorna a referência de um intervalo que se sobrepõe a [inicio, fim), ou None"""
+        # Candidatos: intervalos que começam antes do fim do novo
+        k = bisect_left(self._inicios, fim)
+        if k == 0 or self._fim_maximo[k - 1] <= inicio:
+            return None
+        # Primeiro intervalo cujo fim acumulado passa do início do novo
+        j = bisect_right(self._fim_maximo, inicio, 0, k)
+        return self._intervalos[j][3]
+
+    def adicionar(self, inicio, fim, referencia):
+        """Inclui um intervalo (O(n) para manter o fim acumulado)"""
+        self._sequencia += 1
+        item = (inicio, fim, self._sequencia, referencia)
+        posicao = bisect_right(self._intervalos, item)
+        self._intervalos.insert(posicao, item)
+        self._inicios.insert(posicao, inicio)
+        self._fim_maximo.insert(posicao, 0)
+        anterior = self._fim_maximo[posicao - 1] if posicao else 0
+        for i in range(posicao, len(self._intervalos)):
+            anterior = max(anterior, self._intervalos[i][1])
+            self._fim_maximo[i] = anterior
+
+
+@dataclass
+class PedidoAgendamento:
+    """Pedido de agendamento a ser validado (formulário ou lote de um evento)"""
+    placa: str
+    data_solicitada: date
+    hora_inicio: time
+    hora_fim: time
+    referencia: object = None  # Identificação livre do pedido (linha da planilha, id externo...)
+
+
+@dataclass
+class ResultadoValidacao:
+    """Resultado da validação de um pedido"""
+    pedido: PedidoAgendamento
+    conflito: object = None  # Agendamento existente ou PedidoAgendamento do mesmo lote
+    erro: str = None
+
+    @property
+    def valido(self):
+        return self.conflito is None and self.erro is None
+
+
+@dataclass
+class IndiceConflitos:
+    """Índice de intervalos por (placa, data), carregado do banco em uma única consulta"""
+    dias: dict = field(default_factory=lambda: defaultdict(IntervalosDoDia))
+
+    @classmethod
+    def carregar(cls, chaves, ignorar_id=None):
+        """Carrega os agendamentos ativos das chaves (placa, data) informadas"""
+        indice = cls()
+        chaves = set(chaves)
+        if not chaves:
+            return indice
+
+        placas = {placa for placa, _ in chaves}
+        datas = {data for _, data in chaves}
+        stmt = db.select(Agendamento).where(
+            Agendamento.placa.in_(placas),
+            Agendamento.data_solicitada.in_(datas),
+            Agendamento.status.in_(STATUS_ATIVOS),
+        )
+        if ignorar_id is not None:
+            stmt = stmt.where(Agendamento.id != ignorar_id)
+
+        for agendamento in db.session.execute(stmt).scalars():
+            chave = (agendamento.placa, agendamento.data_solicitada)
+            if chave in chaves:
+                indice.dias[chave].adicionar(
+                    _minutos(agendamento.hora_inicio), _minutos(agendamento.hora_fim), agendamento
+                )
+        return indice
+
+    def verificar(self, pedido):
+        """Valida um pedido contra o índice, sem reservá-lo"""
+        inicio, fim = _minutos(pedido.hora_inicio), _minutos(pedido.hora_fim)
+        if fim <= inicio:
+            return ResultadoValidacao(pedido, erro='Hora fim deve ser maior que hora início')
+        conflito = self.dias[(pedido.placa, pedido.data_solicitada)].conflito(inicio, fim)
+        return ResultadoValidacao(pedido, conflito=conflito)
+
+    def reservar(self, pedido):
+        """Valida o pedido e, se estiver livre, ocupa o horário no índice"""
+        resultado = self.verificar(pedido)
+        if resultado.valido:
+            self.dias[(pedido.placa, pedido.data_solicitada)].adicionar(
+                _minutos(pedido.hora_inicio), _minutos(pedido.hora_fim), pedido
+            )
+        return resultado
+
+
+def verificar_conflito(placa, data_solicitada, hora_inicio, hora_fim, ignorar_id=None):
+    """Verifica um único agendamento. Retorna o ResultadoValidacao"""
+    pedido = PedidoAgendamento(placa, data_solicitada, hora_inicio, hora_fim)
+    indice = IndiceConflitos.carregar([(placa, data_solicitada)], ignorar_id=ignorar_id)
+    return indice.verificar(pedido)
+
+
+def validar_lote(pedidos):
+    """Valida um lote de pedidos em uma passada.
+
+    Carrega de uma vez os agendamentos ativos de todas as (placa, data) do
+    lote e valida cada pedido contra eles e contra os pedidos anteriores do
+    próprio lote. Retorna um ResultadoValidacao por pedido, na mesma ordem.
+    """
+    pedidos = list(pedidos)
+    indice = IndiceConflitos.carregar((p.placa, p.data_solicitada) for p in pedidos)
+    return [indice.reservar(pedido) for pedido in pedidos]
+
+
+def descrever_conflito(conflito):
+    """Texto curto para mensagens de erro"""
+    if isinstance(conflito, Agendamento):
+        return (f'agendamento #{conflito.id} de {conflito.hora_inicio.strftime("%H:%M")} '
+                f'às {conflito.hora_fim.strftime("%H:%M")}')
+    if isinstance(conflito, PedidoAgendamento):
+        referencia = f' {conflito.referencia}' if conflito.referencia is not None else ''
+        return (f'pedido{referencia} de {conflito.hora_inicio.strftime("%H:%M")} '
+                f'às {conflito.hora_fim.strftime("%H:%M")} do mesmo lote')
+    return str(conflito)
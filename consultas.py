@@ -0,0 +1,168 @@
+"""
+🔎 Consultas das rotas - Carregamento antecipado de relacionamentos
+
+Cada rota que lista viagens ou agendamentos usa uma consulta daqui, que já
+traz os relacionamentos acessados pelo template (motorista, veículo,
+agendamento). Sem isso, cada `v.motorista.nome` no Jinja dispara um SELECT
+próprio (problema N+1).
+
+Também fica aqui a guarda de testes que conta os comandos SQL de cada
+requisição (SQL_MAX_QUERIES_POR_REQUEST).
+"""
+
+from datetime import datetime, time, timedelta
+
+from flask import g, has_request_context
+from sqlalchemy import event, or_, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db, Usuario, Veiculo, Agendamento, Viagem
+from status import StatusVeiculo, StatusViagem, StatusAgendamento
+
+
+# ==================== VIAGENS ====================
+
+def viagens_em_rota(limite=None, offset=0):
+    """Viagens em andamento com motorista (dashboard)"""
+    stmt = (
+        db.select(Viagem)
+        .options(joinedload(Viagem.motorista))
+        .where(Viagem.data_chegada == None, Viagem.status == StatusViagem.EM_ANDAMENTO)
+        .order_by(Viagem.data_saida.desc())
+    )
+    if limite:
+        stmt = stmt.limit(limite).offset(offset)
+    return db.session.execute(stmt).scalars().all()
+
+
+def viagens_em_aberto():
+    """Viagens sem chegada registrada, com motorista, veículo e agendamento (cronograma)"""
+    stmt = (
+        db.select(Viagem)
+        .options(
+            joinedload(Viagem.motorista),
+            joinedload(Viagem.veiculo),
+            joinedload(Viagem.agendamento),
+        )
+        .where(Viagem.data_chegada == None)
+        .order_by(Viagem.data_saida.desc())
+    )
+    return db.session.execute(stmt).scalars().all()
+
+
+def codificar_cursor(viagem):
+    """Cursor do histórico: posição (data_chegada, id) da última viagem exibida"""
+    return f'{viagem.data_chegada.isoformat()},{viagem.id}'
+
+
+def decodificar_cursor(cursor):
+    """Inverso de codificar_cursor. Retorna None para cursores inválidos"""
+    try:
+        data_chegada, viagem_id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(data_chegada), int(viagem_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def historico_paginado(cursor=None, de=None, ate=None, placa=None, motorista=None, per_page=20):
+    """Página do histórico por keyset em (data_chegada, id), mais recentes primeiro.
+
+    Os filtros (período de chegada, placa, nome/email do motorista) são
+    aplicados no banco, e a página seguinte continua a partir do cursor em
+    vez de usar OFFSET, então o custo não cresce com o tamanho da tabela.
+    Retorna (viagens, proximo_cursor).
+    """
+    stmt = (
+        db.select(Viagem)
+        .options(selectinload(Viagem.motorista))
+        .where(Viagem.data_chegada != None)
+        .order_by(Viagem.data_chegada.desc(), Viagem.id.desc())
+        .limit(per_page + 1)
+    )
+    if de:
+        stmt = stmt.where(Viagem.data_chegada >= datetime.combine(de, time.min))
+    if ate:
+        stmt = stmt.where(Viagem.data_chegada < datetime.combine(ate + timedelta(days=1), time.min))
+    if placa:
+        stmt = stmt.where(Viagem.placa == placa.strip().upper())
+    if motorista:
+        termo = f'%{motorista.strip()}%'
+        stmt = stmt.where(Viagem.motorista_id.in_(
+            db.select(Usuario.id).where(or_(Usuario.nome.ilike(termo), Usuario.email.ilike(termo)))
+        ))
+
+    posicao = decodificar_cursor(cursor) if cursor else None
+    if posicao:
+        stmt = stmt.where(tuple_(Viagem.data_chegada, Viagem.id) < tuple_(*posicao))
+
+    viagens = db.session.execute(stmt).scalars().all()
+    proximo_cursor = None
+    if len(viagens) > per_page:
+        viagens = viagens[:per_page]
+        proximo_cursor = codificar_cursor(viagens[-1])
+    return viagens, proximo_cursor
+
+
+# ==================== AGENDAMENTOS ====================
+
+def agendamentos_paginados(page, per_page=20):
+    """Página de agendamentos com veículo e solicitante"""
+    stmt = (
+        db.select(Agendamento)
+        .options(joinedload(Agendamento.veiculo), joinedload(Agendamento.usuario_agendador))
+        .order_by(Agendamento.id)
+    )
+    return db.paginate(stmt, page=page, per_page=per_page)
+
+
+def agendamentos_confirmados():
+    """Agendamentos prontos para registrar saída (o formulário só mostra a placa: sem JOIN)"""
+    stmt = db.select(Agendamento).where(Agendamento.status == StatusAgendamento.CONFIRMADO)
+    return db.session.execute(stmt).scalars().all()
+
+
+# ==================== VEÍCULOS E USUÁRIOS ====================
+
+def veiculos_disponiveis(limite=None, offset=0):
+    """Veículos disponíveis ordenados pela placa"""
+    stmt = db.select(Veiculo).where(Veiculo.status == StatusVeiculo.DISPONIVEL).order_by(Veiculo.placa)
+    if limite:
+        stmt = stmt.limit(limite).offset(offset)
+    return db.session.execute(stmt).scalars().all()
+
+
+def motoristas():
+    """Usuários com papel de motorista"""
+    stmt = db.select(Usuario).where(Usuario.role == 'motorista')
+    return db.session.execute(stmt).scalars().all()
+
+
+# ==================== GUARDA DE TESTES ====================
+
+def _contar_comando(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_comandos' in g:
+        g.sql_comandos += 1
+
+
+def registrar_guarda_sql(app, limite):
+    """Falha a requisição que executar mais de `limite` comandos SQL.
+
+    Pensado para testes (TestingConfig): transforma um N+1 reintroduzido em
+    um AssertionError em vez de uma página lenta em produção.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _contar_comando):
+        event.listen(Engine, 'before_cursor_execute', _contar_comando)
+
+    @app.before_request
+    def _iniciar_contagem_sql():
+        g.sql_comandos = 0
+
+    @app.after_request
+    def _verificar_contagem_sql(response):
+        comandos = g.pop('sql_comandos', 0)
+        if comandos > limite:
+            raise AssertionError(
+                f'{comandos} comandos SQL em uma requisição (limite {limite})'
+            )
+        return response
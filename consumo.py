@@ -0,0 +1,139 @@
+"""
+⛽ Consumo de combustível - km/l por abastecimento com funções de janela
+
+Calcula o consumo de todos os abastecimentos em uma única consulta:
+LAG(km_atual) OVER (PARTITION BY placa ORDER BY data_abastecimento) dá o
+hodômetro do abastecimento anterior do mesmo veículo, e uma média móvel
+sobre os abastecimentos anteriores serve de referência para marcar
+valores fora do padrão (possível fraude, erro de digitação ou vazamento).
+
+Substitui o cálculo linha a linha de Abastecimento.get_consumo_km_litro
+nas listas. Para um único abastecimento, consumo_do_abastecimento busca
+só o anterior (ORDER BY ... DESC LIMIT 1), sem a janela.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func, tuple_
+
+from models import db, Abastecimento
+
+JANELA_MEDIA = 5  # Abastecimentos anteriores usados na média móvel
+TOLERANCIA = 0.35  # Desvio relativo em relação à média que marca um outlier
+
+
+@dataclass
+class ConsumoAbastecimento:
+    """Consumo calculado de um abastecimento"""
+    id: int
+    placa: str
+    data_abastecimento: datetime
+    litros: float
+    km_atual: float
+    km_rodados: float = None  # Desde o abastecimento anterior do veículo
+    km_por_litro: float = None
+    media_movel: float = None  # Média dos JANELA_MEDIA consumos anteriores
+    outlier: bool = False
+    motivo: str = None
+
+
+def _consulta(placa=None, de=None, ate=None, janela=JANELA_MEDIA):
+    """SELECT com LAG e média móvel; os filtros de data ficam fora da janela"""
+    ordem = (Abastecimento.data_abastecimento, Abastecimento.id)
+    base = db.select(
+        Abastecimento.id, Abastecimento.placa, Abastecimento.data_abastecimento,
+        Abastecimento.litros, Abastecimento.km_atual,
+        func.lag(Abastecimento.km_atual).over(partition_by=Abastecimento.placa, order_by=ordem)
+        .label('km_anterior'),
+    )
+    if placa:
+        base = base.where(Abastecimento.placa == placa)
+    base = base.subquery()
+
+    km_rodados = base.c.km_atual - base.c.km_anterior
+    consumo = db.case((base.c.litros > 0, km_rodados / base.c.litros), else_=None)
+    com_consumo = db.select(base, km_rodados.label('km_rodados'), consumo.label('km_por_litro')).subquery()
+
+    media_movel = func.avg(com_consumo.c.km_por_litro).over(
+        partition_by=com_consumo.c.placa,
+        order_by=(com_consumo.c.data_abastecimento, com_consumo.c.id),
+        rows=(-janela, -1),
+    )
+    stmt = db.select(
+        com_consumo.c.id, com_consumo.c.placa, com_consumo.c.data_abastecimento,
+        com_consumo.c.litros, com_consumo.c.km_atual, com_consumo.c.km_rodados,
+        com_consumo.c.km_por_litro, media_movel.label('media_movel'),
+    ).order_by(com_consumo.c.placa, com_consumo.c.data_abastecimento, com_consumo.c.id)
+
+    # Filtrar depois da janela: o primeiro abastecimento do período ainda
+    # enxerga o anterior a ele
+    filtrado = stmt.subquery()
+    stmt = db.select(filtrado)
+    if de:
+        stmt = stmt.where(filtrado.c.data_abastecimento >= datetime.combine(de, time.min))
+    if ate:
+        stmt = stmt.where(filtrado.c.data_abastecimento < datetime.combine(ate + timedelta(days=1), time.min))
+    return stmt.order_by(filtrado.c.placa, filtrado.c.data_abastecimento, filtrado.c.id)
+
+
+def _classificar(item, tolerancia):
+    if item.km_rodados is not None and item.km_rodados < 0:
+        item.outlier, item.motivo = True, 'Hodômetro menor que no abastecimento anterior'
+    elif item.km_por_litro is not None and item.media_movel:
+        desvio = (item.km_por_litro - item.media_movel) / item.media_movel
+        if abs(desvio) > tolerancia:
+            sentido = 'abaixo' if desvio < 0 else 'acima'
+            item.outlier = True
+            item.motivo = f'Consumo {abs(desvio):.0%} {sentido} da média do veículo'
+    return item
+
+
+def consumo_abastecimentos(placa=None, de=None, ate=None, janela=JANELA_MEDIA, tolerancia=TOLERANCIA):
+    """Consumo de cada abastecimento (de um veículo ou da frota toda), em uma consulta"""
+    linhas = db.session.execute(_consulta(placa, de, ate, janela)).mappings()
+    return [_classificar(ConsumoAbastecimento(**linha), tolerancia) for linha in linhas]
+
+
+def consumo_do_abastecimento(abastecimento_id):
+    """km/l de um único abastecimento (None se for o primeiro do veículo).
+
+    Busca só o abastecimento anterior do veículo, na mesma ordem do LAG
+    (data_abastecimento, id), em vez de rodar a janela sobre o histórico.
+    """
+    abastecimento = db.session.get(Abastecimento, abastecimento_id)
+    if abastecimento is None or abastecimento.litros <= 0:
+        return None
+    km_anterior = db.session.scalar(
+        db.select(Abastecimento.km_atual)
+        .where(
+            Abastecimento.placa == abastecimento.placa,
+            tuple_(Abastecimento.data_abastecimento, Abastecimento.id)
+            < tuple_(abastecimento.data_abastecimento, abastecimento.id),
+        )
+        .order_by(Abastecimento.data_abastecimento.desc(), Abastecimento.id.desc())
+        .limit(1)
+    )
+    if km_anterior is None:
+        return None
+    return (abastecimento.km_atual - km_anterior) / abastecimento.litros
+
+
+def resumo_por_veiculo(de=None, ate=None, tolerancia=TOLERANCIA):
+    """Média de km/l e quantidade de outliers por placa.
+
+    Retorna {placa: {'abastecimentos', 'km_por_litro_medio', 'outliers'}}.
+    """
+    resumo = {}
+    for item in consumo_abastecimentos(de=de, ate=ate, tolerancia=tolerancia):
+        veiculo = resumo.setdefault(item.placa, {'abastecimentos': 0, 'km_rodados': 0, 'litros': 0, 'outliers': 0})
+        veiculo['abastecimentos'] += 1
+        veiculo['outliers'] += int(item.outlier)
+        if item.km_rodados is not None and item.km_rodados >= 0:
+            veiculo['km_rodados'] += item.km_rodados
+            veiculo['litros'] += item.litros
+    for veiculo in resumo.values():
+        litros = veiculo.pop('litros')
+        km = veiculo.pop('km_rodados')
+        veiculo['km_por_litro_medio'] = km / litros if litros else None
+    return resumo
@@ -0,0 +1,278 @@
+"""
+📦 Exportação colunar - viagens, agendamentos, abastecimentos e manutenções
+em Parquet/Arrow para análise offline
+
+Em vez de planilhas montadas à mão, `flask exportar` grava as tabelas em
+arquivos Parquet (ou Arrow IPC) particionados por mês, no formato de
+diretórios `ano=AAAA/mes=MM` que pandas, DuckDB, Spark e pyarrow.dataset
+leem direto:
+
+    EXPORTACAO_DIR/viagens/ano=2026/mes=10/20261018T020000-0001.parquet
+
+A leitura é em fluxo: um único SELECT com yield_per (cursor do lado do
+servidor no PostgreSQL) entregue em lotes de EXPORTACAO_LOTE linhas, que
+viram RecordBatches do Arrow e vão direto para os arquivos. A memória
+fica constante, seja qual for o tamanho do histórico.
+
+Exportação incremental por marca d'água, guardada em
+`EXPORTACAO_DIR/_marcas.json`:
+
+- `id` (todas as tabelas): linhas com id maior que o último exportado;
+- `data_chegada` (só viagens): viagens finalizadas depois da última
+  chegada exportada, desempatando pelo id (índice idx_viagem_chegada_id).
+
+Os arquivos são gravados com nome temporário e só aparecem, junto com a
+nova marca, quando a exportação termina: uma execução interrompida não
+deixa arquivos pela metade nem pula linhas na seguinte.
+
+A rota /exportar/<tabela> (só admin) devolve a mesma leitura como stream
+Arrow IPC, sem tocar o disco do servidor.
+
+Requer o pacote opcional pyarrow.
+"""
+
+import io
+import json
+import os
+from collections import OrderedDict
+from datetime import date, datetime, time, timezone
+from enum import Enum
+
+from sqlalchemy import select, tuple_
+
+from models import db, Viagem, Agendamento, Abastecimento, Manutencao
+
+# Tabela exportada -> (modelo, coluna de data que define a partição ano/mês)
+TABELAS = {
+    'viagens': (Viagem, 'data_saida'),
+    'agendamentos': (Agendamento, 'data_solicitada'),
+    'abastecimentos': (Abastecimento, 'data_abastecimento'),
+    'manutencoes': (Manutencao, 'data_manutencao'),
+}
+MARCAS = ('id', 'data_chegada')
+FORMATOS = ('parquet', 'arrow')
+LOTE_PADRAO = 5000
+MAX_ARQUIVOS_ABERTOS = 16  # partições ano/mês com arquivo aberto ao mesmo tempo
+ARQUIVO_MARCAS = '_marcas.json'
+MIMETYPE_ARROW = 'application/vnd.apache.arrow.stream'
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError('A exportação Parquet/Arrow requer o pacote pyarrow') from None
+    return pyarrow
+
+
+def verificar(tabela, marca='id', formato='parquet'):
+    """ValueError se a tabela, a marca d'água ou o formato não forem exportáveis"""
+    if tabela not in TABELAS:
+        raise ValueError(f'Tabela não exportável: {tabela} (use {", ".join(TABELAS)})')
+    if marca not in MARCAS or (marca == 'data_chegada' and tabela != 'viagens'):
+        raise ValueError(f'Marca d\'água inválida para {tabela}: {marca}')
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato inválido: {formato} (use {", ".join(FORMATOS)})')
+
+
+# ==================== ESQUEMA E LOTES ====================
+
+def esquema(tabela):
+    """Esquema Arrow das colunas da tabela (tipos fixos, mesmo em lotes só com nulos)"""
+    pa = _pyarrow()
+    tipos = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(), str: pa.string(),
+             datetime: pa.timestamp('us'), date: pa.date32(), time: pa.time64('us')}
+    campos = []
+    for coluna in TABELAS[tabela][0].__table__.columns:
+        try:
+            tipo = tipos.get(coluna.type.python_type, pa.string())
+        except NotImplementedError:
+            tipo = pa.string()
+        campos.append(pa.field(coluna.name, tipo, nullable=coluna.nullable or coluna.primary_key))
+    return pa.schema(campos)
+
+
+def _valor(valor):
+    if isinstance(valor, Enum):
+        return valor.value
+    if isinstance(valor, datetime) and valor.tzinfo is not None:
+        return valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor
+
+
+def _consulta(tabela, marca, desde, lote):
+    modelo = TABELAS[tabela][0]
+    colunas = modelo.__table__.c
+    stmt = select(modelo.__table__)
+    if marca == 'id':
+        if desde is not None:
+            stmt = stmt.where(colunas.id > desde)
+        stmt = stmt.order_by(colunas.id)
+    else:
+        stmt = stmt.where(colunas.data_chegada.is_not(None))
+        if desde is not None:
+            stmt = stmt.where(tuple_(colunas.data_chegada, colunas.id) >
+                              tuple_(datetime.fromisoformat(desde['data_chegada']), desde['id']))
+        stmt = stmt.order_by(colunas.data_chegada, colunas.id)
+    return stmt.execution_options(yield_per=lote)
+
+
+def _nova_marca(marca, linha):
+    if marca == 'id':
+        return linha.id
+    return {'data_chegada': linha.data_chegada.isoformat(), 'id': linha.id}
+
+
+def lotes(tabela, marca='id', desde=None, lote=LOTE_PADRAO):
+    """Gera (RecordBatch, marca do último registro do lote) lendo a tabela em fluxo"""
+    verificar(tabela, marca)
+    pa = _pyarrow()
+    schema = esquema(tabela)
+    nomes = schema.names
+    resultado = db.session.execute(_consulta(tabela, marca, desde, lote))
+    for linhas in resultado.partitions():
+        colunas = {nome: [_valor(linha[i]) for linha in linhas] for i, nome in enumerate(nomes)}
+        yield pa.RecordBatch.from_pydict(colunas, schema=schema), _nova_marca(marca, linhas[-1])
+
+
+# ==================== ARQUIVOS PARTICIONADOS ====================
+
+class _Gravador:
+    """Um arquivo aberto por partição ano/mês, com nome temporário até o fim da exportação"""
+
+    def __init__(self, pasta, schema, formato, execucao):
+        self.pasta = pasta
+        self.schema = schema
+        self.formato = formato
+        self.execucao = execucao
+        self._abertos = OrderedDict()  # partição -> (escritor, caminho temporário)
+        self._prontos = []  # caminhos temporários já fechados
+        self._sequencia = 0
+
+    def _abrir(self, particao):
+        pa = _pyarrow()
+        self._sequencia += 1
+        pasta = os.path.join(self.pasta, *particao)
+        os.makedirs(pasta, exist_ok=True)
+        # Prefixo "_": pyarrow.dataset, Spark e DuckDB ignoram o arquivo até ele ser publicado
+        caminho = os.path.join(pasta, f'_{self.execucao}-{self._sequencia:04d}.{self.formato}')
+        if self.formato == 'parquet':
+            import pyarrow.parquet as pq
+            escritor = pq.ParquetWriter(caminho, self.schema, compression='zstd')
+        else:
+            escritor = pa.ipc.new_file(caminho, self.schema)
+        return escritor, caminho
+
+    def escrever(self, particao, lote):
+        if particao in self._abertos:
+            self._abertos.move_to_end(particao)
+        else:
+            if len(self._abertos) >= MAX_ARQUIVOS_ABERTOS:
+                self._fechar(next(iter(self._abertos)))
+            self._abertos[particao] = self._abrir(particao)
+        self._abertos[particao][0].write_batch(lote)
+
+    def _fechar(self, particao):
+        escritor, caminho = self._abertos.pop(particao)
+        escritor.close()
+        self._prontos.append(caminho)
+
+    def concluir(self):
+        """Fecha tudo e publica os arquivos (tira o "_"). Retorna os caminhos finais"""
+        for particao in list(self._abertos):
+            self._fechar(particao)
+        finais = []
+        for caminho in self._prontos:
+            final = os.path.join(os.path.dirname(caminho), os.path.basename(caminho)[1:])
+            os.replace(caminho, final)
+            finais.append(final)
+        return finais
+
+    def descartar(self):
+        while self._abertos:
+            escritor, caminho = self._abertos.popitem(last=False)[1]
+            self._prontos.append(caminho)
+            try:
+                escritor.close()
+            except Exception:
+                pass
+        for caminho in self._prontos:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+
+def _particoes_do_lote(lote, coluna):
+    """Índices das linhas do lote agrupados por (ano=AAAA, mes=MM)"""
+    grupos = {}
+    for i, valor in enumerate(lote.column(coluna).to_pylist()):
+        chave = (f'ano={valor.year}', f'mes={valor.month:02d}') if valor else ('ano=sem_data', 'mes=sem_data')
+        grupos.setdefault(chave, []).append(i)
+    return grupos
+
+
+def ler_marcas(pasta):
+    caminho = os.path.join(pasta, ARQUIVO_MARCAS)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _gravar_marcas(pasta, marcas):
+    caminho = os.path.join(pasta, ARQUIVO_MARCAS)
+    with open(caminho + '.parcial', 'w', encoding='utf-8') as f:
+        json.dump(marcas, f, indent=2, ensure_ascii=False)
+    os.replace(caminho + '.parcial', caminho)
+
+
+def exportar(tabela, pasta, marca='id', formato='parquet', lote=LOTE_PADRAO, completa=False):
+    """Exporta as linhas novas (ou todas, com `completa`) da tabela. Retorna um resumo da execução"""
+    verificar(tabela, marca, formato)
+    pa = _pyarrow()
+    os.makedirs(pasta, exist_ok=True)
+    marcas = ler_marcas(pasta)
+    chave_marca = f'{tabela}:{marca}'
+    desde = None if completa else marcas.get(chave_marca)
+
+    coluna_particao = TABELAS[tabela][1]
+    execucao = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    gravador = _Gravador(os.path.join(pasta, tabela), esquema(tabela), formato, execucao)
+    linhas, ultima = 0, desde
+    try:
+        for registros, ultima in lotes(tabela, marca, desde, lote):
+            for particao, indices in _particoes_do_lote(registros, coluna_particao).items():
+                gravador.escrever(particao, registros.take(pa.array(indices)))
+            linhas += registros.num_rows
+        arquivos = gravador.concluir()
+    except BaseException:
+        gravador.descartar()
+        raise
+
+    if ultima is not None:
+        marcas[chave_marca] = ultima
+        _gravar_marcas(pasta, marcas)
+    return {'tabela': tabela, 'linhas': linhas, 'arquivos': arquivos, 'marca': ultima}
+
+
+# ==================== STREAM ARROW (rota /exportar) ====================
+
+def stream_arrow(tabela, marca='id', desde=None, lote=LOTE_PADRAO):
+    """Bytes de um stream Arrow IPC com as linhas após `desde` (para Response do Flask).
+
+    Valida os parâmetros na hora; a leitura só começa quando a resposta é consumida.
+    """
+    verificar(tabela, marca)
+    pa = _pyarrow()
+    schema = esquema(tabela)
+
+    def gerar():
+        buffer = io.BytesIO()
+        with pa.ipc.new_stream(buffer, schema) as escritor:
+            for registros, _ in lotes(tabela, marca, desde, lote):
+                escritor.write_batch(registros)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()  # cabeçalho (se não houve lotes) e marcador de fim do stream
+
+    return gerar()
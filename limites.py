@@ -0,0 +1,129 @@
+"""
+🚦 Limites de tentativas - login e cadastro protegidos contra força bruta
+
+Cada POST em /login custava uma consulta e um bcrypt, sem limite nenhum:
+credential stuffing virava CPU queimada. Aqui o Flask-Limiter (já no
+requirements) aplica janelas deslizantes (estratégia moving-window):
+
+- por IP, contando todas as tentativas (LOGIN_LIMITE_IP, REGISTRO_LIMITE_IP);
+- por conta (email digitado), contando só os logins que falharam
+  (LOGIN_LIMITE_CONTA), para que ninguém trave a conta de outra pessoa
+  com poucas tentativas e o dono ainda consiga entrar;
+- por email cadastrado, contando todos os pedidos de cadastro
+  (REGISTRO_LIMITE_CONTA), contra o mesmo email enviado de vários IPs.
+
+O IP é o da conexão. Atrás de proxy (Vercel, nginx, balanceador) todas as
+requisições chegariam com o IP do proxy e dividiriam o mesmo limite:
+PROXY_CONFIAVEIS diz quantos proxies confiáveis ficam na frente do app
+(padrão: 1 na Vercel, 0 nos demais), e o IP passa a vir do
+X-Forwarded-For via werkzeug ProxyFix. Não aumente o valor além dos
+proxies reais, ou o cliente escolhe o próprio IP pelo cabeçalho.
+
+Os limites são verificados antes da view, então a tentativa recusada não
+chega ao banco nem ao bcrypt. O armazenamento é RATELIMIT_STORAGE_URL
+(redis://... compartilhado entre workers, ou memory://); se o Redis cair,
+o Flask-Limiter segue com limites em memória. As recusas são contadas por
+limite em `metricas()` (exposto em /metricas no app.py).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, request
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+logger = logging.getLogger(__name__)
+
+PADROES = {
+    'LOGIN_LIMITE_IP': '20 per minute',
+    'LOGIN_LIMITE_CONTA': '5 per 15 minutes',
+    'REGISTRO_LIMITE_IP': '5 per hour',
+    'REGISTRO_LIMITE_CONTA': '3 per hour',
+}
+
+limiter = Limiter(
+    key_func=get_remote_address,
+    strategy='moving-window',
+    # Sem X-RateLimit-*: o Flask-Limiter poria Retry-After da janela em toda
+    # resposta da rota, inclusive no 503 de senhas.FilaSenhasCheia
+    headers_enabled=False,
+    swallow_errors=True,
+    in_memory_fallback_enabled=True,
+)
+
+_recusas = Counter()
+_lock = threading.Lock()
+
+
+def iniciar(app):
+    """Liga o limiter ao app (app.py via config.py; app_sheets.py via variáveis de ambiente)"""
+    for chave, padrao in PADROES.items():
+        app.config.setdefault(chave, os.environ.get(chave, padrao))
+    app.config.setdefault('PROXY_CONFIAVEIS', os.environ.get('PROXY_CONFIAVEIS', 1 if os.environ.get('VERCEL') else 0))
+    proxies = int(app.config['PROXY_CONFIAVEIS'])
+    if proxies > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+    app.config.setdefault('RATELIMIT_STORAGE_URI', app.config.get('RATELIMIT_STORAGE_URL')
+                          or os.environ.get('RATELIMIT_STORAGE_URL') or 'memory://')
+    limiter.init_app(app)
+    app.register_error_handler(429, _muitas_tentativas)
+
+
+def _muitas_tentativas(erro):
+    limite = limiter.current_limit
+    segundos = max(int(limite.reset_at - time.time()), 1) if limite else 60
+    return 'Muitas tentativas. Aguarde alguns minutos e tente novamente.', 429, {'Retry-After': str(segundos)}
+
+
+def _limite(chave):
+    return lambda: current_app.config[chave]
+
+
+def _contar_recusa(nome):
+    def ao_recusar(limite):
+        with _lock:
+            _recusas[nome] += 1
+        logger.warning(f'🚦 Tentativa recusada ({nome}, {limite.limit}): {limite.key}')
+
+    return ao_recusar
+
+
+def _conta(campo):
+    """Chave por conta: o email digitado, normalizado (vazio cai no IP)"""
+    def chave():
+        valor = (request.form.get(campo) or '').strip().lower()
+        return f'conta:{valor}' if valor else get_remote_address()
+
+    return chave
+
+
+def _login_falhou(resposta):
+    # Login certo redireciona; errado devolve o formulário (200) ou um erro
+    return resposta.status_code != 302
+
+
+def limitar_login(view, campo='username'):
+    """Limites de /login: por IP (todas as tentativas) e por conta (só as que falharam)"""
+    view = limiter.limit(_limite('LOGIN_LIMITE_CONTA'), key_func=_conta(campo), methods=['POST'],
+                         deduct_when=_login_falhou, on_breach=_contar_recusa('login_conta'),
+                         scope='login-conta')(view)
+    return limiter.limit(_limite('LOGIN_LIMITE_IP'), methods=['POST'],
+                         on_breach=_contar_recusa('login_ip'), scope='login-ip')(view)
+
+
+def limitar_registro(view, campo='email'):
+    """Limites de /register: por IP e por email cadastrado (todas as tentativas)"""
+    view = limiter.limit(_limite('REGISTRO_LIMITE_CONTA'), key_func=_conta(campo), methods=['POST'],
+                         on_breach=_contar_recusa('registro_conta'), scope='registro-conta')(view)
+    return limiter.limit(_limite('REGISTRO_LIMITE_IP'), methods=['POST'],
+                         on_breach=_contar_recusa('registro_ip'), scope='registro-ip')(view)
+
+
+def metricas():
+    with _lock:
+        return {'recusas': dict(_recusas), 'total_recusas': sum(_recusas.values())}
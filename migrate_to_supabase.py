@@ -1,134 +1,306 @@
 """
 Migrate data from Google Sheets to Supabase
-Run this script once to transfer all existing data
+
+Rows are sent as multi-row upserts in batches, so running the script again
+never duplicates data: users and vehicles conflict on their unique
+email/placa, agendamentos and viagens get a deterministic UUID derived from
+the source row. After every batch a checkpoint file per table records how
+far the table got, and an interrupted migration resumes from there.
+
+Rows that already exist in Supabase are left alone (ON CONFLICT DO
+NOTHING): once the app runs on Supabase, passwords, vehicle status and
+bookings change there, and a re-run (or --restart) must not put the stale
+sheet values back. Pass --overwrite to replace them with the sheet's.
+
+Note: agendamentos/viagens copied by the old one-row-per-call version of
+this script have random ids and are not matched by the deterministic ones;
+use --dry-run to compare source and target counts before migrating.
+
+Usage:
+    python migrate_to_supabase.py [--batch-size 500] [--checkpoint-dir .migration_checkpoints]
+                                  [--dry-run] [--restart] [--overwrite] [--yes]
 """
 
+import os
 import sys
-from sheets_db import SheetsDB
-from supabase_db import SupabaseDB
-
-def migrate_users(sheets_db, supabase_db):
-    """Migrate users from Sheets to Supabase"""
-    print("Migrating users...")
-    users = sheets_db.get_users()
-    
-    for user in users:
-        user_data = {
-            'email': user.get('Email'),
-            'senha': user.get('Senha'),
-            'nome': user.get('Nome'),
-            'role': user.get('Role', 'user'),
-            'telefone': user.get('Telefone', '')
-        }
-        
-        if user_data['email'] and user_data['senha'] and user_data['nome']:
-            try:
-                supabase_db.create_user(user_data)
-                print(f"  ✓ Migrated user: {user_data['nome']}")
-            except Exception as e:
-                print(f"  ✗ Error migrating user {user_data['email']}: {e}")
-    
-    print(f"Users migration complete!\n")
-
-def migrate_veiculos(sheets_db, supabase_db):
-    """Migrate vehicles from Sheets to Supabase"""
-    print("Migrating vehicles...")
-    veiculos = sheets_db.get_veiculos()
-    
-    for veiculo in veiculos:
-        veiculo_data = {
-            'placa': veiculo.get('Placa'),
-            'marca': veiculo.get('Marca'),
-            'modelo': veiculo.get('Modelo'),
-            'ano': veiculo.get('Ano'),
-            'cor': veiculo.get('Cor'),
-            'km_atual': veiculo.get('KM Atual', 0),
-            'status': veiculo.get('Status', 'Disponível')
-        }
-        
-        if veiculo_data['placa'] and veiculo_data['marca'] and veiculo_data['modelo']:
-            try:
-                response = supabase_db.client.table('veiculos').insert(veiculo_data).execute()
-                print(f"  ✓ Migrated vehicle: {veiculo_data['placa']} - {veiculo_data['modelo']}")
-            except Exception as e:
-                print(f"  ✗ Error migrating vehicle {veiculo_data['placa']}: {e}")
-    
-    print(f"Vehicles migration complete!\n")
-
-def migrate_agendamentos(sheets_db, supabase_db):
-    """Migrate agendamentos from Sheets to Supabase"""
-    print("Migrating agendamentos...")
-    agendamentos = sheets_db.get_agendamentos()
-    
-    for agend in agendamentos:
-        agend_data = {
-            'usuario_email': agend.get('Usuario Email'),
-            'placa': agend.get('Placa'),
-            'data_solicitada': agend.get('Data Solicitada'),
-            'hora_inicio': agend.get('Hora Inicio'),
-            'hora_fim': agend.get('Hora Fim'),
-            'passageiros': agend.get('Passageiros'),
-            'destinos': agend.get('Destinos'),
-            'observacoes': agend.get('Observações'),
-            'status': agend.get('Status', 'Agendado'),
-            'motivo_cancelamento': agend.get('Motivo Cancelamento')
-        }
-        
-        if agend_data['placa'] and agend_data['data_solicitada']:
-            try:
-                response = supabase_db.client.table('agendamentos').insert(agend_data).execute()
-                print(f"  ✓ Migrated agendamento: {agend_data['placa']} - {agend_data['data_solicitada']}")
-            except Exception as e:
-                print(f"  ✗ Error migrating agendamento: {e}")
-    
-    print(f"Agendamentos migration complete!\n")
-
-def migrate_viagens(sheets_db, supabase_db):
-    """Migrate viagens from Sheets to Supabase"""
-    print("Migrating viagens...")
-    viagens = sheets_db.get_viagens()
-    
-    for viagem in viagens:
-        viagem_data = {
-            'motorista_email': viagem.get('Motorista Email'),
-            'placa': viagem.get('Placa'),
-            'data_saida': viagem.get('Data Saida'),
-            'data_chegada': viagem.get('Data Chegada'),
-            'km_saida': viagem.get('KM Saida'),
-            'km_chegada': viagem.get('KM Chegada'),
-            'destino': viagem.get('Destino'),
-            'observacoes': viagem.get('Observações'),
-            'status': viagem.get('Status', 'Em Andamento')
+import json
+import uuid
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+BATCH_SIZE = 500
+CHECKPOINT_DIR = '.migration_checkpoints'
+
+# Namespace of the deterministic ids of agendamentos and viagens
+ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'frota-globo/migrate-to-supabase')
+
+
+def _text(value):
+    """Sheet cell as text (get_all_records turns '123456' into an int); empty -> None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _int(value):
+    value = _text(value)
+    return int(float(value)) if value else None
+
+
+def _row_id(table, *parts):
+    return str(uuid.uuid5(ID_NAMESPACE, table + ':' + '|'.join(_text(p) or '' for p in parts)))
+
+
+# ============ SOURCE ROW -> SUPABASE ROW ============
+
+def user_row(user):
+    row = {
+        'email': _text(user.get('Email')),
+        'senha': _text(user.get('Senha')),
+        'nome': _text(user.get('Nome')),
+        'role': _text(user.get('Role')) or _text(user.get('Cargo')) or 'user',
+        'telefone': _text(user.get('Telefone')) or '',
+    }
+    return row if row['email'] and row['senha'] and row['nome'] else None
+
+
+def veiculo_row(veiculo):
+    row = {
+        'placa': _text(veiculo.get('Placa')),
+        'marca': _text(veiculo.get('Marca')),
+        'modelo': _text(veiculo.get('Modelo')),
+        'ano': _int(veiculo.get('Ano')),
+        'cor': _text(veiculo.get('Cor')),
+        'km_atual': _int(veiculo.get('KM Atual')) or 0,
+        'status': _text(veiculo.get('Status')) or 'Disponível',
+    }
+    return row if row['placa'] and row['marca'] and row['modelo'] else None
+
+
+def agendamento_row(agend):
+    row = {
+        'usuario_email': _text(agend.get('Usuario Email')),
+        'placa': _text(agend.get('Placa')),
+        'data_solicitada': _text(agend.get('Data Solicitada')),
+        'hora_inicio': _text(agend.get('Hora Inicio')),
+        'hora_fim': _text(agend.get('Hora Fim')),
+        'passageiros': _text(agend.get('Passageiros')),
+        'destinos': _text(agend.get('Destinos')),
+        'observacoes': _text(agend.get('Observações')),
+        'status': _text(agend.get('Status')) or 'Agendado',
+        'motivo_cancelamento': _text(agend.get('Motivo Cancelamento')),
+    }
+    if not (row['placa'] and row['data_solicitada']):
+        return None
+    row['id'] = _row_id('agendamentos', row['usuario_email'], row['placa'], row['data_solicitada'],
+                        row['hora_inicio'], row['hora_fim'], agend.get('Data Criação'))
+    return row
+
+
+def viagem_row(viagem):
+    row = {
+        'motorista_email': _text(viagem.get('Motorista Email')),
+        'placa': _text(viagem.get('Placa')),
+        'data_saida': _text(viagem.get('Data Saida')),
+        'data_chegada': _text(viagem.get('Data Chegada')),
+        'km_saida': _int(viagem.get('KM Saida')),
+        'km_chegada': _int(viagem.get('KM Chegada')),
+        'destino': _text(viagem.get('Destino')),
+        'observacoes': _text(viagem.get('Observações')),
+        'status': _text(viagem.get('Status')) or 'Em Andamento',
+    }
+    if not (row['motorista_email'] and row['placa'] and row['data_saida']):
+        return None
+    row['id'] = _row_id('viagens', row['motorista_email'], row['placa'], row['data_saida'])
+    return row
+
+
+@dataclass
+class TableMigration:
+    """How one table is read from the sheets and written to Supabase"""
+    table: str
+    read: Callable  # SheetsDB -> list of records
+    transform: Callable  # record -> row, or None to skip an invalid record
+    on_conflict: str
+
+
+TABLES = [
+    TableMigration('usuarios', lambda sheets: sheets.get_users(), user_row, 'email'),
+    TableMigration('veiculos', lambda sheets: sheets.get_veiculos(), veiculo_row, 'placa'),
+    TableMigration('agendamentos', lambda sheets: sheets.get_agendamentos(), agendamento_row, 'id'),
+    TableMigration('viagens', lambda sheets: sheets.get_viagens(), viagem_row, 'id'),
+]
+
+
+# ============ ENGINE ============
+
+class MigrationEngine:
+    def __init__(self, source, client, batch_size=BATCH_SIZE, checkpoint_dir=CHECKPOINT_DIR,
+                 tables=None, log=print, overwrite=False):
+        """`source` is a SheetsDB and `client` a Supabase client (or a fake one).
+
+        With `overwrite`, rows already in Supabase are replaced by the sheet's;
+        by default they are kept.
+        """
+        self.source = source
+        self.overwrite = overwrite
+        self.client = client
+        self.batch_size = batch_size
+        self.checkpoint_dir = checkpoint_dir
+        self.tables = tables or TABLES
+        self.log = log
+
+    # ---------- checkpoints ----------
+
+    def _checkpoint_path(self, table):
+        return os.path.join(self.checkpoint_dir, f'{table}.json')
+
+    def load_checkpoint(self, table):
+        try:
+            with open(self._checkpoint_path(table), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_checkpoint(self, table, checkpoint):
+        """Write through a temp file, so a crash never leaves a truncated checkpoint"""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self._checkpoint_path(table)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({**checkpoint, 'updated_at': datetime.now().isoformat()}, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+    # ---------- source and target ----------
+
+    def source_rows(self, spec):
+        """Valid rows of the table, deduplicated by the conflict key (the last one wins).
+
+        A single upsert cannot touch the same row twice, so duplicates in
+        the sheet must not reach the same batch.
+        """
+        rows = {}
+        skipped = 0
+        for record in spec.read(self.source):
+            row = spec.transform(record)
+            if row is None:
+                skipped += 1
+                continue
+            rows[row[spec.on_conflict]] = row
+        return list(rows.values()), skipped
+
+    def target_count(self, table):
+        response = self.client.table(table).select('id', count='exact').limit(1).execute()
+        return response.count or 0
+
+    # ---------- migration ----------
+
+    def migrate_table(self, spec, restart=False):
+        """Upsert the table in batches (existing rows kept unless `overwrite`), resuming from its checkpoint"""
+        rows, skipped = self.source_rows(spec)
+        checkpoint = {} if restart else self.load_checkpoint(spec.table)
+        start = checkpoint.get('done', 0)
+
+        if start:
+            last_key = rows[start - 1][spec.on_conflict] if start <= len(rows) else None
+            if last_key != checkpoint.get('last_key'):
+                # Rows were added or removed before the checkpoint: upserts are
+                # idempotent, so starting over is safe
+                self.log(f"  ! {spec.table}: source changed since the checkpoint, starting over")
+                start = 0
+            elif start == len(rows):
+                self.log(f"  = {spec.table}: already migrated ({start} rows)")
+                return {'table': spec.table, 'source': len(rows), 'sent': 0, 'skipped': skipped}
+            else:
+                self.log(f"  > {spec.table}: resuming at row {start + 1} of {len(rows)}")
+
+        sent = 0
+        for offset in range(start, len(rows), self.batch_size):
+            batch = rows[offset:offset + self.batch_size]
+            self.client.table(spec.table).upsert(batch, on_conflict=spec.on_conflict,
+                                                 ignore_duplicates=not self.overwrite).execute()
+            sent += len(batch)
+            done = offset + len(batch)
+            self.save_checkpoint(spec.table, {
+                'done': done,
+                'last_key': batch[-1][spec.on_conflict],
+                'source_rows': len(rows),
+                'complete': done == len(rows),
+            })
+            self.log(f"  ✓ {spec.table}: {done}/{len(rows)}")
+
+        if not rows:
+            self.save_checkpoint(spec.table, {'done': 0, 'last_key': None, 'source_rows': 0, 'complete': True})
+        if skipped:
+            self.log(f"  - {spec.table}: {skipped} rows skipped (missing required fields)")
+        return {'table': spec.table, 'source': len(rows), 'sent': sent, 'skipped': skipped}
+
+    def dry_run(self, spec):
+        """Source vs target row counts, without writing anything"""
+        rows, skipped = self.source_rows(spec)
+        target = self.target_count(spec.table)
+        checkpoint = self.load_checkpoint(spec.table)
+        result = {
+            'table': spec.table,
+            'source': len(rows),
+            'target': target,
+            'difference': len(rows) - target,
+            'skipped': skipped,
+            'checkpoint': checkpoint.get('done'),
         }
-        
-        if viagem_data['motorista_email'] and viagem_data['placa'] and viagem_data['data_saida']:
-            try:
-                response = supabase_db.client.table('viagens').insert(viagem_data).execute()
-                print(f"  ✓ Migrated viagem: {viagem_data['placa']} - {viagem_data['status']}")
-            except Exception as e:
-                print(f"  ✗ Error migrating viagem: {e}")
-    
-    print(f"Viagens migration complete!\n")
-
-def main():
+        self.log(f"  {spec.table:<14} source={result['source']:<7} target={target:<7} "
+                 f"difference={result['difference']:<+7} skipped={skipped}")
+        return result
+
+    def run(self, dry_run=False, restart=False):
+        results = []
+        for spec in self.tables:
+            self.log(f"{'Comparing' if dry_run else 'Migrating'} {spec.table}...")
+            results.append(self.dry_run(spec) if dry_run else self.migrate_table(spec, restart=restart))
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migrate Google Sheets data to Supabase')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per upsert request')
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR, help='where the per-table checkpoints go')
+    parser.add_argument('--dry-run', action='store_true', help='only compare source and target row counts')
+    parser.add_argument('--restart', action='store_true', help='ignore existing checkpoints')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='replace rows that already exist in Supabase with the sheet values')
+    parser.add_argument('--yes', action='store_true', help='do not ask for confirmation')
+    args = parser.parse_args(argv)
+
     print("="*60)
     print("  MIGRAÇÃO GOOGLE SHEETS → SUPABASE")
     print("="*60)
     print()
-    
+
+    if not (args.dry_run or args.yes):
+        response = input("This will migrate all data from Google Sheets to Supabase. Continue? (yes/no): ")
+        if response.lower() != 'yes':
+            print("Migration cancelled.")
+            return
+
     try:
+        from sheets_db import SheetsDB
+        from supabase_db import SupabaseDB
+
         # Initialize databases
         print("Connecting to databases...")
         sheets_db = SheetsDB()
-        supabase_db = SupabaseDB()
+        supabase_db = SupabaseDB(cache=False)
         print("✓ Connected successfully!\n")
-        
-        # Run migrations
-        migrate_users(sheets_db, supabase_db)
-        migrate_veiculos(sheets_db, supabase_db)
-        migrate_agendamentos(sheets_db, supabase_db)
-        migrate_viagens(sheets_db, supabase_db)
-        
+
+        engine = MigrationEngine(sheets_db, supabase_db.client, batch_size=args.batch_size,
+                                 checkpoint_dir=args.checkpoint_dir, overwrite=args.overwrite)
+        engine.run(dry_run=args.dry_run, restart=args.restart)
+
+        if args.dry_run:
+            return
+
         print("="*60)
         print("  MIGRATION COMPLETE!")
         print("="*60)
@@ -138,14 +310,11 @@ def main():
         print("2. Update app_sheets.py to use supabase_db")
         print("3. Test the application")
         print()
-        
+
     except Exception as e:
         print(f"\n✗ Migration failed: {e}")
+        print("Run the script again to resume from the last checkpoint.")
         sys.exit(1)
 
 if __name__ == "__main__":
-    response = input("This will migrate all data from Google Sheets to Supabase. Continue? (yes/no): ")
-    if response.lower() == 'yes':
-        main()
-    else:
-        print("Migration cancelled.")
+    main()
@@ -2,14 +2,39 @@
 """
 Script de Migração: Google Sheets → PostgreSQL
 Frota Globo - Sprint 1
+
+Pipeline em lote: as chaves já existentes no banco (emails, placas,
+agendamentos e viagens) são carregadas uma vez em conjuntos, as abas são
+lidas em blocos de linhas e as inserções usam bulk_insert_mappings em
+lotes de tamanho configurável. Rodar de novo só insere o que falta.
+
+Cada etapa gera métricas (linhas lidas, inseridas, puladas, erros e
+linhas/s), gravadas em um relatório JSON ao final.
+
+O bulk_insert_mappings passa por fora das rotas que mantêm os contadores
+do dashboard (resumo_frota) e os rollups diários (rollups). Ao final, os
+contadores globais são recalculados, os contadores por dia do período
+migrado são descartados (e recriados na próxima leitura) e os rollups do
+período passam pelo backfill.
+
+Uso:
+    python migrations/migrate_from_sheets.py [--lote 1000] [--bloco 5000] [--relatorio migracao.json]
 """
 import os
 import sys
+import json
+import time
+import argparse
 import gspread
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
+from uuid import uuid4
 from zoneinfo import ZoneInfo
 import logging
 
+from gspread.utils import rowcol_to_a1
+from sqlalchemy import func, select
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,276 +42,431 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Importar contexto do Flask
+# Importar modelos (o app Flask só é carregado em executar())
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app import app, db
-from models import Usuario, Veiculo, Agendamento, Viagem, Auditoria
+from models import db, bcrypt, Usuario, Veiculo, Agendamento, Viagem
+from status import StatusVeiculo, StatusViagem, StatusAgendamento, normalizar
+import resumo_frota
+import rollups
 
 TZ = ZoneInfo('America/Sao_Paulo')
 
+TAMANHO_LOTE = int(os.getenv('MIGRACAO_LOTE', '1000'))  # Linhas por INSERT em lote
+TAMANHO_BLOCO = int(os.getenv('MIGRACAO_BLOCO', '5000'))  # Linhas por leitura da planilha
+SENHA_PADRAO = '123456'
+
+
+class Pular(Exception):
+    """Linha que não deve ser inserida (já existe ou falta uma referência)"""
+
+
+@dataclass
+class MetricasEtapa:
+    """Contadores de uma etapa da migração"""
+    nome: str
+    lidos: int = 0
+    inseridos: int = 0
+    pulados: int = 0
+    erros: int = 0
+    segundos: float = 0.0
+    motivos: dict = field(default_factory=dict)  # motivo -> linhas puladas
+
+    @property
+    def linhas_por_segundo(self):
+        return round(self.lidos / self.segundos, 1) if self.segundos else None
+
+    def pular(self, motivo):
+        self.pulados += 1
+        self.motivos[motivo] = self.motivos.get(motivo, 0) + 1
+
+    def como_dict(self):
+        return {**asdict(self), 'segundos': round(self.segundos, 3), 'linhas_por_segundo': self.linhas_por_segundo}
+
+
+def ler_em_blocos(worksheet, tamanho_bloco=TAMANHO_BLOCO):
+    """Gera (número da linha, registro) lendo `tamanho_bloco` linhas por requisição.
+
+    Evita get_all_records(), que baixa a aba inteira de uma vez. Os valores
+    vêm como texto; a conversão de tipos fica com cada etapa.
+    """
+    cabecalho = worksheet.row_values(1)
+    if not cabecalho:
+        return
+    ultima_coluna = rowcol_to_a1(1, len(cabecalho)).rstrip('0123456789')
+    inicio = 2
+    while True:
+        fim = inicio + tamanho_bloco - 1
+        linhas = worksheet.get(f'A{inicio}:{ultima_coluna}{fim}')
+        for numero, linha in enumerate(linhas, start=inicio):
+            if any(str(valor).strip() for valor in linha):
+                linha = list(linha) + [''] * (len(cabecalho) - len(linha))
+                yield numero, dict(zip(cabecalho, linha))
+        if len(linhas) < tamanho_bloco:
+            return
+        inicio = fim + 1
+
+
+def _texto(record, coluna, padrao=''):
+    valor = record.get(coluna)
+    valor = '' if valor is None else str(valor).strip()
+    return valor or padrao
+
+
+def _numero(record, coluna, tipo=float, padrao=None):
+    valor = _texto(record, coluna)
+    if not valor:
+        return padrao
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')  # Formato brasileiro: 1.234,5
+    return tipo(float(valor))
+
+
+def _data_hora(record, coluna, padrao=None):
+    valor = _texto(record, coluna)
+    return datetime.fromisoformat(valor) if valor else padrao
+
+
+def _sem_fuso(valor):
+    """Chave de comparação: o banco devolve DateTime sem fuso"""
+    return valor.replace(tzinfo=None) if isinstance(valor, datetime) else valor
+
+
 class MigracaoGoogleSheets:
-    def __init__(self):
+    def __init__(self, spreadsheet=None, tamanho_lote=TAMANHO_LOTE, tamanho_bloco=TAMANHO_BLOCO,
+                 relatorio='migracao_relatorio.json'):
         self.gc = None
-        self.spreadsheet = None
-        self.stats = {
-            'usuarios_criados': 0,
-            'usuarios_erro': 0,
-            'veiculos_criados': 0,
-            'veiculos_erro': 0,
-            'agendamentos_criados': 0,
-            'agendamentos_erro': 0,
-            'viagens_criadas': 0,
-            'viagens_erro': 0,
-        }
-    
+        self.spreadsheet = spreadsheet
+        self.tamanho_lote = tamanho_lote
+        self.tamanho_bloco = tamanho_bloco
+        self.relatorio = relatorio
+        self.metricas = []
+        self.agora = datetime.now(TZ)
+        self.periodo_viagens = None  # (primeiro, último) dia de saída das viagens migradas
+
+    @property
+    def stats(self):
+        """Contadores no formato antigo (usuarios_criados, usuarios_erro, ...)"""
+        stats = {}
+        for etapa in self.metricas:
+            stats[f'{etapa.nome}_criados'] = etapa.inseridos
+            stats[f'{etapa.nome}_erro'] = etapa.erros
+        return stats
+
     def conectar_sheets(self):
         """Conectar ao Google Sheets"""
         try:
             logger.info('🔐 Conectando ao Google Sheets...')
-            
+
             # Verificar se arquivo de credenciais existe
             if not os.path.exists('credentials.json'):
                 logger.error('❌ Arquivo credentials.json não encontrado!')
                 logger.error('📖 Consulte CONFIGURAR_CREDENCIAIS.md para setup')
                 raise FileNotFoundError('credentials.json')
-            
+
             self.gc = gspread.service_account(filename='credentials.json')
-            
+
             # Obter ID da planilha a partir de .env
             spreadsheet_id = os.getenv('GOOGLE_SHEETS_ID')
             if not spreadsheet_id:
                 logger.error('❌ GOOGLE_SHEETS_ID não configurado em .env')
                 raise ValueError('GOOGLE_SHEETS_ID')
-            
+
             self.spreadsheet = self.gc.open_by_key(spreadsheet_id)
             logger.info('✅ Conectado ao Google Sheets')
             return True
         except Exception as e:
             logger.error(f'❌ Erro ao conectar: {str(e)}')
             return False
-    
-    def migrar_usuarios(self):
-        """Migrar Usuários"""
+
+    # ==================== PIPELINE ====================
+
+    def _inserir_lote(self, modelo, lote, metricas):
+        """INSERT em lote; se o lote falhar, insere linha a linha para isolar as linhas ruins"""
         try:
-            logger.info('\n📝 Migrando Usuários...')
-            
-            worksheet = self.spreadsheet.worksheet('Usuários')
-            records = worksheet.get_all_records()
-            
-            for i, record in enumerate(records, 1):
-                try:
-                    # Verificar se já existe
-                    if Usuario.query.filter_by(email=record['Email']).first():
-                        logger.warning(f"⏭️  Usuário {record['Email']} já existe, pulando...")
-                        continue
-                    
-                    usuario = Usuario(
-                        email=record['Email'],
-                        nome=record.get('Nome', 'Sem Nome'),
-                        role=record.get('Cargo', 'Motorista'),
-                        telefone=record.get('Telefone', ''),
-                        ativo=record.get('Ativo', 'Sim').lower() in ['sim', 'true', '1']
-                    )
-                    
-                    # Definir senha padrão (123456)
-                    usuario.set_senha('123456')
-                    
-                    db.session.add(usuario)
-                    self.stats['usuarios_criados'] += 1
-                    logger.info(f"  ✅ {i}. {usuario.email} ({usuario.role})")
-                
-                except Exception as e:
-                    logger.error(f"  ❌ Erro na linha {i}: {str(e)}")
-                    self.stats['usuarios_erro'] += 1
-            
+            db.session.bulk_insert_mappings(modelo, lote)
             db.session.commit()
-            logger.info(f"✅ Usuários: {self.stats['usuarios_criados']} criados, {self.stats['usuarios_erro']} erros")
-        
+            metricas.inseridos += len(lote)
+            return
         except Exception as e:
-            logger.error(f'❌ Erro migrando usuários: {str(e)}')
-    
-    def migrar_veiculos(self):
-        """Migrar Veículos"""
+            db.session.rollback()
+            logger.warning(f'  ⚠️  Lote de {len(lote)} linhas falhou ({e}); inserindo linha a linha')
+
+        for linha in lote:
+            try:
+                db.session.bulk_insert_mappings(modelo, [linha])
+                db.session.commit()
+                metricas.inseridos += 1
+            except Exception as e:
+                db.session.rollback()
+                metricas.erros += 1
+                logger.error(f'  ❌ Erro ao inserir linha: {str(e)}')
+
+    def _etapa(self, nome, aba, modelo, converter):
+        """Lê a aba em blocos, converte cada registro e insere em lotes.
+
+        `converter(record)` devolve o dicionário de colunas do modelo, ou
+        levanta Pular (linha ignorada) ou outra exceção (erro na linha).
+        """
+        metricas = MetricasEtapa(nome)
+        self.metricas.append(metricas)
+        inicio = time.perf_counter()
+
         try:
-            logger.info('\n🚗 Migrando Veículos...')
-            
-            worksheet = self.spreadsheet.worksheet('Veículos')
-            records = worksheet.get_all_records()
-            
-            for i, record in enumerate(records, 1):
+            worksheet = self.spreadsheet.worksheet(aba)
+            lote = []
+            for numero, record in ler_em_blocos(worksheet, self.tamanho_bloco):
+                metricas.lidos += 1
                 try:
-                    # Verificar se já existe
-                    if Veiculo.query.filter_by(placa=record['Placa']).first():
-                        logger.warning(f"⏭️  Veículo {record['Placa']} já existe, pulando...")
-                        continue
-                    
-                    veiculo = Veiculo(
-                        placa=record['Placa'],
-                        marca=record.get('Marca', 'N/A'),
-                        modelo=record.get('Modelo', 'N/A'),
-                        ano=int(record.get('Ano', 2020)),
-                        cor=record.get('Cor', 'N/A'),
-                        tipo_combustivel=record.get('Combustível', 'Diesel'),
-                        km_atual=float(record.get('KM Atual', 0)),
-                        status=record.get('Status', 'Disponível')
-                    )
-                    
-                    db.session.add(veiculo)
-                    self.stats['veiculos_criados'] += 1
-                    logger.info(f"  ✅ {i}. {veiculo.placa} - {veiculo.marca} {veiculo.modelo}")
-                
+                    lote.append(converter(record))
+                except Pular as motivo:
+                    metricas.pular(str(motivo))
+                    continue
                 except Exception as e:
-                    logger.error(f"  ❌ Erro na linha {i}: {str(e)}")
-                    self.stats['veiculos_erro'] += 1
-            
-            db.session.commit()
-            logger.info(f"✅ Veículos: {self.stats['veiculos_criados']} criados, {self.stats['veiculos_erro']} erros")
-        
+                    metricas.erros += 1
+                    logger.error(f'  ❌ Erro na linha {numero}: {str(e)}')
+                    continue
+
+                if len(lote) >= self.tamanho_lote:
+                    self._inserir_lote(modelo, lote, metricas)
+                    lote = []
+            if lote:
+                self._inserir_lote(modelo, lote, metricas)
         except Exception as e:
-            logger.error(f'❌ Erro migrando veículos: {str(e)}')
-    
+            metricas.erros += 1
+            logger.error(f'❌ Erro migrando {nome}: {str(e)}')
+
+        metricas.segundos = time.perf_counter() - inicio
+        logger.info(f'✅ {nome}: {metricas.inseridos} criados, {metricas.pulados} pulados, '
+                    f'{metricas.erros} erros ({metricas.linhas_por_segundo or 0} linhas/s)')
+        return metricas
+
+    # ==================== ETAPAS ====================
+
+    def migrar_usuarios(self):
+        """Migrar Usuários"""
+        logger.info('\n📝 Migrando Usuários...')
+        emails = set(db.session.scalars(select(Usuario.email)))
+        # Todos recebem a mesma senha padrão: um hash bcrypt para a etapa, não um por linha
+        senha_hash = bcrypt.generate_password_hash(SENHA_PADRAO).decode('utf-8')
+
+        def converter(record):
+            email = _texto(record, 'Email')
+            if not email:
+                raise ValueError('Email vazio')
+            if email in emails:
+                raise Pular('já existe')
+            emails.add(email)
+            return {
+                'id': str(uuid4())[:8].upper(),
+                'email': email,
+                'nome': _texto(record, 'Nome', 'Sem Nome'),
+                'role': _texto(record, 'Cargo', 'Motorista'),
+                'telefone': _texto(record, 'Telefone'),
+                'ativo': _texto(record, 'Ativo', 'Sim').lower() in ['sim', 'true', '1'],
+                'password_hash': senha_hash,
+                'data_criacao': self.agora,
+            }
+
+        return self._etapa('usuarios', 'Usuários', Usuario, converter)
+
+    def migrar_veiculos(self):
+        """Migrar Veículos"""
+        logger.info('\n🚗 Migrando Veículos...')
+        placas = set(db.session.scalars(select(Veiculo.placa)))
+
+        def converter(record):
+            placa = _texto(record, 'Placa').upper()
+            if not placa:
+                raise ValueError('Placa vazia')
+            if placa in placas:
+                raise Pular('já existe')
+            veiculo = {
+                'placa': placa,
+                'marca': _texto(record, 'Marca', 'N/A'),
+                'modelo': _texto(record, 'Modelo', 'N/A'),
+                'ano': _numero(record, 'Ano', int, 2020),
+                'cor': _texto(record, 'Cor', 'N/A'),
+                'tipo_combustivel': _texto(record, 'Combustível', 'Diesel'),
+                'km_atual': _numero(record, 'KM Atual', float, 0),
+                'status': normalizar(StatusVeiculo, _texto(record, 'Status', 'Disponível')),
+                'data_criacao': self.agora,
+                'data_atualizacao': self.agora,
+            }
+            placas.add(placa)
+            return veiculo
+
+        return self._etapa('veiculos', 'Veículos', Veiculo, converter)
+
     def migrar_agendamentos(self):
         """Migrar Agendamentos"""
-        try:
-            logger.info('\n📅 Migrando Agendamentos...')
-            
-            worksheet = self.spreadsheet.worksheet('Agendamentos')
-            records = worksheet.get_all_records()
-            
-            for i, record in enumerate(records, 1):
-                try:
-                    # Buscar usuário
-                    usuario = Usuario.query.filter_by(email=record.get('Email Solicitante', '')).first()
-                    if not usuario:
-                        logger.warning(f"  ⏭️  Usuário não encontrado, pulando...")
-                        continue
-                    
-                    # Buscar veículo
-                    veiculo = Veiculo.query.filter_by(placa=record.get('Placa', '')).first()
-                    if not veiculo:
-                        logger.warning(f"  ⏭️  Veículo não encontrado, pulando...")
-                        continue
-                    
-                    agendamento = Agendamento(
-                        usuario_id=usuario.id,
-                        placa=veiculo.placa,
-                        data_agendamento=datetime.now(TZ),
-                        data_solicitada=datetime.fromisoformat(record.get('Data Solicitada', datetime.now(TZ).isoformat())),
-                        hora_inicio=record.get('Hora Início', '08:00'),
-                        hora_fim=record.get('Hora Fim', '17:00'),
-                        destinos=record.get('Destinos', ''),
-                        passageiros=int(record.get('Passageiros', 1)),
-                        observacoes=record.get('Observações', ''),
-                        producao_evento=record.get('Produção', 'Não').lower() in ['sim', 'yes'],
-                        status=record.get('Status', 'Aguardando Aprovação')
-                    )
-                    
-                    db.session.add(agendamento)
-                    self.stats['agendamentos_criados'] += 1
-                    logger.info(f"  ✅ {i}. Agendamento para {veiculo.placa} em {agendamento.data_solicitada.date()}")
-                
-                except Exception as e:
-                    logger.error(f"  ❌ Erro na linha {i}: {str(e)}")
-                    self.stats['agendamentos_erro'] += 1
-            
-            db.session.commit()
-            logger.info(f"✅ Agendamentos: {self.stats['agendamentos_criados']} criados, {self.stats['agendamentos_erro']} erros")
-        
-        except Exception as e:
-            logger.error(f'❌ Erro migrando agendamentos: {str(e)}')
-    
+        logger.info('\n📅 Migrando Agendamentos...')
+        usuarios = dict(db.session.execute(select(Usuario.email, Usuario.id)).all())
+        placas = set(db.session.scalars(select(Veiculo.placa)))
+        existentes = set(db.session.execute(select(
+            Agendamento.usuario_id, Agendamento.placa, Agendamento.data_solicitada, Agendamento.hora_inicio
+        )).all())
+
+        def converter(record):
+            usuario_id = usuarios.get(_texto(record, 'Email Solicitante'))
+            if not usuario_id:
+                raise Pular('usuário não encontrado')
+            placa = _texto(record, 'Placa').upper()
+            if placa not in placas:
+                raise Pular('veículo não encontrado')
+
+            data_solicitada = _data_hora(record, 'Data Solicitada', self.agora).date()
+            hora_inicio = datetime.strptime(_texto(record, 'Hora Início', '08:00')[:5], '%H:%M').time()
+            chave = (usuario_id, placa, data_solicitada, hora_inicio)
+            if chave in existentes:
+                raise Pular('já existe')
+
+            producao = _texto(record, 'Produção')
+            agendamento = {
+                'usuario_id': usuario_id,
+                'placa': placa,
+                'data_agendamento': self.agora,
+                'data_solicitada': data_solicitada,
+                'hora_inicio': hora_inicio,
+                'hora_fim': datetime.strptime(_texto(record, 'Hora Fim', '17:00')[:5], '%H:%M').time(),
+                'destinos': _texto(record, 'Destinos'),
+                'passageiros': _numero(record, 'Passageiros', int, 1),
+                'observacoes': _texto(record, 'Observações'),
+                # 'Não' na planilha significa sem evento de produção
+                'producao_evento': None if producao.lower() in ('', 'não', 'nao') else producao,
+                'status': normalizar(StatusAgendamento, _texto(record, 'Status', 'Aguardando Aprovação')),
+                'ultima_atualizacao': self.agora,
+            }
+            existentes.add(chave)
+            return agendamento
+
+        return self._etapa('agendamentos', 'Agendamentos', Agendamento, converter)
+
     def migrar_viagens(self):
         """Migrar Viagens"""
-        try:
-            logger.info('\n🚕 Migrando Viagens...')
-            
-            worksheet = self.spreadsheet.worksheet('Viagens')
-            records = worksheet.get_all_records()
-            
-            for i, record in enumerate(records, 1):
-                try:
-                    # Buscar agendamento
-                    agendamento = Agendamento.query.filter_by(placa=record.get('Placa', '')).first()
-                    if not agendamento:
-                        logger.warning(f"  ⏭️  Agendamento não encontrado, pulando...")
-                        continue
-                    
-                    # Buscar motorista
-                    motorista = Usuario.query.filter_by(email=record.get('Motorista', '')).first()
-                    if not motorista:
-                        logger.warning(f"  ⏭️  Motorista não encontrado, pulando...")
-                        continue
-                    
-                    viagem = Viagem(
-                        agendamento_id=agendamento.id,
-                        motorista_id=motorista.id,
-                        placa=agendamento.placa,
-                        data_saida=datetime.fromisoformat(record.get('Data Saída', datetime.now(TZ).isoformat())),
-                        data_chegada=datetime.fromisoformat(record.get('Data Chegada', datetime.now(TZ).isoformat())),
-                        km_saida=float(record.get('KM Saída', 0)),
-                        km_chegada=float(record.get('KM Chegada', 0)),
-                        status=record.get('Status', 'Finalizada')
-                    )
-                    
-                    db.session.add(viagem)
-                    self.stats['viagens_criadas'] += 1
-                    logger.info(f"  ✅ {i}. Viagem {viagem.placa} ({viagem.get_km_rodados()} km)")
-                
-                except Exception as e:
-                    logger.error(f"  ❌ Erro na linha {i}: {str(e)}")
-                    self.stats['viagens_erro'] += 1
-            
-            db.session.commit()
-            logger.info(f"✅ Viagens: {self.stats['viagens_criadas']} criadas, {self.stats['viagens_erro']} erros")
-        
-        except Exception as e:
-            logger.error(f'❌ Erro migrando viagens: {str(e)}')
-    
+        logger.info('\n🚕 Migrando Viagens...')
+        usuarios = dict(db.session.execute(select(Usuario.email, Usuario.id)).all())
+        # Primeiro agendamento de cada placa (como o filter_by(placa=...).first() de antes)
+        agendamentos = dict(db.session.execute(
+            select(Agendamento.placa, func.min(Agendamento.id)).group_by(Agendamento.placa)
+        ).all())
+        existentes = {(placa, _sem_fuso(saida)) for placa, saida in
+                      db.session.execute(select(Viagem.placa, Viagem.data_saida))}
+
+        def converter(record):
+            placa = _texto(record, 'Placa').upper()
+            agendamento_id = agendamentos.get(placa)
+            if not agendamento_id:
+                raise Pular('agendamento não encontrado')
+            motorista_id = usuarios.get(_texto(record, 'Motorista'))
+            if not motorista_id:
+                raise Pular('motorista não encontrado')
+
+            data_saida = _data_hora(record, 'Data Saída', self.agora)
+            chave = (placa, _sem_fuso(data_saida))
+            if chave in existentes:
+                raise Pular('já existe')
+
+            viagem = {
+                'agendamento_id': agendamento_id,
+                'motorista_id': motorista_id,
+                'placa': placa,
+                'data_saida': data_saida,
+                'data_chegada': _data_hora(record, 'Data Chegada'),
+                'km_saida': _numero(record, 'KM Saída', float, 0),
+                'km_chegada': _numero(record, 'KM Chegada', float),
+                'status': normalizar(StatusViagem, _texto(record, 'Status', 'Finalizada')),
+            }
+            existentes.add(chave)
+            dia = data_saida.date()
+            primeiro, ultimo = self.periodo_viagens or (dia, dia)
+            self.periodo_viagens = (min(primeiro, dia), max(ultimo, dia))
+            return viagem
+
+        return self._etapa('viagens', 'Viagens', Viagem, converter)
+
+    # ==================== AGREGADOS ====================
+
+    def atualizar_agregados(self):
+        """Contadores do dashboard e rollups do período migrado, que o INSERT em lote não atualiza"""
+        logger.info('\n📈 Atualizando contadores e rollups...')
+        agregados = {'periodo_viagens': None, 'contadores_dia_descartados': 0, 'rollups': 0}
+        if self.periodo_viagens:
+            inicio, fim = self.periodo_viagens
+            agregados['periodo_viagens'] = [inicio.isoformat(), fim.isoformat()]
+            agregados['contadores_dia_descartados'] = resumo_frota.descartar_viagens_dia(inicio, fim)
+            agregados['rollups'] = rollups.backfill(inicio, fim)
+        # Depois do descarte: o contador de hoje (se estiver no período) volta recalculado
+        agregados['contadores'] = resumo_frota.recalcular_resumo()
+        logger.info(f"✅ Contadores: {agregados['contadores']}; rollups recalculados: {agregados['rollups']}")
+        return agregados
+
+    # ==================== EXECUÇÃO ====================
+
+    def gravar_relatorio(self, inicio, agregados=None):
+        """Grava as métricas de cada etapa em JSON"""
+        relatorio = {
+            'inicio': inicio.isoformat(),
+            'fim': datetime.now(TZ).isoformat(),
+            'tamanho_lote': self.tamanho_lote,
+            'tamanho_bloco': self.tamanho_bloco,
+            'etapas': [etapa.como_dict() for etapa in self.metricas],
+            'total_inseridos': sum(etapa.inseridos for etapa in self.metricas),
+            'total_erros': sum(etapa.erros for etapa in self.metricas),
+            'agregados': agregados,
+        }
+        if self.relatorio:
+            with open(self.relatorio, 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+            logger.info(f'📄 Relatório gravado em {self.relatorio}')
+        return relatorio
+
+    def migrar(self):
+        """Executa as etapas em ordem (requer contexto do app) e devolve o relatório"""
+        inicio = datetime.now(TZ)
+        self.metricas = []
+        self.periodo_viagens = None
+        self.migrar_usuarios()
+        self.migrar_veiculos()
+        self.migrar_agendamentos()
+        self.migrar_viagens()
+        return self.gravar_relatorio(inicio, self.atualizar_agregados())
+
     def executar(self):
         """Executar migração completa"""
         logger.info('='*50)
         logger.info('🔄 MIGRAÇÃO GOOGLE SHEETS → POSTGRESQL')
         logger.info('='*50)
-        
+
         # Conectar ao Google Sheets
-        if not self.conectar_sheets():
+        if self.spreadsheet is None and not self.conectar_sheets():
             return False
-        
+
         # Executar migrações
+        from app import app
         with app.app_context():
-            self.migrar_usuarios()
-            self.migrar_veiculos()
-            self.migrar_agendamentos()
-            self.migrar_viagens()
-        
+            relatorio = self.migrar()
+
         # Resumo
         logger.info('\n' + '='*50)
         logger.info('📊 RESUMO DA MIGRAÇÃO')
         logger.info('='*50)
-        total_sucesso = sum([
-            self.stats['usuarios_criados'],
-            self.stats['veiculos_criados'],
-            self.stats['agendamentos_criados'],
-            self.stats['viagens_criadas']
-        ])
-        total_erro = sum([
-            self.stats['usuarios_erro'],
-            self.stats['veiculos_erro'],
-            self.stats['agendamentos_erro'],
-            self.stats['viagens_erro']
-        ])
-        
         for chave, valor in self.stats.items():
             logger.info(f'  {chave}: {valor}')
-        
-        logger.info(f'\n✅ TOTAL MIGRADO: {total_sucesso} registros')
-        logger.info(f'❌ TOTAL COM ERRO: {total_erro} registros')
+
+        logger.info(f'\n✅ TOTAL MIGRADO: {relatorio["total_inseridos"]} registros')
+        logger.info(f'❌ TOTAL COM ERRO: {relatorio["total_erros"]} registros')
         logger.info('='*50)
-        
-        return total_erro == 0
+
+        return relatorio['total_erros'] == 0
 
 
 if __name__ == '__main__':
-    migracao = MigracaoGoogleSheets()
+    parser = argparse.ArgumentParser(description='Migração Google Sheets → PostgreSQL')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='linhas por INSERT em lote')
+    parser.add_argument('--bloco', type=int, default=TAMANHO_BLOCO, help='linhas por leitura da planilha')
+    parser.add_argument('--relatorio', default='migracao_relatorio.json', help='arquivo JSON com as métricas')
+    args = parser.parse_args()
+
+    migracao = MigracaoGoogleSheets(tamanho_lote=args.lote, tamanho_bloco=args.bloco, relatorio=args.relatorio)
     sucesso = migracao.executar()
     sys.exit(0 if sucesso else 1)
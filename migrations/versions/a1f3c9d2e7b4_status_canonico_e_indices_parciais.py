@@ -0,0 +1,71 @@
+"""status canônicos e índices parciais de viagens em aberto
+
+Normaliza os status gravados como texto livre em veiculos, viagens e
+agendamentos para os valores de status.py, e cria índices parciais
+(WHERE data_chegada IS NULL) para as buscas de viagens em aberto.
+
+Primeira revisão: parte do schema criado por db.create_all().
+
+Revision ID: a1f3c9d2e7b4
+Revises:
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1f3c9d2e7b4'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# Valor canônico -> grafias (em minúsculas) encontradas nos dados antigos
+STATUS_CANONICOS = {
+    'veiculos': {
+        'disponível': ['disponível', 'disponivel'],
+        'em viagem': ['em viagem', 'em uso'],
+        'em manutenção': ['em manutenção', 'em manutencao', 'manutenção', 'manutencao'],
+        'inativo': ['inativo'],
+    },
+    'viagens': {
+        'Em Andamento': ['em andamento', 'em rota'],
+        'Finalizada': ['finalizada', 'finalizado'],
+    },
+    'agendamentos': {
+        'Agendado': ['agendado', 'aguardando aprovação', 'aguardando aprovacao'],
+        'Confirmado': ['confirmado', 'aprovado'],
+        'Em Uso': ['em uso'],
+        'Finalizado': ['finalizado', 'finalizada', 'realizado'],
+        'Cancelado': ['cancelado'],
+    },
+}
+
+FILTRO_EM_ABERTO = sa.text('data_chegada IS NULL')
+
+
+def upgrade():
+    conn = op.get_bind()
+    for tabela, canonicos in STATUS_CANONICOS.items():
+        for canonico, grafias in canonicos.items():
+            conn.execute(
+                sa.text(
+                    f"UPDATE {tabela} SET status = :canonico "
+                    f"WHERE lower(trim(status)) IN :grafias AND status <> :canonico"
+                ).bindparams(sa.bindparam('grafias', expanding=True)),
+                {'canonico': canonico, 'grafias': grafias},
+            )
+
+    op.create_index('idx_viagem_aberta_data_saida', 'viagens', ['data_saida'], if_not_exists=True,
+                    postgresql_where=FILTRO_EM_ABERTO, sqlite_where=FILTRO_EM_ABERTO)
+    op.create_index('idx_viagem_aberta_placa', 'viagens', ['placa'], if_not_exists=True,
+                    postgresql_where=FILTRO_EM_ABERTO, sqlite_where=FILTRO_EM_ABERTO)
+
+
+def downgrade():
+    # A normalização dos status não é revertida: os valores canônicos
+    # continuam válidos para o código antigo (que comparava com lower()).
+    op.drop_index('idx_viagem_aberta_placa', table_name='viagens')
+    op.drop_index('idx_viagem_aberta_data_saida', table_name='viagens')
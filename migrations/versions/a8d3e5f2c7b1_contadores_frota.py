@@ -0,0 +1,35 @@
+"""contadores materializados do dashboard
+
+Cria `contadores_frota` (veículos disponíveis, viagens em rota e viagens
+do dia, ver resumo_frota.py). A tabela começa vazia: cada contador é
+criado com uma contagem completa na primeira leitura do dashboard.
+
+Revision ID: a8d3e5f2c7b1
+Revises: f1c5a8e3d7b2
+Create Date: 2026-10-18 18:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d3e5f2c7b1'
+down_revision = 'f1c5a8e3d7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'contadores_frota',
+        sa.Column('chave', sa.String(length=50), nullable=False),
+        sa.Column('valor', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('chave'),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('contadores_frota')
@@ -0,0 +1,60 @@
+"""impede agendamentos sobrepostos do mesmo veículo
+
+Cria o índice (placa, data_solicitada) usado pela verificação de conflitos
+e, no PostgreSQL, a constraint de exclusão tsrange + GiST sobre os
+agendamentos ativos.
+
+Revision ID: b7d2e4f81c3a
+Revises: a1f3c9d2e7b4
+Create Date: 2026-10-18 13:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f81c3a'
+down_revision = 'a1f3c9d2e7b4'
+branch_labels = None
+depends_on = None
+
+
+INTERVALO = "tsrange(data_solicitada + hora_inicio, data_solicitada + hora_fim, '[)')"
+STATUS_ATIVOS = "('Agendado', 'Confirmado', 'Em Uso')"
+
+
+def upgrade():
+    op.create_index('idx_agendamento_placa_data', 'agendamentos', ['placa', 'data_solicitada'],
+                    if_not_exists=True)
+
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    sobrepostos = conn.execute(sa.text(
+        f"SELECT a.id, b.id FROM agendamentos a JOIN agendamentos b "
+        f"ON a.placa = b.placa AND a.id < b.id "
+        f"AND a.data_solicitada = b.data_solicitada "
+        f"AND a.hora_inicio < b.hora_fim AND b.hora_inicio < a.hora_fim "
+        f"WHERE a.status IN {STATUS_ATIVOS} AND b.status IN {STATUS_ATIVOS} LIMIT 20"
+    )).all()
+    if sobrepostos:
+        pares = ', '.join(f'{a}/{b}' for a, b in sobrepostos)
+        raise RuntimeError(
+            f'Existem agendamentos ativos sobrepostos (ids {pares}). '
+            f'Cancele ou ajuste esses agendamentos antes de aplicar a migração.'
+        )
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute(
+        f"ALTER TABLE agendamentos ADD CONSTRAINT excl_agendamento_sem_sobreposicao "
+        f"EXCLUDE USING gist (placa WITH =, {INTERVALO} WITH &&) "
+        f"WHERE (status IN {STATUS_ATIVOS})"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE agendamentos DROP CONSTRAINT IF EXISTS excl_agendamento_sem_sobreposicao')
+    op.drop_index('idx_agendamento_placa_data', table_name='agendamentos')
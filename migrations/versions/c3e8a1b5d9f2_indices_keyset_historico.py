@@ -0,0 +1,30 @@
+"""índices de paginação por keyset do histórico
+
+Cria os índices compostos (data_chegada, id) e (placa, data_chegada, id)
+usados pela paginação por cursor de /historico.
+
+Revision ID: c3e8a1b5d9f2
+Revises: b7d2e4f81c3a
+Create Date: 2026-10-18 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8a1b5d9f2'
+down_revision = 'b7d2e4f81c3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_viagem_chegada_id', 'viagens', ['data_chegada', 'id'], if_not_exists=True)
+    op.create_index('idx_viagem_placa_chegada_id', 'viagens', ['placa', 'data_chegada', 'id'],
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_viagem_placa_chegada_id', table_name='viagens')
+    op.drop_index('idx_viagem_chegada_id', table_name='viagens')
@@ -0,0 +1,43 @@
+"""rollups diários da frota
+
+Cria `rollups_diarios` (veículo, motorista e evento por dia). Depois de
+aplicar, rode `flask backfill-rollups` para preencher o histórico.
+
+Revision ID: d4f1b2c6e8a3
+Revises: c3e8a1b5d9f2
+Create Date: 2026-10-18 15:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f1b2c6e8a3'
+down_revision = 'c3e8a1b5d9f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'rollups_diarios',
+        sa.Column('dimensao', sa.String(length=20), nullable=False),
+        sa.Column('chave', sa.String(length=100), nullable=False),
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('viagens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('km', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('horas', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('litros', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('custo_combustivel', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('custo_manutencao', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('dimensao', 'chave', 'dia'),
+        if_not_exists=True,
+    )
+    op.create_index('idx_rollup_dimensao_dia', 'rollups_diarios', ['dimensao', 'dia'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_rollup_dimensao_dia', table_name='rollups_diarios')
+    op.drop_table('rollups_diarios')
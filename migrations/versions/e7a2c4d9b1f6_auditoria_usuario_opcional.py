@@ -0,0 +1,31 @@
+"""auditoria: usuario_id opcional
+
+A trilha de auditoria (ver auditoria.py) também registra alterações feitas
+fora de uma requisição (scripts, jobs, `flask shell`), que não têm usuário
+logado: `auditoria.usuario_id` passa a aceitar NULL.
+
+Revision ID: e7a2c4d9b1f6
+Revises: d4f1b2c6e8a3
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c4d9b1f6'
+down_revision = 'd4f1b2c6e8a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('auditoria') as batch_op:
+        batch_op.alter_column('usuario_id', existing_type=sa.String(length=50), nullable=True)
+
+
+def downgrade():
+    op.execute("DELETE FROM auditoria WHERE usuario_id IS NULL")
+    with op.batch_alter_table('auditoria') as batch_op:
+        batch_op.alter_column('usuario_id', existing_type=sa.String(length=50), nullable=False)
@@ -0,0 +1,129 @@
+"""viagens e auditoria particionadas por mês
+
+No PostgreSQL, recria `viagens` (por data_saida) e `auditoria` (por
+timestamp) como tabelas particionadas por intervalo mensal, com uma
+partição por mês desde o registro mais antigo até MESES_A_FRENTE meses à
+frente, mais a partição DEFAULT. Os dados, índices, chaves estrangeiras e
+a sequência do id são preservados; a chave primária passa a ser
+(id, coluna de particionamento), como o PostgreSQL exige.
+
+Registros de auditoria sem timestamp recebem 1970-01-01 e ficam na
+partição DEFAULT. As partições seguintes são criadas pelo
+`flask particoes-criar` (ver particoes.py).
+
+A cópia reescreve as duas tabelas: aplique em janela de manutenção. Em
+outros bancos a migração só torna auditoria.timestamp obrigatório.
+
+Revision ID: f1c5a8e3d7b2
+Revises: e7a2c4d9b1f6
+Create Date: 2026-10-18 17:20:00.000000
+
+"""
+import re
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c5a8e3d7b2'
+down_revision = 'e7a2c4d9b1f6'
+branch_labels = None
+depends_on = None
+
+
+TABELAS = {'viagens': 'data_saida', 'auditoria': 'timestamp'}
+MESES_A_FRENTE = 3
+SEM_DATA = '1970-01-01'
+
+
+def _somar_meses(dia, meses):
+    indice = dia.year * 12 + dia.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _estrutura(conn, tabela):
+    """Índices (exceto a PK), chaves estrangeiras, nome da PK e sequência do id"""
+    indices = conn.execute(sa.text(
+        "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+        "WHERE x.indrelid = to_regclass(:tabela) AND NOT x.indisprimary"
+    ), {'tabela': tabela}).all()
+    estrangeiras = conn.execute(sa.text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(:tabela) AND contype = 'f'"
+    ), {'tabela': tabela}).all()
+    chave = conn.execute(sa.text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:tabela) AND contype = 'p'"
+    ), {'tabela': tabela}).scalar()
+    sequencia = conn.execute(sa.text("SELECT pg_get_serial_sequence(:tabela, 'id')"), {'tabela': tabela}).scalar()
+    return indices, estrangeiras, chave, sequencia
+
+
+def _recriar(conn, tabela, particionar):
+    """Renomeia `tabela`, cria a nova (particionada ou não) com a mesma estrutura e copia os dados"""
+    coluna = TABELAS[tabela]
+    antiga = f'{tabela}_antiga'
+    op.execute(f'ALTER TABLE "{tabela}" RENAME TO "{antiga}"')
+    indices, estrangeiras, chave, sequencia = _estrutura(conn, antiga)
+    for nome, _ in indices:
+        op.execute(f'DROP INDEX "{nome}"')
+    if chave:
+        op.execute(f'ALTER TABLE "{antiga}" RENAME CONSTRAINT "{chave}" TO "{antiga}_pkey"')
+
+    if particionar:
+        op.execute(f'CREATE TABLE "{tabela}" (LIKE "{antiga}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                   f'PARTITION BY RANGE ("{coluna}")')
+        op.execute(f'ALTER TABLE "{tabela}" ADD CONSTRAINT "{tabela}_pkey" PRIMARY KEY (id, "{coluna}")')
+        primeiro = conn.execute(sa.text(f'SELECT min("{coluna}") FROM "{antiga}"')).scalar()
+        op.execute(f'UPDATE "{antiga}" SET "{coluna}" = \'{SEM_DATA}\' WHERE "{coluna}" IS NULL')
+        hoje = date.today()
+        mes = date((primeiro or hoje).year, (primeiro or hoje).month, 1)
+        ultimo = _somar_meses(hoje, MESES_A_FRENTE)
+        while mes <= ultimo:
+            fim = _somar_meses(mes, 1)
+            op.execute(f'CREATE TABLE "{tabela}_p{mes:%Y_%m}" PARTITION OF "{tabela}" '
+                       f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{fim.isoformat()}')")
+            mes = fim
+        op.execute(f'CREATE TABLE "{tabela}_default" PARTITION OF "{tabela}" DEFAULT')
+    else:
+        op.execute(f'CREATE TABLE "{tabela}" (LIKE "{antiga}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        op.execute(f'ALTER TABLE "{tabela}" ADD CONSTRAINT "{tabela}_pkey" PRIMARY KEY (id)')
+
+    for nome, definicao in estrangeiras:
+        op.execute(f'ALTER TABLE "{tabela}" ADD CONSTRAINT "{nome}" {definicao}')
+    if sequencia:
+        # Sem isso o DROP da tabela antiga levaria a sequência junto
+        op.execute(f'ALTER SEQUENCE {sequencia} OWNED BY "{tabela}".id')
+
+    op.execute(f'INSERT INTO "{tabela}" SELECT * FROM "{antiga}"')
+    op.execute(f'DROP TABLE "{antiga}"')  # as partições da antiga (no downgrade) vão junto
+
+    # Índices criados depois da carga (no pai particionado, valem para todas as partições)
+    for _, definicao in indices:
+        op.execute(re.sub(rf' ON (ONLY )?(\S+\.)?"?{antiga}"? ', f' ON "{tabela}" ', definicao, count=1))
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        op.execute(sa.text(f"UPDATE auditoria SET timestamp = '{SEM_DATA}' WHERE timestamp IS NULL"))
+        with op.batch_alter_table('auditoria') as batch_op:
+            batch_op.alter_column('timestamp', existing_type=sa.DateTime(), nullable=False)
+        return
+
+    for tabela in TABELAS:
+        _recriar(conn, tabela, particionar=True)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        with op.batch_alter_table('auditoria') as batch_op:
+            batch_op.alter_column('timestamp', existing_type=sa.DateTime(), nullable=True)
+        return
+
+    # Partições já arquivadas (flask particoes-arquivar) não voltam
+    for tabela in TABELAS:
+        _recriar(conn, tabela, particionar=False)
+    op.execute('ALTER TABLE auditoria ALTER COLUMN "timestamp" DROP NOT NULL')
@@ -8,11 +8,18 @@ Migrado de Google Sheets para PostgreSQL
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from flask_bcrypt import Bcrypt
+from sqlalchemy import DDL, event
+from sqlalchemy.orm import validates
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+from status import StatusVeiculo, StatusViagem, StatusAgendamento, StatusType, normalizar
+from replicas import SessaoRoteada
+import senhas
+
 # Criar instâncias globais que serão inicializadas em app.py
-db = SQLAlchemy()
+# (a sessão lê da réplica nas rotas @somente_leitura, ver replicas.py)
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 bcrypt = Bcrypt()
 
 # Timezone padrão
@@ -43,12 +50,20 @@ class Usuario(UserMixin, db.Model):
     logs_auditoria = db.relationship('Auditoria', backref='usuario_acao', lazy=True)
     
     def verificar_senha(self, senha):
-        """Verifica se a senha está correta"""
-        return bcrypt.check_password_hash(self.password_hash, senha)
+        """Verifica se a senha está correta.
+
+        Se o hash foi gerado com outro algoritmo/custo que o configurado, ele
+        é regravado com a senha recebida (o chamador faz o commit).
+        """
+        servico = senhas.servico
+        correta = servico.verificar(self.password_hash, senha)
+        if correta and servico.precisa_rehash(self.password_hash):
+            self.password_hash = servico.gerar_hash(senha)
+        return correta
     
     def set_senha(self, senha):
         """Define a senha com hash"""
-        self.password_hash = bcrypt.generate_password_hash(senha).decode('utf-8')
+        self.password_hash = senhas.servico.gerar_hash(senha)
     
     def __repr__(self):
         return f'<Usuario {self.id}>'
@@ -66,7 +81,7 @@ class Veiculo(db.Model):
     cor = db.Column(db.String(30), nullable=True)
     tipo_combustivel = db.Column(db.String(20), nullable=True, default='Gasolina')  # Gasolina, Diesel, Etanol
     km_atual = db.Column(db.Float, default=0)
-    status = db.Column(db.String(20), default='Disponível')  # Disponível, Em Uso, Manutenção
+    status = db.Column(StatusType(StatusVeiculo), default=StatusVeiculo.DISPONIVEL)  # Ver status.StatusVeiculo
     
     # Manutenção
     km_proxima_revisao = db.Column(db.Float, nullable=True)
@@ -81,6 +96,10 @@ class Veiculo(db.Model):
     manutencoes = db.relationship('Manutencao', backref='veiculo', lazy=True)
     abastecimentos = db.relationship('Abastecimento', backref='veiculo', lazy=True)
     
+    @validates('status')
+    def _normalizar_status(self, key, valor):
+        return normalizar(StatusVeiculo, valor)
+    
     def __repr__(self):
         return f'<Veiculo {self.placa}>'
 
@@ -101,7 +120,7 @@ class Agendamento(db.Model):
     observacoes = db.Column(db.Text, nullable=True)
     producao_evento = db.Column(db.String(100), nullable=True)  # Novo campo
     
-    status = db.Column(db.String(20), default='Agendado')  # Agendado, Aprovado, Cancelado
+    status = db.Column(StatusType(StatusAgendamento), default=StatusAgendamento.AGENDADO)  # Ver status.StatusAgendamento
     motivo_cancelamento = db.Column(db.Text, nullable=True)
     data_cancelamento = db.Column(db.DateTime, nullable=True)
     observacoes_admin = db.Column(db.Text, nullable=True)
@@ -111,6 +130,10 @@ class Agendamento(db.Model):
     # Relacionamento com viagem
     viagem = db.relationship('Viagem', backref='agendamento', uselist=False, lazy=True)
     
+    @validates('status')
+    def _normalizar_status(self, key, valor):
+        return normalizar(StatusAgendamento, valor)
+    
     def __repr__(self):
         return f'<Agendamento {self.id} - {self.placa}>'
 
@@ -124,7 +147,7 @@ class Viagem(db.Model):
     motorista_id = db.Column(db.String(50), db.ForeignKey('usuarios.id'), nullable=False)
     placa = db.Column(db.String(10), db.ForeignKey('veiculos.placa'), nullable=False)
     
-    data_saida = db.Column(db.DateTime, nullable=False, index=True)
+    data_saida = db.Column(db.DateTime, nullable=False, index=True)  # Partição mensal no PostgreSQL (ver particoes.py)
     data_chegada = db.Column(db.DateTime, nullable=True)
     
     km_saida = db.Column(db.Float, nullable=False)
@@ -135,7 +158,11 @@ class Viagem(db.Model):
     observacoes = db.Column(db.Text, nullable=True)
     producao_evento = db.Column(db.String(100), nullable=True)
     
-    status = db.Column(db.String(20), default='Em Andamento')  # Em Andamento, Finalizada
+    status = db.Column(StatusType(StatusViagem), default=StatusViagem.EM_ANDAMENTO)  # Ver status.StatusViagem
+    
+    @validates('status')
+    def _normalizar_status(self, key, valor):
+        return normalizar(StatusViagem, valor)
     
     # Campos calculados
     def get_km_rodados(self):
@@ -147,7 +174,11 @@ class Viagem(db.Model):
     def get_duracao(self):
         """Calcula duração da viagem"""
         if self.data_chegada:
-            delta = self.data_chegada - self.data_saida
+            chegada, saida = self.data_chegada, self.data_saida
+            if (chegada.tzinfo is None) != (saida.tzinfo is None):
+                # Valor recém-atribuído (com fuso) contra valor lido do banco (sem fuso)
+                chegada, saida = chegada.replace(tzinfo=None), saida.replace(tzinfo=None)
+            delta = chegada - saida
             return delta.total_seconds() / 3600  # em horas
         return None
     
@@ -198,16 +229,14 @@ class Abastecimento(db.Model):
     
     # Campo calculado para consumo
     def get_consumo_km_litro(self):
-        """Calcula consumo em km/l desde último abastecimento"""
-        abastecimentos_anteriores = Abastecimento.query.filter(
-            Abastecimento.placa == self.placa,
-            Abastecimento.id < self.id
-        ).order_by(Abastecimento.id.desc()).first()
+        """Calcula consumo em km/l desde último abastecimento.
         
-        if abastecimentos_anteriores:
-            km_rodados = self.km_atual - abastecimentos_anteriores.km_atual
-            return km_rodados / self.litros if self.litros > 0 else None
-        return None
+        Uma consulta (o abastecimento anterior, com LIMIT 1). Para listas de
+        abastecimentos use consumo.consumo_abastecimentos(), que calcula
+        todos em uma única consulta.
+        """
+        from consumo import consumo_do_abastecimento
+        return consumo_do_abastecimento(self.id)
     
     def __repr__(self):
         return f'<Abastecimento {self.id} - {self.placa}>'
@@ -218,8 +247,8 @@ class Auditoria(db.Model):
     __tablename__ = 'auditoria'
     
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(TZ), index=True)
-    usuario_id = db.Column(db.String(50), db.ForeignKey('usuarios.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(TZ), index=True)  # Partição mensal no PostgreSQL (ver particoes.py)
+    usuario_id = db.Column(db.String(50), db.ForeignKey('usuarios.id'), nullable=True)  # None: ação do sistema (scripts, jobs)
     
     acao = db.Column(db.String(100), nullable=False)  # Login, Criar Agendamento, Editar Veículo, etc
     entidade = db.Column(db.String(50), nullable=False)  # Usuario, Veiculo, Agendamento, Viagem, etc
@@ -233,9 +262,68 @@ class Auditoria(db.Model):
         return f'<Auditoria {self.id} - {self.acao}>'
 
 
+class ContadorFrota(db.Model):
+    """Contador materializado do dashboard (veículos disponíveis, viagens em rota, viagens do dia)"""
+    __tablename__ = 'contadores_frota'
+
+    chave = db.Column(db.String(50), primary_key=True)  # Ex: veiculos_disponiveis, viagens_dia:2024-01-31
+    valor = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=lambda: datetime.now(TZ), onupdate=lambda: datetime.now(TZ))
+
+    def __repr__(self):
+        return f'<ContadorFrota {self.chave}={self.valor}>'
+
+
+class RollupDiario(db.Model):
+    """Agregado diário da frota por veículo, motorista ou evento (ver rollups.py)"""
+    __tablename__ = 'rollups_diarios'
+
+    dimensao = db.Column(db.String(20), primary_key=True)  # veiculo, motorista, evento
+    chave = db.Column(db.String(100), primary_key=True)  # Placa, id do motorista ou nome do evento
+    dia = db.Column(db.Date, primary_key=True)
+
+    viagens = db.Column(db.Integer, nullable=False, default=0)
+    km = db.Column(db.Float, nullable=False, default=0)
+    horas = db.Column(db.Float, nullable=False, default=0)
+    litros = db.Column(db.Float, nullable=False, default=0)
+    custo_combustivel = db.Column(db.Float, nullable=False, default=0)
+    custo_manutencao = db.Column(db.Float, nullable=False, default=0)
+
+    atualizado_em = db.Column(db.DateTime, default=lambda: datetime.now(TZ), onupdate=lambda: datetime.now(TZ))
+
+    def __repr__(self):
+        return f'<RollupDiario {self.dimensao}:{self.chave} {self.dia}>'
+
+
 # Índices para melhor performance
 db.Index('idx_agendamento_data', Agendamento.data_solicitada)
 db.Index('idx_agendamento_status', Agendamento.status)
+db.Index('idx_agendamento_placa_data', Agendamento.placa, Agendamento.data_solicitada)
 db.Index('idx_viagem_data_saida', Viagem.data_saida)
+db.Index('idx_viagem_chegada_id', Viagem.data_chegada, Viagem.id)  # Keyset do histórico
+db.Index('idx_viagem_placa_chegada_id', Viagem.placa, Viagem.data_chegada, Viagem.id)
 db.Index('idx_veiculo_status', Veiculo.status)
 db.Index('idx_auditoria_timestamp', Auditoria.timestamp)
+db.Index('idx_rollup_dimensao_dia', RollupDiario.dimensao, RollupDiario.dia)  # Consultas por período
+
+# Índices parciais: viagens em aberto (cronograma, registrar_chegada, dashboard)
+db.Index('idx_viagem_aberta_data_saida', Viagem.data_saida,
+         postgresql_where=Viagem.data_chegada.is_(None), sqlite_where=Viagem.data_chegada.is_(None))
+db.Index('idx_viagem_aberta_placa', Viagem.placa,
+         postgresql_where=Viagem.data_chegada.is_(None), sqlite_where=Viagem.data_chegada.is_(None))
+
+# Constraint de exclusão (somente PostgreSQL): o mesmo veículo não pode ter
+# dois agendamentos ativos com horários sobrepostos (ver conflitos.py)
+event.listen(
+    Agendamento.__table__, 'after_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql')
+)
+event.listen(
+    Agendamento.__table__, 'after_create',
+    DDL(
+        "ALTER TABLE agendamentos ADD CONSTRAINT excl_agendamento_sem_sobreposicao "
+        "EXCLUDE USING gist (placa WITH =, "
+        "tsrange(data_solicitada + hora_inicio, data_solicitada + hora_fim, '[)') WITH &&) "
+        "WHERE (status IN ('Agendado', 'Confirmado', 'Em Uso'))"
+    ).execute_if(dialect='postgresql')
+)
@@ -0,0 +1,167 @@
+"""
+🗂️ Partições mensais - viagens e auditoria particionadas por mês (PostgreSQL)
+
+`viagens` (por data_saida) e `auditoria` (por timestamp) só crescem. No
+PostgreSQL, a migração f1c5a8e3d7b2 as transforma em tabelas particionadas
+por intervalo mensal: uma partição `<tabela>_pAAAA_MM` por mês, mais a
+`<tabela>_default`, que recebe o que cair fora das partições criadas.
+Consultas com filtro de data só leem as partições do período (partition
+pruning), por maiores que fiquem os anos de histórico.
+
+Dois trabalhos mantêm as partições (rodar pelo cron, uma vez por mês):
+
+- `flask particoes-criar`: cria as partições dos próximos
+  PARTICOES_MESES_A_FRENTE meses (linhas já na DEFAULT para o mês são
+  movidas para a partição nova);
+- `flask particoes-arquivar`: partições de meses mais antigos que
+  RETENCAO_VIAGENS_MESES / RETENCAO_AUDITORIA_MESES (0 = guardar tudo) são
+  exportadas com COPY para `ARQUIVO_PARTICOES_DIR/<tabela>/<partição>.csv.gz`
+  e removidas do banco. Para consultar de novo, recrie a partição e use
+  `\\copy ... FROM PROGRAM 'gunzip -c ...' WITH (FORMAT csv, HEADER true)`.
+
+Em outros bancos (SQLite dos testes e do desenvolvimento) as tabelas não
+são particionadas e os trabalhos recusam rodar.
+"""
+
+import gzip
+import logging
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Tabela particionada -> coluna de particionamento
+TABELAS = {'viagens': 'data_saida', 'auditoria': 'timestamp'}
+MESES_A_FRENTE_PADRAO = 3
+PASTA_ARQUIVO_PADRAO = 'arquivo'
+
+
+# ==================== MESES E NOMES ====================
+
+def inicio_do_mes(dia):
+    return date(dia.year, dia.month, 1)
+
+
+def somar_meses(dia, meses):
+    """Primeiro dia do mês `meses` depois (ou antes, se negativo) do mês de `dia`"""
+    indice = dia.year * 12 + dia.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nome_particao(tabela, mes):
+    return f'{tabela}_p{mes:%Y_%m}'
+
+
+def mes_da_particao(tabela, nome):
+    """Mês de uma partição mensal pelo nome; None para a DEFAULT ou nomes de fora"""
+    encontrado = re.fullmatch(rf'{re.escape(tabela)}_p(\d{{4}})_(\d{{2}})', nome)
+    return date(int(encontrado[1]), int(encontrado[2]), 1) if encontrado else None
+
+
+def particoes_vencidas(tabela, nomes, meses_retencao, hoje=None):
+    """Partições mensais inteiramente anteriores aos últimos `meses_retencao` meses, da mais antiga à mais nova"""
+    if not meses_retencao or meses_retencao <= 0:
+        return []
+    corte = somar_meses(inicio_do_mes(hoje or date.today()), -meses_retencao)
+    vencidas = [(mes, nome) for nome in nomes
+                if (mes := mes_da_particao(tabela, nome)) is not None and somar_meses(mes, 1) <= corte]
+    return [nome for mes, nome in sorted(vencidas)]
+
+
+# ==================== BANCO ====================
+
+def _verificar(engine, tabela):
+    if tabela not in TABELAS:
+        raise ValueError(f'Tabela não particionada: {tabela} (use {", ".join(TABELAS)})')
+    if engine.dialect.name != 'postgresql':
+        raise RuntimeError(f'Partições só existem no PostgreSQL (banco atual: {engine.dialect.name})')
+
+
+def listar_particoes(conn, tabela):
+    """Nomes das partições da tabela (vazio se ela não for particionada)"""
+    return sorted(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:tabela)"
+    ), {'tabela': tabela}).scalars())
+
+
+def _esta_particionada(conn, tabela):
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:tabela)"),
+                        {'tabela': tabela}).scalar() == 'p'
+
+
+def criar_particoes(engine, tabela, meses_a_frente=MESES_A_FRENTE_PADRAO, hoje=None):
+    """Cria as partições do mês atual até `meses_a_frente` meses à frente. Retorna as criadas"""
+    _verificar(engine, tabela)
+    coluna = TABELAS[tabela]
+    padrao = f'{tabela}_default'
+    mes_atual = inicio_do_mes(hoje or date.today())
+    criadas = []
+    for deslocamento in range(meses_a_frente + 1):
+        inicio = somar_meses(mes_atual, deslocamento)
+        fim = somar_meses(inicio, 1)
+        nome = nome_particao(tabela, inicio)
+        with engine.begin() as conn:
+            if not _esta_particionada(conn, tabela):
+                raise RuntimeError(f'{tabela} não é particionada: aplique as migrações (flask db upgrade)')
+            if nome in listar_particoes(conn, tabela):
+                continue
+            limites = {'inicio': inicio, 'fim': fim}
+            no_padrao = conn.execute(text(
+                f'SELECT 1 FROM "{padrao}" WHERE "{coluna}" >= :inicio AND "{coluna}" < :fim LIMIT 1'
+            ), limites).first()
+            if no_padrao:
+                # O PostgreSQL recusa a partição nova se a DEFAULT já tiver linhas do mês: move-as
+                conn.execute(text(f'ALTER TABLE "{tabela}" DETACH PARTITION "{padrao}"'))
+            conn.execute(text(
+                f'CREATE TABLE "{nome}" PARTITION OF "{tabela}" '
+                f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fim.isoformat()}')"
+            ))
+            if no_padrao:
+                movidas = conn.execute(text(
+                    f'WITH movidas AS (DELETE FROM "{padrao}" WHERE "{coluna}" >= :inicio AND "{coluna}" < :fim '
+                    f'RETURNING *) INSERT INTO "{tabela}" SELECT * FROM movidas'
+                ), limites).rowcount
+                conn.execute(text(f'ALTER TABLE "{tabela}" ATTACH PARTITION "{padrao}" DEFAULT'))
+                logger.info(f'🗂️ {movidas} linhas de {tabela} movidas da partição DEFAULT para {nome}')
+        criadas.append(nome)
+        logger.info(f'🗂️ Partição criada: {nome}')
+    return criadas
+
+
+def arquivar_particoes(engine, tabela, meses_retencao, pasta=PASTA_ARQUIVO_PADRAO, hoje=None):
+    """Exporta as partições vencidas para CSV gzip e as remove. Retorna [(partição, linhas, arquivo)]"""
+    _verificar(engine, tabela)
+    with engine.connect() as conn:
+        vencidas = particoes_vencidas(tabela, listar_particoes(conn, tabela), meses_retencao, hoje)
+
+    destino = os.path.join(pasta, tabela)
+    os.makedirs(destino, exist_ok=True)
+    arquivadas = []
+    for nome in vencidas:
+        caminho = os.path.join(destino, f'{nome}.csv.gz')
+        if os.path.exists(caminho):
+            raise RuntimeError(f'{caminho} já existe: a partição {nome} não será sobrescrita')
+        temporario = caminho + '.parcial'
+        try:
+            with engine.begin() as conn:
+                # Nenhuma escrita entra na partição entre a cópia e a remoção
+                conn.execute(text(f'LOCK TABLE "{nome}" IN SHARE MODE'))
+                linhas = conn.execute(text(f'SELECT count(*) FROM "{nome}"')).scalar()
+                cursor = conn.connection.cursor()
+                with gzip.open(temporario, 'wb') as arquivo:
+                    cursor.copy_expert(f'COPY "{nome}" TO STDOUT WITH (FORMAT csv, HEADER true)', arquivo)
+                cursor.close()
+                conn.execute(text(f'ALTER TABLE "{tabela}" DETACH PARTITION "{nome}"'))
+                conn.execute(text(f'DROP TABLE "{nome}"'))
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        os.replace(temporario, caminho)
+        arquivadas.append((nome, linhas, caminho))
+        logger.info(f'🗂️ Partição {nome} arquivada em {caminho} ({linhas} linhas)')
+    return arquivadas
@@ -0,0 +1,151 @@
+"""
+🪞 Réplica de leitura - rotas de consulta fora do banco primário
+
+Dashboard, histórico, relatórios e gerenciamento só leem, mas disputavam o
+primário com os registros de saída/chegada. Com DATABASE_REPLICA_URL
+configurado, as rotas marcadas com `@somente_leitura` passam a ler da
+réplica (engine própria, com as mesmas opções de pool do primário).
+Sem a variável, nada muda.
+
+Regras de roteamento:
+
+- flush, INSERT/UPDATE/DELETE e SELECT ... FOR UPDATE sempre vão ao
+  primário; depois da primeira escrita, o resto da requisição também;
+- ler as próprias escritas: depois de um commit com escrita, as leituras
+  daquele navegador ficam no primário por DB_REPLICA_JANELA_LEITURA
+  segundos (marca na sessão do Flask, então vale entre workers);
+- atraso: o atraso de replicação é medido a cada
+  DB_REPLICA_INTERVALO_VERIFICACAO segundos; acima de
+  DB_REPLICA_ATRASO_MAXIMO, ou com a réplica fora do ar, lê-se do primário.
+"""
+
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, has_request_context, session as sessao_flask
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+CHAVE_PRIMARIO_ATE = '_primario_ate'  # na sessão do Flask
+JANELA_LEITURA_PADRAO = 5  # segundos lendo do primário após uma escrita
+ATRASO_MAXIMO_PADRAO = 5  # segundos
+INTERVALO_VERIFICACAO_PADRAO = 2  # segundos entre medições do atraso
+
+_SQL_ATRASO_POSTGRES = text(
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+class SessaoRoteada(Session):
+    """Sessão do Flask-SQLAlchemy que lê da réplica quando `info['replica']` está definido"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if (replica is not None and bind is None and not self._flushing
+                and not isinstance(clause, UpdateBase)
+                and getattr(clause, '_for_update_arg', None) is None):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def medir_atraso(engine):
+    """Atraso de replicação da réplica, em segundos (0 fora do PostgreSQL)"""
+    if engine.dialect.name != 'postgresql':
+        return 0.0
+    with engine.connect() as conn:
+        return float(conn.execute(_SQL_ATRASO_POSTGRES).scalar() or 0)
+
+
+class RoteadorReplica:
+    """Decide, por requisição, se as leituras podem ir para a réplica"""
+
+    def __init__(self, app=None, db=None, medir=medir_atraso):
+        self.db = db
+        self.engine = None
+        self.medir = medir
+        self._medicao = None  # (válida_até, atraso ou None se a réplica falhou)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        url = app.config.get('DATABASE_REPLICA_URL')
+        if url:
+            self.engine = create_engine(url, **app.config.get('DB_REPLICA_ENGINE_OPTIONS', {}))
+        app.config.setdefault('DB_REPLICA_JANELA_LEITURA', JANELA_LEITURA_PADRAO)
+        app.config.setdefault('DB_REPLICA_ATRASO_MAXIMO', ATRASO_MAXIMO_PADRAO)
+        app.config.setdefault('DB_REPLICA_INTERVALO_VERIFICACAO', INTERVALO_VERIFICACAO_PADRAO)
+        app.extensions['replica'] = self
+
+    def atraso(self, engine):
+        """Último atraso medido, refeito a cada DB_REPLICA_INTERVALO_VERIFICACAO segundos"""
+        agora = time.monotonic()
+        with self._lock:
+            if self._medicao is not None and self._medicao[0] > agora:
+                return self._medicao[1]
+            try:
+                atraso = self.medir(engine)
+            except Exception as e:
+                logger.warning(f'Réplica de leitura indisponível, usando o primário: {e}')
+                atraso = None
+            self._medicao = (agora + current_app.config['DB_REPLICA_INTERVALO_VERIFICACAO'], atraso)
+            return atraso
+
+    def escolher(self):
+        """Engine da réplica para esta requisição, ou None para ficar no primário"""
+        if self.engine is None:
+            return None
+        if has_request_context() and sessao_flask.get(CHAVE_PRIMARIO_ATE, 0) > time.time():
+            return None  # escreveu há pouco: ler as próprias escritas
+        atraso = self.atraso(self.engine)
+        if atraso is None or atraso > current_app.config['DB_REPLICA_ATRASO_MAXIMO']:
+            return None
+        return self.engine
+
+
+def somente_leitura(view):
+    """Marca a rota como só de leitura: as consultas da view vão para a réplica, se houver"""
+    @wraps(view)
+    def rota(*args, **kwargs):
+        roteador = current_app.extensions.get('replica')
+        engine = roteador.escolher() if roteador else None
+        if engine is None:
+            return view(*args, **kwargs)
+        sessao = roteador.db.session
+        sessao.info['replica'] = engine
+        try:
+            return view(*args, **kwargs)
+        finally:
+            sessao.info.pop('replica', None)
+
+    return rota
+
+
+# ==================== LER AS PRÓPRIAS ESCRITAS ====================
+
+@event.listens_for(SessaoRoteada, 'after_flush')
+def _marcar_escrita(session, flush_context):
+    session.info['escreveu'] = True
+    session.info.pop('replica', None)  # o resto da requisição lê do primário
+
+
+@event.listens_for(SessaoRoteada, 'after_commit')
+def _fixar_no_primario(session):
+    if session.info.pop('escreveu', None) and has_request_context():
+        roteador = current_app.extensions.get('replica')
+        janela = current_app.config.get('DB_REPLICA_JANELA_LEITURA', JANELA_LEITURA_PADRAO)
+        if roteador is not None and roteador.engine is not None and janela:
+            sessao_flask[CHAVE_PRIMARIO_ATE] = time.time() + janela
+
+
+@event.listens_for(SessaoRoteada, 'after_soft_rollback')
+def _descartar_escrita(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('escreveu', None)
@@ -0,0 +1,156 @@
+"""
+📊 Resumo da frota - Contadores materializados do dashboard
+
+Mantém em `contadores_frota` os números exibidos no dashboard (veículos
+disponíveis, viagens em rota e viagens do dia). As rotas de escrita ajustam
+os contadores na mesma transação da alteração, e o dashboard lê apenas
+algumas linhas por chave em vez de contar as tabelas a cada acesso.
+"""
+
+from datetime import datetime, date, time, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Veiculo, Viagem, ContadorFrota, TZ
+from status import StatusVeiculo, StatusViagem, normalizar
+
+CHAVE_VEICULOS_DISPONIVEIS = 'veiculos_disponiveis'
+CHAVE_VIAGENS_EM_ROTA = 'viagens_em_rota'
+PREFIXO_VIAGENS_DIA = 'viagens_dia:'
+
+
+def chave_viagens_dia(dia):
+    """Chave do contador de viagens iniciadas em um dia"""
+    return f'{PREFIXO_VIAGENS_DIA}{dia.isoformat()}'
+
+
+def veiculo_disponivel(status):
+    """Indica se o status conta como veículo disponível"""
+    try:
+        return normalizar(StatusVeiculo, status) == StatusVeiculo.DISPONIVEL
+    except ValueError:
+        return False
+
+
+def _limites_do_dia(dia):
+    """Intervalo [início, fim) do dia, para aproveitar o índice de data_saida"""
+    inicio = datetime.combine(dia, time.min)
+    return inicio, inicio + timedelta(days=1)
+
+
+def _contar(chave):
+    """Recalcula o valor de um contador direto nas tabelas de origem"""
+    if chave == CHAVE_VEICULOS_DISPONIVEIS:
+        stmt = db.select(db.func.count(Veiculo.id)).where(Veiculo.status == StatusVeiculo.DISPONIVEL)
+    elif chave == CHAVE_VIAGENS_EM_ROTA:
+        stmt = db.select(db.func.count(Viagem.id)).where(
+            Viagem.data_chegada == None, Viagem.status == StatusViagem.EM_ANDAMENTO
+        )
+    elif chave.startswith(PREFIXO_VIAGENS_DIA):
+        inicio, fim = _limites_do_dia(date.fromisoformat(chave[len(PREFIXO_VIAGENS_DIA):]))
+        stmt = db.select(db.func.count(Viagem.id)).where(Viagem.data_saida >= inicio, Viagem.data_saida < fim)
+    else:
+        raise ValueError(f'Contador desconhecido: {chave}')
+    return db.session.execute(stmt).scalar() or 0
+
+
+def _somar(chave, delta):
+    """UPDATE valor = valor + delta; retorna quantas linhas foram alteradas (0 ou 1)"""
+    return db.session.execute(
+        db.update(ContadorFrota)
+        .where(ContadorFrota.chave == chave)
+        .values(valor=ContadorFrota.valor + delta, atualizado_em=datetime.now(TZ))
+    ).rowcount
+
+
+def _ajustar(chave, delta):
+    """Soma `delta` ao contador de forma atômica (UPDATE valor = valor + delta).
+
+    Se o contador ainda não existe, ele é criado a partir de uma contagem
+    completa, que já inclui as alterações pendentes da sessão. A criação
+    roda em um savepoint: se outro worker criar o mesmo contador antes
+    (o `viagens_dia:<data>` é novo todo dia, e as primeiras saídas do
+    turno disputam a criação), só o savepoint é desfeito e o delta é
+    somado no contador dele, sem derrubar a transação da rota.
+    """
+    if not delta or _somar(chave, delta):
+        return
+    db.session.flush()
+    valor = _contar(chave)
+    try:
+        with db.session.begin_nested():
+            db.session.add(ContadorFrota(chave=chave, valor=valor))
+    except IntegrityError:
+        _somar(chave, delta)
+
+
+def alterar_status_veiculo(status_anterior, status_novo):
+    """Ajusta veículos disponíveis após criação, edição ou remoção de um veículo.
+
+    Use `None` como status anterior para veículos novos e como status novo
+    para veículos removidos.
+    """
+    delta = int(veiculo_disponivel(status_novo)) - int(veiculo_disponivel(status_anterior))
+    _ajustar(CHAVE_VEICULOS_DISPONIVEIS, delta)
+
+
+def registrar_saida_viagem(viagem):
+    """Contabiliza uma viagem que acabou de sair"""
+    _ajustar(CHAVE_VIAGENS_EM_ROTA, 1)
+    _ajustar(chave_viagens_dia(viagem.data_saida.date()), 1)
+
+
+def registrar_chegada_viagem(viagem):
+    """Contabiliza uma viagem que acabou de ser finalizada"""
+    _ajustar(CHAVE_VIAGENS_EM_ROTA, -1)
+
+
+def obter_resumo(dia=None):
+    """Retorna os contadores do dashboard para o dia informado (hoje por padrão)"""
+    dia = dia or datetime.now(TZ).date()
+    chaves = {
+        'veiculos_disponiveis': CHAVE_VEICULOS_DISPONIVEIS,
+        'viagens_em_rota': CHAVE_VIAGENS_EM_ROTA,
+        'viagens_hoje': chave_viagens_dia(dia),
+    }
+    valores = dict(db.session.execute(
+        db.select(ContadorFrota.chave, ContadorFrota.valor).where(ContadorFrota.chave.in_(chaves.values()))
+    ).all())
+
+    faltantes = [chave for chave in chaves.values() if chave not in valores]
+    if faltantes:
+        # Primeiro acesso (ou dia sem viagens): materializa os contadores ausentes
+        for chave in faltantes:
+            valores[chave] = _contar(chave)
+            db.session.add(ContadorFrota(chave=chave, valor=valores[chave]))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Outro worker materializou o mesmo contador ao mesmo tempo
+            db.session.rollback()
+
+    return {nome: valores[chave] for nome, chave in chaves.items()}
+
+
+def descartar_viagens_dia(inicio, fim):
+    """Apaga os contadores de viagens por dia entre as datas (inclusivas).
+
+    Para cargas que não passam pelas rotas (ex: migração da planilha): os
+    contadores são recriados pela contagem no próximo obter_resumo do dia.
+    """
+    resultado = db.session.execute(db.delete(ContadorFrota).where(
+        ContadorFrota.chave >= chave_viagens_dia(inicio), ContadorFrota.chave <= chave_viagens_dia(fim)
+    ))
+    db.session.commit()
+    return resultado.rowcount
+
+
+def recalcular_resumo(dia=None):
+    """Recalcula os contadores globais e o do dia a partir das tabelas de origem"""
+    dia = dia or datetime.now(TZ).date()
+    for chave in (CHAVE_VEICULOS_DISPONIVEIS, CHAVE_VIAGENS_EM_ROTA, chave_viagens_dia(dia)):
+        contador = db.session.get(ContadorFrota, chave) or ContadorFrota(chave=chave)
+        contador.valor = _contar(chave)
+        db.session.add(contador)
+    db.session.commit()
+    return obter_resumo(dia)
@@ -0,0 +1,184 @@
+"""
+📈 Rollups diários - Indicadores da frota pré-agregados por dia
+
+Mantém em `rollups_diarios` uma linha por (dimensão, chave, dia) com
+viagens, km, horas (Viagem.get_duracao), litros e custo de combustível e
+custo de manutenção. As dimensões são o veículo (placa), o motorista
+(id) e o evento de produção (producao_evento).
+
+As viagens entram no dia da saída, quando são finalizadas
+(registrar_chegada). Abastecimentos e manutenções entram apenas na
+dimensão de veículo; como o app não os registra (chegam pela importação
+da planilha), só o backfill os soma. Um relatório de um ano lê algumas
+centenas de linhas em vez de varrer viagens, abastecimentos e
+manutenções: é o que /relatorios faz sem filtros (ver agregacoes.py).
+
+`backfill` recalcula um intervalo a partir das tabelas de origem
+(comando `flask backfill-rollups`).
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Viagem, Abastecimento, Manutencao, RollupDiario, TZ
+
+VEICULO = 'veiculo'
+MOTORISTA = 'motorista'
+EVENTO = 'evento'
+DIMENSOES = (VEICULO, MOTORISTA, EVENTO)
+
+METRICAS = ('viagens', 'km', 'horas', 'litros', 'custo_combustivel', 'custo_manutencao')
+
+# Coluna de Viagem que identifica cada dimensão
+_COLUNAS_VIAGEM = {
+    VEICULO: Viagem.placa,
+    MOTORISTA: Viagem.motorista_id,
+    EVENTO: Viagem.producao_evento,
+}
+
+
+def _chaves_viagem(viagem):
+    """(dimensão, chave) de uma viagem; viagens sem evento não entram na dimensão de evento"""
+    chaves = [(VEICULO, viagem.placa), (MOTORISTA, viagem.motorista_id)]
+    if viagem.producao_evento:
+        chaves.append((EVENTO, viagem.producao_evento))
+    return chaves
+
+
+def _metricas_viagem(viagem):
+    return {'viagens': 1, 'km': viagem.get_km_rodados() or 0, 'horas': viagem.get_duracao() or 0}
+
+
+def _limites(inicio, fim):
+    """Intervalo [início, fim + 1 dia) em datetime; pontas None ficam abertas"""
+    return (datetime.combine(inicio, time.min) if inicio else None,
+            datetime.combine(fim + timedelta(days=1), time.min) if fim else None)
+
+
+def _calcular(inicio=None, fim=None, dimensao=None, chave=None):
+    """Agrega as tabelas de origem entre as datas (inclusivas).
+
+    Retorna {(dimensão, chave, dia): {métrica: valor}}. Com `dimensao` e
+    `chave`, calcula apenas as linhas dessa chave.
+    """
+    de, ate = _limites(inicio, fim)
+    agregados = defaultdict(lambda: dict.fromkeys(METRICAS, 0))
+
+    stmt = db.select(Viagem).where(Viagem.data_chegada != None)
+    if de:
+        stmt = stmt.where(Viagem.data_saida >= de)
+    if ate:
+        stmt = stmt.where(Viagem.data_saida < ate)
+    if dimensao:
+        stmt = stmt.where(_COLUNAS_VIAGEM[dimensao] == chave)
+    for viagem in db.session.execute(stmt.execution_options(yield_per=500)).scalars():
+        metricas = _metricas_viagem(viagem)
+        for dim, ch in _chaves_viagem(viagem):
+            if dimensao and dim != dimensao:
+                continue
+            linha = agregados[(dim, ch, viagem.data_saida.date())]
+            for nome, valor in metricas.items():
+                linha[nome] += valor
+
+    if dimensao in (None, VEICULO):
+        stmt = db.select(Abastecimento.placa, Abastecimento.data_abastecimento,
+                         Abastecimento.litros, Abastecimento.valor_total)
+        if de:
+            stmt = stmt.where(Abastecimento.data_abastecimento >= de)
+        if ate:
+            stmt = stmt.where(Abastecimento.data_abastecimento < ate)
+        if chave:
+            stmt = stmt.where(Abastecimento.placa == chave)
+        for placa, data, litros, valor in db.session.execute(stmt.execution_options(yield_per=500)):
+            linha = agregados[(VEICULO, placa, data.date())]
+            linha['litros'] += litros or 0
+            linha['custo_combustivel'] += valor or 0
+
+        # data_manutencao já é uma data: agrupa direto no banco
+        stmt = (
+            db.select(Manutencao.placa, Manutencao.data_manutencao, func.coalesce(func.sum(Manutencao.custo), 0))
+            .group_by(Manutencao.placa, Manutencao.data_manutencao)
+        )
+        if inicio:
+            stmt = stmt.where(Manutencao.data_manutencao >= inicio)
+        if fim:
+            stmt = stmt.where(Manutencao.data_manutencao <= fim)
+        if chave:
+            stmt = stmt.where(Manutencao.placa == chave)
+        for placa, dia, custo in db.session.execute(stmt):
+            agregados[(VEICULO, placa, dia)]['custo_manutencao'] += float(custo)
+
+    return agregados
+
+
+def _atualizar(dimensao, chave, dia, deltas):
+    """UPDATE col = col + delta na linha; retorna quantas linhas foram alteradas (0 ou 1)"""
+    return db.session.execute(
+        db.update(RollupDiario)
+        .where(RollupDiario.dimensao == dimensao, RollupDiario.chave == chave, RollupDiario.dia == dia)
+        .values(atualizado_em=datetime.now(TZ),
+                **{nome: getattr(RollupDiario, nome) + delta for nome, delta in deltas.items()})
+    ).rowcount
+
+
+def _somar(dimensao, chave, dia, **deltas):
+    """Soma as métricas a uma linha de forma atômica (UPDATE col = col + delta).
+
+    Se a linha ainda não existe ela é criada a partir das tabelas de
+    origem, que já incluem as alterações pendentes da sessão. Como em
+    resumo_frota._ajustar, a criação roda em um savepoint: se outro worker
+    criar a linha antes (as primeiras chegadas do dia disputam a chave), só
+    o savepoint é desfeito e os deltas são somados na linha dele.
+    """
+    if _atualizar(dimensao, chave, dia, deltas):
+        return
+    db.session.flush()
+    metricas = _calcular(dia, dia, dimensao, chave).get((dimensao, chave, dia), {})
+    try:
+        with db.session.begin_nested():
+            db.session.add(RollupDiario(dimensao=dimensao, chave=chave, dia=dia, **metricas))
+    except IntegrityError:
+        _atualizar(dimensao, chave, dia, deltas)
+
+
+def registrar_viagem_finalizada(viagem):
+    """Inclui uma viagem que acabou de ser finalizada (mesma transação da chegada)"""
+    metricas = _metricas_viagem(viagem)
+    dia = viagem.data_saida.date()
+    for dimensao, chave in _chaves_viagem(viagem):
+        _somar(dimensao, chave, dia, **metricas)
+
+
+def backfill(inicio=None, fim=None):
+    """Recalcula os rollups entre as datas (todas, se omitidas). Retorna o número de linhas gravadas"""
+    apagar = db.delete(RollupDiario)
+    if inicio:
+        apagar = apagar.where(RollupDiario.dia >= inicio)
+    if fim:
+        apagar = apagar.where(RollupDiario.dia <= fim)
+    db.session.execute(apagar)
+
+    agregados = _calcular(inicio, fim)
+    agora = datetime.now(TZ)
+    if agregados:
+        db.session.execute(db.insert(RollupDiario), [
+            {'dimensao': dimensao, 'chave': chave, 'dia': dia, 'atualizado_em': agora, **metricas}
+            for (dimensao, chave, dia), metricas in agregados.items()
+        ])
+    db.session.commit()
+    return len(agregados)
+
+
+def totais(dimensao, inicio, fim, chave=None):
+    """Soma os rollups de uma dimensão no período. Retorna {chave: {métrica: valor}}"""
+    stmt = (
+        db.select(RollupDiario.chave, *(func.sum(getattr(RollupDiario, nome)) for nome in METRICAS))
+        .where(RollupDiario.dimensao == dimensao, RollupDiario.dia >= inicio, RollupDiario.dia <= fim)
+        .group_by(RollupDiario.chave)
+    )
+    if chave is not None:
+        stmt = stmt.where(RollupDiario.chave == chave)
+    return {linha[0]: dict(zip(METRICAS, linha[1:])) for linha in db.session.execute(stmt)}
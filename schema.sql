@@ -68,6 +68,90 @@ CREATE INDEX IF NOT EXISTS idx_agendamentos_status ON agendamentos(status);
 CREATE INDEX IF NOT EXISTS idx_viagens_placa ON viagens(placa);
 CREATE INDEX IF NOT EXISTS idx_viagens_status ON viagens(status);
 
+-- Trip state transitions, called with supabase.rpc(): each check-out/check-in
+-- is one round-trip and one transaction (no half-updated trips on failure).
+-- tests/fake_supabase.py mirrors these functions for the SupabaseDB tests.
+
+-- Check-out: insert the trip, mark the vehicle and the agendamento 'Em Uso'
+CREATE OR REPLACE FUNCTION registrar_saida_viagem(
+  p_motorista_email VARCHAR,
+  p_placa VARCHAR,
+  p_data_saida TIMESTAMP,
+  p_km_saida INTEGER,
+  p_destino TEXT DEFAULT NULL,
+  p_observacoes TEXT DEFAULT NULL,
+  p_agendamento_id UUID DEFAULT NULL
+) RETURNS SETOF viagens
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_viagem viagens;
+BEGIN
+  -- Lock the vehicle so two concurrent check-outs cannot both succeed
+  PERFORM 1 FROM veiculos WHERE placa = p_placa FOR UPDATE;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Vehicle % not found', p_placa;
+  END IF;
+  IF EXISTS (SELECT 1 FROM viagens WHERE placa = p_placa AND status = 'Em Andamento') THEN
+    RAISE EXCEPTION 'Vehicle % already has a trip in progress', p_placa;
+  END IF;
+
+  INSERT INTO viagens (motorista_email, placa, data_saida, km_saida, destino, observacoes, status)
+  VALUES (p_motorista_email, p_placa, p_data_saida, p_km_saida, p_destino, p_observacoes, 'Em Andamento')
+  RETURNING * INTO v_viagem;
+
+  UPDATE veiculos SET status = 'Em Uso' WHERE placa = p_placa;
+  IF p_agendamento_id IS NOT NULL THEN
+    UPDATE agendamentos SET status = 'Em Uso' WHERE id = p_agendamento_id;
+  END IF;
+
+  RETURN NEXT v_viagem;
+END;
+$$;
+
+-- Check-in: close the open trip, free the vehicle, mark the agendamento 'Realizado'
+CREATE OR REPLACE FUNCTION finalizar_viagem(
+  p_placa VARCHAR,
+  p_km_chegada INTEGER,
+  p_observacoes TEXT DEFAULT NULL,
+  p_data_chegada TIMESTAMP DEFAULT NULL
+) RETURNS SETOF viagens
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_viagem viagens;
+  v_agendamento_id UUID;
+BEGIN
+  SELECT * INTO v_viagem FROM viagens
+   WHERE placa = p_placa AND status = 'Em Andamento'
+   ORDER BY created_at DESC
+   LIMIT 1
+   FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN;  -- No trip in progress: empty result
+  END IF;
+
+  UPDATE viagens
+     SET status = 'Finalizada',
+         data_chegada = COALESCE(p_data_chegada, NOW()),
+         km_chegada = p_km_chegada,
+         observacoes = COALESCE(NULLIF(p_observacoes, ''), observacoes)
+   WHERE id = v_viagem.id
+  RETURNING * INTO v_viagem;
+
+  UPDATE veiculos SET status = 'Disponível' WHERE placa = p_placa;
+
+  SELECT id INTO v_agendamento_id FROM agendamentos
+   WHERE placa = p_placa AND status IN ('Em Uso', 'Confirmado')
+   ORDER BY created_at DESC
+   LIMIT 1
+   FOR UPDATE;
+  IF FOUND THEN
+    UPDATE agendamentos SET status = 'Realizado' WHERE id = v_agendamento_id;
+  END IF;
+
+  RETURN NEXT v_viagem;
+END;
+$$;
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE usuarios ENABLE ROW LEVEL SECURITY;
 ALTER TABLE veiculos ENABLE ROW LEVEL SECURITY;
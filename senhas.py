@@ -0,0 +1,175 @@
+"""
+🔑 Hash de senhas - algoritmo configurável, rehash no login e pool limitado
+
+`Usuario.verificar_senha`/`set_senha` chamavam o Flask-Bcrypt com o custo
+padrão direto na requisição. Aqui o algoritmo e o custo vêm da
+configuração (HASH_SENHA_*):
+
+- bcrypt, com custo (log2 das rodadas) ajustável;
+- argon2id (pacote opcional argon2-cffi), com memória, tempo e
+  paralelismo ajustáveis.
+
+O hash gravado diz com que algoritmo e parâmetros foi gerado, então hashes
+antigos continuam válidos depois de uma troca de configuração, e
+`precisa_rehash` indica quando regravar o hash no próximo login.
+
+O cálculo roda em um pool de threads limitado (bcrypt e argon2 liberam o
+GIL): no máximo HASH_SENHA_THREADS hashes ao mesmo tempo por processo e
+HASH_SENHA_MAX_FILA esperando. Com a fila cheia, FilaSenhasCheia é
+levantada na hora, em vez de acumular logins que vão estourar o timeout
+do gunicorn; `metricas()` expõe a profundidade da fila.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+ALGORITMOS = ('bcrypt', 'argon2id')
+BCRYPT_CUSTO_PADRAO = 12  # o mesmo padrão do Flask-Bcrypt
+ARGON2_MEMORIA_PADRAO = 65536  # KiB (64 MiB)
+ARGON2_TEMPO_PADRAO = 3
+ARGON2_PARALELISMO_PADRAO = 1
+MAX_FILA_PADRAO = 64
+_BCRYPT_MAX_BYTES = 72  # o bcrypt só usa os 72 primeiros bytes (o bcrypt 5 recusa senhas maiores)
+
+
+class FilaSenhasCheia(RuntimeError):
+    """Hashes demais esperando: a requisição deve ser recusada (503)"""
+
+
+class ServicoSenhas:
+    def __init__(self, algoritmo='bcrypt', custo_bcrypt=BCRYPT_CUSTO_PADRAO,
+                 argon2_memoria_kib=ARGON2_MEMORIA_PADRAO, argon2_tempo=ARGON2_TEMPO_PADRAO,
+                 argon2_paralelismo=ARGON2_PARALELISMO_PADRAO, threads=None, max_fila=MAX_FILA_PADRAO):
+        if algoritmo not in ALGORITMOS:
+            raise ValueError(f'Algoritmo de hash desconhecido: {algoritmo} (use {", ".join(ALGORITMOS)})')
+        self.algoritmo = algoritmo
+        self.custo_bcrypt = custo_bcrypt
+        self.argon2_memoria_kib = argon2_memoria_kib
+        self.argon2_tempo = argon2_tempo
+        self.argon2_paralelismo = argon2_paralelismo
+        self.threads = threads or os.cpu_count() or 1
+        self.max_fila = max_fila
+
+        self._argon2 = None
+        if algoritmo == 'argon2id':
+            self._argon2 = self._hasher_argon2()
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pendentes = 0  # enviados ao pool e ainda não terminados
+        self._em_execucao = 0
+        self.concluidos = 0
+        self.recusados = 0
+
+    def _hasher_argon2(self):
+        try:
+            from argon2 import PasswordHasher, Type
+        except ImportError:
+            raise RuntimeError('HASH_SENHA_ALGORITMO=argon2id requer o pacote argon2-cffi') from None
+        return PasswordHasher(time_cost=self.argon2_tempo, memory_cost=self.argon2_memoria_kib,
+                              parallelism=self.argon2_paralelismo, type=Type.ID)
+
+    # ---------- cálculo (síncrono) ----------
+
+    def gerar_hash_agora(self, senha):
+        if self.algoritmo == 'argon2id':
+            return self._argon2.hash(senha)
+        return bcrypt.hashpw(senha.encode('utf-8')[:_BCRYPT_MAX_BYTES],
+                             bcrypt.gensalt(self.custo_bcrypt)).decode('utf-8')
+
+    def verificar_agora(self, senha_hash, senha):
+        if not senha_hash or senha is None:
+            return False
+        if senha_hash.startswith('$argon2'):
+            from argon2.exceptions import InvalidHashError, VerificationError
+            hasher = self._argon2 or self._hasher_argon2()
+            try:
+                return hasher.verify(senha_hash, senha)
+            except (VerificationError, InvalidHashError):
+                return False
+        try:
+            return bcrypt.checkpw(senha.encode('utf-8')[:_BCRYPT_MAX_BYTES], senha_hash.encode('utf-8'))
+        except ValueError:  # hash corrompido ou em outro formato
+            return False
+
+    def precisa_rehash(self, senha_hash):
+        """True se o hash foi gerado com outro algoritmo ou outros parâmetros"""
+        if self.algoritmo == 'argon2id':
+            return not senha_hash.startswith('$argon2id$') or self._argon2.check_needs_rehash(senha_hash)
+        partes = senha_hash.split('$')  # ['', '2b', '12', salt+hash]
+        return len(partes) != 4 or not partes[1].startswith('2') or partes[2] != f'{self.custo_bcrypt:02d}'
+
+    # ---------- pool ----------
+
+    def _rodar(self, funcao, *args):
+        with self._lock:
+            self._em_execucao += 1
+        try:
+            return funcao(*args)
+        finally:
+            with self._lock:
+                self._em_execucao -= 1
+                self._pendentes -= 1
+                self.concluidos += 1
+
+    def _executar(self, funcao, *args):
+        with self._lock:
+            if self._pendentes - self._em_execucao >= self.max_fila:
+                self.recusados += 1
+                raise FilaSenhasCheia(f'{self._pendentes - self._em_execucao} hashes de senha na fila')
+            self._pendentes += 1
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='senhas')
+            pool = self._pool
+        return pool.submit(self._rodar, funcao, *args).result()
+
+    def gerar_hash(self, senha):
+        return self._executar(self.gerar_hash_agora, senha)
+
+    def verificar(self, senha_hash, senha):
+        return self._executar(self.verificar_agora, senha_hash, senha)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                'algoritmo': self.algoritmo,
+                'threads': self.threads,
+                'fila': self._pendentes - self._em_execucao,
+                'em_execucao': self._em_execucao,
+                'max_fila': self.max_fila,
+                'concluidos': self.concluidos,
+                'recusados': self.recusados,
+            }
+
+    def encerrar(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def criar_servico(config):
+    """Serviço a partir da configuração do Flask (HASH_SENHA_*)"""
+    return ServicoSenhas(
+        algoritmo=config.get('HASH_SENHA_ALGORITMO', 'bcrypt'),
+        custo_bcrypt=int(config.get('HASH_SENHA_BCRYPT_CUSTO', BCRYPT_CUSTO_PADRAO)),
+        argon2_memoria_kib=int(config.get('HASH_SENHA_ARGON2_MEMORIA_KIB', ARGON2_MEMORIA_PADRAO)),
+        argon2_tempo=int(config.get('HASH_SENHA_ARGON2_TEMPO', ARGON2_TEMPO_PADRAO)),
+        argon2_paralelismo=int(config.get('HASH_SENHA_ARGON2_PARALELISMO', ARGON2_PARALELISMO_PADRAO)),
+        threads=config.get('HASH_SENHA_THREADS') or None,
+        max_fila=int(config.get('HASH_SENHA_MAX_FILA', MAX_FILA_PADRAO)),
+    )
+
+
+# Serviço usado pelo Usuario; o app.py o troca pelo configurado (ver configurar)
+servico = ServicoSenhas()
+
+
+def configurar(config):
+    global servico
+    anterior, servico = servico, criar_servico(config)
+    anterior.encerrar()
+    return servico
@@ -0,0 +1,202 @@
+"""
+🔐 Sessões no servidor - login sem consulta ao banco a cada requisição
+
+A sessão do Flask ficava inteira no cookie, assinada com um SECRET_KEY que,
+sem a variável de ambiente, era um os.urandom(24) diferente em cada worker
+do gunicorn: a requisição que caía em outro worker (ou chegava depois de
+um restart) perdia o login, e o usuário refazia login, com bcrypt, à toa.
+
+Aqui o cookie leva só um identificador aleatório assinado; os dados da
+sessão ficam no Redis (SESSION_REDIS_URL, compartilhado entre workers).
+Sem Redis, a produção recusa subir (sessões em memória seriam de um worker
+só); desenvolvimento e testes usam memória no processo, e outros ambientes
+ficam com a sessão em cookie do Flask.
+
+Junto com o login, em qualquer um desses armazenamentos, vai o "principal":
+as colunas do usuário de `cache_usuarios.dados_usuario`, de onde o
+`user_loader` reconstrói o current_user sem SELECT. O principal é
+renovado pelo cache de usuários a cada SESSAO_PRINCIPAL_TTL segundos, que
+é o tempo máximo para uma desativação feita por outra sessão valer.
+"""
+
+import logging
+import secrets
+import time
+
+from flask import session
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+import cache_usuarios
+
+logger = logging.getLogger(__name__)
+
+CHAVE_PRINCIPAL = '_principal'
+PRINCIPAL_TTL_PADRAO = 60  # segundos
+MAX_SESSOES_MEMORIA = 10000
+AMBIENTES_MEMORIA = ('development', 'testing')  # um processo só: sessões em memória servem
+
+
+class SessaoServidor(CallbackDict, SessionMixin):
+    """Sessão cujo conteúdo fica no armazenamento; o cookie só identifica"""
+
+    def __init__(self, dados=None, sid=None, nova=False, gravada_em=0):
+        def ao_alterar(sessao):
+            sessao.modified = True
+
+        super().__init__(dados, ao_alterar)
+        self.sid = sid
+        self.new = nova
+        self.gravada_em = gravada_em
+        self.sid_anterior = None
+        self.modified = False
+
+    def renovar_sid(self):
+        """Troca o identificador (no login), para que um id anterior conhecido não sirva de nada"""
+        self.sid_anterior = self.sid_anterior or self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class InterfaceSessaoServidor(SessionInterface):
+    """SessionInterface do Flask sobre um backend cachelib (RedisCache ou SimpleCache)"""
+
+    def __init__(self, armazenamento, prefixo='sessao:'):
+        self.armazenamento = armazenamento
+        self.prefixo = prefixo
+
+    def _assinador(self, app):
+        return Signer(app.secret_key, salt='frota-globo-sessao', key_derivation='hmac')
+
+    def _ler(self, sid):
+        try:
+            return self.armazenamento.get(self.prefixo + sid)
+        except Exception as e:
+            # Redis fora do ar: segue sem sessão em vez de devolver erro 500
+            logger.warning(f'Armazenamento de sessões indisponível: {e}')
+            return None
+
+    def _gravar(self, sid, registro, segundos):
+        try:
+            self.armazenamento.set(self.prefixo + sid, registro, timeout=segundos)
+        except Exception as e:
+            logger.warning(f'Armazenamento de sessões indisponível: {e}')
+
+    def _apagar(self, sid):
+        try:
+            self.armazenamento.delete(self.prefixo + sid)
+        except Exception as e:
+            logger.warning(f'Armazenamento de sessões indisponível: {e}')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._assinador(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            registro = self._ler(sid) if sid else None
+            if registro is not None:
+                return SessaoServidor(registro['dados'], sid=sid, gravada_em=registro['gravada_em'])
+        return SessaoServidor(sid=secrets.token_urlsafe(32), nova=True)
+
+    def save_session(self, app, session, response):
+        nome = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        caminho = self.get_cookie_path(app)
+
+        if session.sid_anterior:
+            self._apagar(session.sid_anterior)
+
+        if not session:
+            if session.modified and not session.new:
+                self._apagar(session.sid)
+                response.delete_cookie(nome, domain=dominio, path=caminho,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        # Sem alterações, o registro só é regravado (para estender a validade)
+        # depois de meia vida, e não a cada requisição
+        vida = int(app.permanent_session_lifetime.total_seconds())
+        agora = time.time()
+        renovar = app.config['SESSION_REFRESH_EACH_REQUEST'] and agora - session.gravada_em > vida / 2
+        if not (session.modified or renovar):
+            return
+
+        self._gravar(session.sid, {'dados': dict(session), 'gravada_em': agora}, vida)
+        response.vary.add('Cookie')
+        response.set_cookie(
+            nome,
+            self._assinador(app).sign(session.sid.encode()).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=dominio,
+            path=caminho,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def criar_interface(url_redis=None, ambiente='development', max_sessoes=MAX_SESSOES_MEMORIA):
+    """Sessões no Redis se houver URL; sem ele, depende do ambiente.
+
+    Em produção, recusa subir: em memória cada worker do gunicorn teria as
+    suas sessões e o login cairia sempre que a requisição fosse para outro.
+    Em desenvolvimento e testes (um processo) ficam em memória; nos demais
+    ambientes, na sessão em cookie do Flask (o principal vai junto).
+    """
+    from cachelib import SimpleCache
+
+    if url_redis:
+        try:
+            import redis
+            from cachelib.redis import RedisCache
+            return InterfaceSessaoServidor(RedisCache(host=redis.from_url(url_redis), key_prefix='frota_globo:'))
+        except ImportError:
+            if ambiente == 'production':
+                raise RuntimeError('SESSION_REDIS_URL definido, mas o pacote redis não está instalado') from None
+            logger.warning('Pacote redis não instalado: sessões fora do Redis')
+
+    if ambiente == 'production':
+        raise RuntimeError(
+            'SESSION_REDIS_URL (ou REDIS_URL) não definido em produção: '
+            'as sessões precisam de um Redis compartilhado entre os workers'
+        )
+    if ambiente in AMBIENTES_MEMORIA:
+        return InterfaceSessaoServidor(SimpleCache(threshold=max_sessoes))
+    logger.warning(f'Sem Redis no ambiente {ambiente}: sessões em cookie assinado')
+    return SecureCookieSessionInterface()
+
+
+# ==================== PRINCIPAL (Flask-Login) ====================
+
+def guardar_principal(usuario):
+    """Grava o usuário logado na sessão (no login e quando ele edita o perfil)"""
+    session[CHAVE_PRINCIPAL] = {'dados': cache_usuarios.dados_usuario(usuario), 'em': time.time()}
+
+
+def entrar(usuario):
+    """Prepara a sessão para um login: id novo e principal gravado"""
+    if hasattr(session, 'renovar_sid'):
+        session.renovar_sid()
+    guardar_principal(usuario)
+
+
+def carregar_principal(cache, user_id, ttl=PRINCIPAL_TTL_PADRAO):
+    """user_loader: current_user a partir do principal da sessão, sem SELECT.
+
+    Principal ausente, de outro usuário ou mais velho que `ttl` é
+    recarregado pelo cache de usuários (que só vai ao banco em caso de falta).
+    """
+    principal = session.get(CHAVE_PRINCIPAL)
+    if principal and principal['dados']['id'] == user_id and time.time() - principal['em'] < ttl:
+        return cache_usuarios.anexar_usuario(principal['dados'])
+
+    usuario = cache_usuarios.carregar_usuario(cache, user_id)
+    if usuario is None or not usuario.ativo:
+        session.pop(CHAVE_PRINCIPAL, None)
+        return None
+    guardar_principal(usuario)
+    return usuario
@@ -1,7 +1,10 @@
 import gspread
 import os
 import json
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from gspread.utils import numericise_all, rowcol_to_a1
 from oauth2client.service_account import ServiceAccountCredentials
 from zoneinfo import ZoneInfo
 import logging
@@ -12,16 +15,100 @@ logger = logging.getLogger(__name__)
 
 TZ = ZoneInfo('America/Sao_Paulo')
 
+# Validade dos instantâneos das abas, em segundos (0 desliga o cache)
+TTL_INSTANTANEO = int(os.getenv('SHEETS_CACHE_TTL', '30'))
+
+
+class InstantaneoAba:
+    """Cópia em memória dos valores de uma aba, com índices por coluna.
+
+    Os índices ({valor: número da linha}) são montados na primeira busca
+    por uma coluna (Email, Placa) e deixam as buscas em O(1), sem baixar a
+    aba de novo. As linhas nunca são apagadas pelo sistema, então o número
+    de uma linha continua válido para escrita enquanto o instantâneo vale.
+    """
+
+    def __init__(self, valores, ttl):
+        largura = max((len(linha) for linha in valores), default=0)
+        # get_all_values completa as linhas com '' até a largura da aba
+        self.valores = [list(linha) + [''] * (largura - len(linha)) for linha in valores]
+        self.cabecalho = self.valores[0] if self.valores else []
+        self.expira_em = time.monotonic() + ttl
+        self._indices = {}
+
+    def expirado(self):
+        return time.monotonic() >= self.expira_em
+
+    def linhas(self):
+        """(número da linha, registro com os valores em texto) das linhas de dados"""
+        return [(numero, dict(zip(self.cabecalho, linha)))
+                for numero, linha in enumerate(self.valores[1:], start=2)]
+
+    def registro(self, numero):
+        """Linha no mesmo formato de get_all_records (números convertidos)"""
+        return dict(zip(self.cabecalho, numericise_all(self.valores[numero - 1])))
+
+    def registros(self):
+        return [self.registro(numero) for numero in range(2, len(self.valores) + 1)]
+
+    def indice(self, coluna):
+        """{valor: número da linha} da coluna; vale a primeira ocorrência, como na busca linear"""
+        if coluna not in self._indices:
+            indice = {}
+            if coluna in self.cabecalho:
+                posicao = self.cabecalho.index(coluna)
+                for numero, linha in enumerate(self.valores[1:], start=2):
+                    indice.setdefault(linha[posicao], numero)
+            self._indices[coluna] = indice
+        return self._indices[coluna]
+
+
+class LoteEscrita:
+    """Atualizações de células acumuladas e enviadas em uma única requisição.
+
+    Cada update_cell era uma chamada à API do Sheets (cota de 300 req/min);
+    aqui todas as células de uma operação, mesmo em abas diferentes, vão
+    em um único values_batch_update.
+    """
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+        self.celulas = {}  # (aba, linha, coluna) -> valor
+
+    def definir(self, ws, linha, coluna, valor):
+        self.celulas[(ws.title, linha, coluna)] = valor
+
+    def __len__(self):
+        return len(self.celulas)
+
+    def enviar(self):
+        if not self.celulas:
+            return
+        dados = [
+            {'range': f"'{aba}'!{rowcol_to_a1(linha, coluna)}", 'values': [[valor]]}
+            for (aba, linha, coluna), valor in self.celulas.items()
+        ]
+        self.spreadsheet.values_batch_update({'valueInputOption': 'USER_ENTERED', 'data': dados})
+        self.celulas.clear()
+
+
 class SheetsDB:
-    def __init__(self):
+    def __init__(self, spreadsheet=None, ttl=None):
+        """`spreadsheet` pode ser injetada (ex: planilha falsa nos testes offline);
+        `ttl` é a validade dos instantâneos das abas (padrão: SHEETS_CACHE_TTL)"""
         self.scope = [
             'https://www.googleapis.com/auth/spreadsheets',
             'https://www.googleapis.com/auth/drive.file'
         ]
         self.creds = None
         self.client = None
-        self.spreadsheet = None
-        self._connect()
+        self.spreadsheet = spreadsheet
+        self.ttl = TTL_INSTANTANEO if ttl is None else ttl
+        self._cabecalhos = {}  # aba -> {nome da coluna: índice (1-based)}
+        self._abas = {}  # aba -> Worksheet, reaproveitado entre chamadas
+        self._instantaneos = {}  # aba -> InstantaneoAba
+        if spreadsheet is None:
+            self._connect()
 
     def _connect(self):
         """Estabelece conexão com o Google Sheets"""
@@ -57,25 +144,108 @@ class SheetsDB:
 
     def _get_worksheet(self, name):
         if not self.spreadsheet:
+            self._abas.clear()
             self._connect()
+        # spreadsheet.worksheet() é uma requisição de metadados: o handle é guardado
+        ws = self._abas.get(name)
+        if ws is not None:
+            return ws
         try:
-            return self.spreadsheet.worksheet(name)
+            ws = self.spreadsheet.worksheet(name)
         except Exception as e:
             logger.error(f"Erro ao acessar aba {name}: {e}")
             return None
+        self._abas[name] = ws
+        return ws
+
+    # ================= INSTANTÂNEOS =================
+    def _instantaneo(self, ws):
+        """Valores da aba, lidos da API no máximo uma vez a cada `ttl` segundos"""
+        instantaneo = self._instantaneos.get(ws.title)
+        if instantaneo is None or instantaneo.expirado():
+            instantaneo = InstantaneoAba(ws.get_all_values(), self.ttl)
+            self._lembrar_cabecalho(ws.title, instantaneo.cabecalho)
+            if self.ttl > 0:
+                self._instantaneos[ws.title] = instantaneo
+        return instantaneo
+
+    def invalidar(self, *abas):
+        """Descarta os instantâneos das abas (de todas, se nenhuma for informada)"""
+        for aba in abas or list(self._instantaneos):
+            self._instantaneos.pop(aba, None)
+
+    def _acrescentar(self, ws, linha):
+        """append_row seguido da invalidação do instantâneo da aba"""
+        try:
+            ws.append_row(linha)
+        finally:
+            self.invalidar(ws.title)
+
+    # ================= CABEÇALHOS E LOTES =================
+    def _lembrar_cabecalho(self, titulo, cabecalho):
+        colunas = {}
+        for indice, nome in enumerate(cabecalho, start=1):
+            if nome:
+                colunas.setdefault(nome, indice)  # Como headers.index: vale a primeira
+        self._cabecalhos[titulo] = colunas
+        return colunas
+
+    def _coluna(self, ws, nome):
+        """Índice (1-based) da coluna `nome`, pelo cabeçalho em cache; None se não existir"""
+        colunas = self._cabecalhos.get(ws.title)
+        if colunas is None or nome not in colunas:
+            # Primeira vez nesta aba, ou a coluna foi criada depois: relê a linha 1
+            colunas = self._lembrar_cabecalho(ws.title, ws.row_values(1))
+        return colunas.get(nome)
+
+    def _linhas(self, ws):
+        """(número da linha, registro) de todas as linhas de dados, do instantâneo"""
+        return self._instantaneo(ws).linhas()
+
+    def _linha_por_valor(self, ws, coluna, valor):
+        """Número da primeira linha de dados com `valor` na coluna (busca no índice)"""
+        if valor is None:
+            return None
+        return self._instantaneo(ws).indice(coluna).get(str(valor))
+
+    @contextmanager
+    def _lote(self, lote=None):
+        """Agrupa as escritas do bloco em um só envio.
+
+        Com um `lote` já aberto, as escritas entram nele e quem o abriu faz o
+        envio. Se o bloco falhar, nada é enviado.
+        """
+        if lote is not None:
+            yield lote
+            return
+        lote = LoteEscrita(self.spreadsheet)
+        yield lote
+        abas = {aba for aba, _, _ in lote.celulas}
+        try:
+            lote.enviar()
+        finally:
+            if abas:
+                self.invalidar(*abas)
+
+    def _definir(self, lote, ws, linha, valores):
+        """Coloca no lote os valores {nome da coluna: valor} da linha"""
+        for nome, valor in valores.items():
+            coluna = self._coluna(ws, nome)
+            if coluna is None:
+                raise ValueError(f"Coluna '{nome}' não encontrada na aba {ws.title}")
+            lote.definir(ws, linha, coluna, valor)
 
     # ================= USUÁRIOS =================
     def get_users(self):
         ws = self._get_worksheet('Usuários')
         if not ws: return []
-        return ws.get_all_records()
+        return self._instantaneo(ws).registros()
 
     def get_user_by_email(self, email):
-        users = self.get_users()
-        for user in users:
-            if user.get('Email') == email:
-                return user
-        return None
+        ws = self._get_worksheet('Usuários')
+        if not ws: return None
+        linha = self._linha_por_valor(ws, 'Email', email)
+        return self._instantaneo(ws).registro(linha) if linha else None
 
     def get_user_by_id(self, user_id):
         # Na planilha antiga não tinha ID, usava Email. Vamos adaptar.
@@ -102,42 +272,37 @@ class SheetsDB:
             'Sim' if user_data.get('ativo', True) else 'Não',
             '123456' # Senha padrão, já que planilha não guarda hash seguro idealmente
         ]
-        ws.append_row(row)
+        self._acrescentar(ws, row)
         return True
 
     # ================= VEÍCULOS =================
     def get_veiculos(self):
         ws = self._get_worksheet('Veículos')
         if not ws: return []
-        return ws.get_all_records()
+        return self._instantaneo(ws).registros()
 
     def get_veiculo_by_placa(self, placa):
-        veiculos = self.get_veiculos()
-        for v in veiculos:
-            if v.get('Placa') == placa:
-                return v
-        return None
+        ws = self._get_worksheet('Veículos')
+        if not ws: return None
+        linha = self._linha_por_valor(ws, 'Placa', placa)
+        return self._instantaneo(ws).registro(linha) if linha else None
 
-    def update_veiculo_status(self, placa, novo_status):
+    def update_veiculo_status(self, placa, novo_status, lote=None):
         ws = self._get_worksheet('Veículos')
-        cell = ws.find(placa)
-        if cell:
-            # Assumindo que Status é a coluna 8 (H) com base no migrate script
-            # Mas é mais seguro buscar o header
-            headers = ws.row_values(1)
-            try:
-                col_idx = headers.index('Status') + 1
-                ws.update_cell(cell.row, col_idx, novo_status)
-                return True
-            except ValueError:
-                pass
-        return False
+        if not ws: return False
+        # Procura a placa só na coluna Placa (ws.find varria a planilha inteira)
+        linha = self._linha_por_valor(ws, 'Placa', placa)
+        if not linha or not self._coluna(ws, 'Status'):
+            return False
+        with self._lote(lote) as lote:
+            self._definir(lote, ws, linha, {'Status': novo_status})
+        return True
 
     # ================= AGENDAMENTOS =================
     def get_agendamentos(self):
         ws = self._get_worksheet('Agendamentos')
         if not ws: return []
-        return ws.get_all_records()
+        return self._instantaneo(ws).registros()
 
     def create_agendamento(self, data):
         ws = self._get_worksheet('Agendamentos')
@@ -156,7 +321,7 @@ class SheetsDB:
             data.get('status', 'Agendado'),
             datetime.now(TZ).isoformat() # Data Criação
         ]
-        ws.append_row(row)
+        self._acrescentar(ws, row)
         return True
     
 
@@ -166,7 +331,7 @@ class SheetsDB:
     def get_viagens(self):
         ws = self._get_worksheet('Viagens')
         if not ws: return []
-        return ws.get_all_records()
+        return self._instantaneo(ws).registros()
 
     def create_viagem(self, data):
         ws = self._get_worksheet('Viagens')
@@ -183,17 +348,19 @@ class SheetsDB:
             data.get('observacoes', ''),
             'Em Andamento'
         ]
-        ws.append_row(row)
+        self._acrescentar(ws, row)
         
-        # Update vehicle status to 'Em Uso'
-        placa = data.get('placa')
-        if placa:
-            self.update_veiculo_status(placa, 'Em Uso')
-        
-        # Update agendamento status to 'Em Uso' if agendamento_id provided
-        agendamento_id = data.get('agendamento_id')
-        if agendamento_id:
-            self.update_agendamento_status(int(agendamento_id), 'Em Uso')
+        # Status do veículo e do agendamento vão juntos em um único envio
+        with self._lote() as lote:
+            # Update vehicle status to 'Em Uso'
+            placa = data.get('placa')
+            if placa:
+                self.update_veiculo_status(placa, 'Em Uso', lote=lote)
+            
+            # Update agendamento status to 'Em Uso' if agendamento_id provided
+            agendamento_id = data.get('agendamento_id')
+            if agendamento_id:
+                self.update_agendamento_status(int(agendamento_id), 'Em Uso', lote=lote)
         
         return True
 
@@ -201,35 +368,27 @@ class SheetsDB:
         ws = self._get_worksheet('Viagens')
         if not ws: return False
         
-        # Encontrar a viagem em aberto para este veículo
-        # Isso é ineficiente em planilhas grandes, mas ok para testes
-        records = ws.get_all_records()
-        headers = ws.row_values(1)
-        
-        status_col = headers.index('Status') + 1
-        placa_col = headers.index('Placa') + 1
-        data_chegada_col = headers.index('Data Chegada') + 1
-        km_chegada_col = headers.index('KM Chegada') + 1
-        obs_col = headers.index('Observações') + 1 # Assumindo que existe
-        
-        for i, viagem in enumerate(records):
+        # Encontrar a viagem em aberto para este veículo (uma leitura da aba)
+        for row_num, viagem in self._linhas(ws):
             if viagem.get('Placa') == placa and viagem.get('Status') == 'Em Andamento':
-                row_num = i + 2 # +2 por causa do header e 0-based index
-                
-                # Atualizar campos
-                ws.update_cell(row_num, status_col, 'Finalizada')
-                ws.update_cell(row_num, data_chegada_col, datetime.now(TZ).isoformat())
-                ws.update_cell(row_num, km_chegada_col, km_chegada)
+                campos = {
+                    'Status': 'Finalizada',
+                    'Data Chegada': datetime.now(TZ).isoformat(),
+                    'KM Chegada': km_chegada,
+                }
                 if observacoes:
-                     # Nota: Se observações já tiver texto, pode sobrescrever.
-                     # Para simplicidade, vamos sobrescrever ou concatenar se possível, mas update_cell sobrescreve.
-                     ws.update_cell(row_num, obs_col, observacoes)
-                
-                # Update vehicle status back to 'Disponível'
-                self.update_veiculo_status(placa, 'Disponível')
+                    # Nota: sobrescreve as observações da saída
+                    campos['Observações'] = observacoes
                 
-                # Update agendamento status to 'Realizado'
-                self.update_agendamento_status_by_placa(placa, 'Realizado')
+                # Viagem, veículo e agendamento são gravados em um único batch update
+                with self._lote() as lote:
+                    self._definir(lote, ws, row_num, campos)
+                    
+                    # Update vehicle status back to 'Disponível'
+                    self.update_veiculo_status(placa, 'Disponível', lote=lote)
+                    
+                    # Update agendamento status to 'Realizado'
+                    self.update_agendamento_status_by_placa(placa, 'Realizado', lote=lote)
                 
                 return True
         return False
@@ -243,7 +402,8 @@ class SheetsDB:
                 if self.spreadsheet:
                     ws = self.spreadsheet.add_worksheet(title="Leads", rows=1000, cols=10)
                     # Adicionar header
-                    ws.append_row(['Data Criação', 'Nome', 'Email', 'Telefone', 'Empresa', 'Senha', 'Status'])
+                    self._abas['Leads'] = ws
+                    self._acrescentar(ws, ['Data Criação', 'Nome', 'Email', 'Telefone', 'Empresa', 'Senha', 'Status'])
                 else:
                     return False
             except Exception as e:
@@ -259,7 +419,7 @@ class SheetsDB:
             data.get('password'), # Plain text as requested
             'Pendente'
         ]
-        ws.append_row(row)
+        self._acrescentar(ws, row)
         return True
 
     # =================== VEICULO CRUD ===================
@@ -279,7 +439,7 @@ class SheetsDB:
             'Disponível',  # Status padrão
             data.get('observacoes', '')
         ]
-        ws.append_row(row)
+        self._acrescentar(ws, row)
         return True
     
     def update_veiculo(self, placa, data):
@@ -289,17 +449,13 @@ class SheetsDB:
             return False
         
         try:
-            records = ws.get_all_records()
-            for idx, row in enumerate(records, start=2):
-                if row.get('Placa') == placa:
-                    # Update columns: Placa, Marca, Modelo, Ano, Cor, KM Atual, Status, Observações
-                    if 'marca' in data: ws.update_cell(idx, 2, data['marca'])
-                    if 'modelo' in data: ws.update_cell(idx, 3, data['modelo'])
-                    if 'ano' in data: ws.update_cell(idx, 4, data['ano'])
-                    if 'cor' in data: ws.update_cell(idx, 5, data['cor'])
-                    if 'km_atual' in data: ws.update_cell(idx, 6, data['km_atual'])
-                    return True
-            return False
+            idx = self._linha_por_valor(ws, 'Placa', placa)
+            if not idx:
+                return False
+            colunas = {'marca': 'Marca', 'modelo': 'Modelo', 'ano': 'Ano', 'cor': 'Cor', 'km_atual': 'KM Atual'}
+            with self._lote() as lote:
+                self._definir(lote, ws, idx, {coluna: data[campo] for campo, coluna in colunas.items() if campo in data})
+            return True
         except Exception as e:
             logger.error(f"Erro ao atualizar veículo: {e}")
             return False
@@ -319,7 +475,7 @@ class SheetsDB:
             'Sim',  # Ativo
             data.get('senha', '123456')
         ]
-        ws.append_row(row)
+        self._acrescentar(ws, row)
         return True
     
     def update_user(self, email, data):
@@ -329,20 +485,18 @@ class SheetsDB:
             return False
         
         try:
-            records = ws.get_all_records()
-            for idx, row in enumerate(records, start=2):
-                if row.get('Email') == email:
-                    # Update columns: Email, Nome, Cargo, Telefone, Ativo, Senha
-                    if 'nome' in data: ws.update_cell(idx, 2, data['nome'])
-                    if 'telefone' in data: ws.update_cell(idx, 4, data['telefone'])
-                    if 'senha' in data: ws.update_cell(idx, 6, data['senha'])
-                    return True
-            return False
+            idx = self._linha_por_valor(ws, 'Email', email)
+            if not idx:
+                return False
+            colunas = {'nome': 'Nome', 'telefone': 'Telefone', 'senha': 'Senha'}
+            with self._lote() as lote:
+                self._definir(lote, ws, idx, {coluna: data[campo] for campo, coluna in colunas.items() if campo in data})
+            return True
         except Exception as e:
             logger.error(f"Erro ao atualizar usuário: {e}")
             return False
     
-    def update_agendamento_status(self, row_index, new_status):
+    def update_agendamento_status(self, row_index, new_status, lote=None):
         """Update agendamento status by row index (1-indexed from data, not including header)"""
         ws = self._get_worksheet('Agendamentos')
         if not ws:
@@ -351,30 +505,25 @@ class SheetsDB:
         try:
             # Row index needs +1 because row 1 is header, so data starts at row 2
             actual_row = row_index + 1
-            # Status is column 10 (J) in the Agendamentos sheet
-            ws.update_cell(actual_row, 10, new_status)
+            with self._lote(lote) as lote:
+                self._definir(lote, ws, actual_row, {'Status': new_status})
             return True
         except Exception as e:
             logger.error(f"Erro ao atualizar status do agendamento: {e}")
             return False
     
-    def update_agendamento_status_by_placa(self, placa, new_status):
+    def update_agendamento_status_by_placa(self, placa, new_status, lote=None):
         """Update agendamento status by finding the most recent agendamento for a given placa"""
         ws = self._get_worksheet('Agendamentos')
         if not ws:
             return False
         
         try:
-            records = ws.get_all_records()
-            headers = ws.row_values(1)
-            status_col = headers.index('Status') + 1
-            
             # Find the most recent agendamento for this placa with status 'Em Uso' or 'Confirmado'
-            for i in range(len(records) - 1, -1, -1):  # Search from bottom (most recent)
-                agend = records[i]
+            for row_num, agend in reversed(self._linhas(ws)):  # Search from bottom (most recent)
                 if agend.get('Placa') == placa and agend.get('Status') in ['Em Uso', 'Confirmado']:
-                    row_num = i + 2  # +2 for header and 0-based index
-                    ws.update_cell(row_num, status_col, new_status)
+                    with self._lote(lote) as lote:
+                        self._definir(lote, ws, row_num, {'Status': new_status})
                     return True
             return False
         except Exception as e:
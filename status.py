@@ -0,0 +1,100 @@
+"""
+🏷️ Status canônicos - Veículo, Viagem e Agendamento
+
+Os status eram gravados como texto livre ('Disponível', 'disponível',
+'Em Uso'...), o que obrigava as consultas a usar lower(status) e impedia o
+uso dos índices. Aqui ficam os valores canônicos e o tipo de coluna que
+normaliza tudo o que é gravado ou comparado no banco.
+"""
+
+from enum import StrEnum
+
+from sqlalchemy.types import TypeDecorator, String
+
+
+class StatusVeiculo(StrEnum):
+    """Status de veículo (valores usados nos templates do painel)"""
+    DISPONIVEL = 'disponível'
+    EM_VIAGEM = 'em viagem'
+    EM_MANUTENCAO = 'em manutenção'
+    INATIVO = 'inativo'
+
+
+class StatusViagem(StrEnum):
+    """Status de viagem"""
+    EM_ANDAMENTO = 'Em Andamento'
+    FINALIZADA = 'Finalizada'
+
+
+class StatusAgendamento(StrEnum):
+    """Status de agendamento"""
+    AGENDADO = 'Agendado'
+    CONFIRMADO = 'Confirmado'
+    EM_USO = 'Em Uso'
+    FINALIZADO = 'Finalizado'
+    CANCELADO = 'Cancelado'
+
+
+# Grafias legadas encontradas no banco, nas planilhas e no Supabase
+_SINONIMOS = {
+    StatusVeiculo: {
+        'em uso': StatusVeiculo.EM_VIAGEM,
+        'manutenção': StatusVeiculo.EM_MANUTENCAO,
+        'manutencao': StatusVeiculo.EM_MANUTENCAO,
+        'em manutencao': StatusVeiculo.EM_MANUTENCAO,
+        'disponivel': StatusVeiculo.DISPONIVEL,
+    },
+    StatusViagem: {
+        'finalizado': StatusViagem.FINALIZADA,
+        'em rota': StatusViagem.EM_ANDAMENTO,
+    },
+    StatusAgendamento: {
+        'aguardando aprovação': StatusAgendamento.AGENDADO,
+        'aguardando aprovacao': StatusAgendamento.AGENDADO,
+        'aprovado': StatusAgendamento.CONFIRMADO,
+        'realizado': StatusAgendamento.FINALIZADO,
+        'finalizada': StatusAgendamento.FINALIZADO,
+    },
+}
+
+
+def normalizar(enum_cls, valor):
+    """Converte qualquer grafia conhecida de status para o valor canônico.
+
+    Levanta ValueError se o valor não corresponde a nenhum status.
+    """
+    if valor is None or isinstance(valor, enum_cls):
+        return valor
+    chave = str(valor).strip().lower()
+    for membro in enum_cls:
+        if membro.value.lower() == chave:
+            return membro
+    if chave in _SINONIMOS.get(enum_cls, {}):
+        return _SINONIMOS[enum_cls][chave]
+    raise ValueError(f'Status inválido para {enum_cls.__name__}: {valor!r}')
+
+
+class StatusType(TypeDecorator):
+    """Coluna VARCHAR que só aceita status canônicos.
+
+    Valores gravados e literais de comparação (ex: `Veiculo.status == 'Disponível'`)
+    são normalizados antes de chegar ao banco, então as consultas podem
+    comparar a coluna diretamente e usar os índices.
+    """
+    impl = String(20)
+    cache_ok = True
+
+    def __init__(self, enum_cls):
+        super().__init__()
+        self.enum_cls = enum_cls
+
+    def process_bind_param(self, value, dialect):
+        membro = normalizar(self.enum_cls, value)
+        return membro.value if membro is not None else None
+
+    def process_result_value(self, value, dialect):
+        try:
+            return normalizar(self.enum_cls, value)
+        except ValueError:
+            # Linha ainda não migrada: devolve o texto original
+            return value
@@ -4,12 +4,19 @@ Replaces Google Sheets with PostgreSQL via Supabase
 """
 
 import os
+import uuid
 import logging
+import functools
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from supabase import create_client, Client
+from cachelib import SimpleCache
 from dotenv import load_dotenv
 
+try:
+    from supabase import create_client, Client
+except ImportError:  # Only needed when no client is injected
+    create_client = Client = None
+
 load_dotenv()
 
 # Timezone
@@ -17,40 +24,220 @@ TZ = ZoneInfo('America/Sao_Paulo')
 
 logger = logging.getLogger(__name__)
 
+# Read cache TTL per table, in seconds (0 disables caching for the table)
+CACHE_TTLS = {
+    'usuarios': 300,
+    'veiculos': 60,
+    'agendamentos': 30,
+    'viagens': 30,
+}
+
+# Columns never kept in the read cache: a SELECT that returns any of them
+# (including SELECT *) always goes to Supabase. The password hash must not
+# sit in process memory or Redis, and the login check must see the current one.
+UNCACHED_COLUMNS = {
+    'usuarios': {'senha'},
+}
+
+
+# Supabase column -> key used by the templates (Google Sheets format)
+AGENDAMENTO_LABELS = {
+    'usuario_email': 'Usuario Email',
+    'placa': 'Placa',
+    'data_agendamento': 'Data Agendamento',
+    'data_solicitada': 'Data Solicitada',
+    'hora_inicio': 'Hora Inicio',
+    'hora_fim': 'Hora Fim',
+    'passageiros': 'Passageiros',
+    'destinos': 'Destinos',
+    'observacoes': 'Observações',
+    'status': 'Status',
+    'motivo_cancelamento': 'Motivo Cancelamento',
+    'id': '_id',  # Keep UUID for reference
+}
+
+VIAGEM_LABELS = {
+    'motorista_email': 'Motorista Email',
+    'placa': 'Placa',
+    'data_saida': 'Data Saida',
+    'data_chegada': 'Data Chegada',
+    'km_saida': 'KM Saida',
+    'km_chegada': 'KM Chegada',
+    'destino': 'Destino',
+    'observacoes': 'Observações',
+    'status': 'Status',
+    'id': '_id',
+}
+
+# Filter operators accepted as `column__op` keys (see SupabaseDB.select)
+FILTER_OPERATORS = {
+    'eq': 'eq', 'neq': 'neq', 'gt': 'gt', 'gte': 'gte', 'lt': 'lt', 'lte': 'lte',
+    'in': 'in_', 'is': 'is_',
+}
+
+
+def format_row(row, labels):
+    """Rename Supabase columns to template keys; columns not selected are left out"""
+    return {label: row.get(column) for column, label in labels.items() if column in row}
+
+
+def create_cache():
+    """Cache backend from the environment: Redis when CACHE_TYPE=redis, else in-process.
+
+    Any cachelib-compatible object (get/set/add) can be passed to SupabaseDB instead.
+    """
+    redis_url = os.getenv('CACHE_REDIS_URL') or os.getenv('REDIS_URL')
+    if redis_url and os.getenv('CACHE_TYPE', '').lower() in ('redis', 'rediscache'):
+        try:
+            import redis
+            from cachelib.redis import RedisCache
+            return RedisCache(host=redis.from_url(redis_url), key_prefix='frota_globo:', default_timeout=0)
+        except ImportError:
+            logger.warning("redis package not installed, using in-process cache")
+    return SimpleCache(default_timeout=0)
+
+
+def invalidates(*tables):
+    """Bump the cache version of `tables` after a write (even a failed one)"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.invalidate(*tables)
+        return wrapper
+    return decorator
+
+
 class SupabaseDB:
-    def __init__(self):
-        """Initialize Supabase client"""
-        self.url = os.getenv('SUPABASE_URL')
-        self.key = os.getenv('SUPABASE_KEY')
+    def __init__(self, client=None, cache=None, cache_ttls=None):
+        """Initialize Supabase client
+        
+        `client` and `cache` can be injected (e.g. a local fake client in tests);
+        pass `cache=False` to disable the read cache.
+        """
+        if client is None:
+            self.url = os.getenv('SUPABASE_URL')
+            self.key = os.getenv('SUPABASE_KEY')
+            
+            if not self.url or not self.key:
+                raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+            if create_client is None:
+                raise ImportError("supabase package is required to connect to Supabase")
+            
+            client = create_client(self.url, self.key)
+            logger.info("Supabase client initialized successfully")
+        
+        self.client = client
+        self.cache = create_cache() if cache is None else (cache or None)
+        self.cache_ttls = {**CACHE_TTLS, **(cache_ttls or {})}
+    
+    # ============ CACHE ============
+    
+    def _version_key(self, table):
+        return f'supabase:version:{table}'
+    
+    def _version(self, table):
+        """Current version stamp of a table; every write replaces it"""
+        version = self.cache.get(self._version_key(table))
+        if version is None:
+            self.cache.add(self._version_key(table), uuid.uuid4().hex, timeout=0)
+            version = self.cache.get(self._version_key(table))
+        return version
+    
+    def _cached(self, table, key, loader):
+        """Read-through: return the cached result of `loader()` for the table's current version.
+        
+        None results are not cached, and exceptions from `loader` propagate
+        without caching anything.
+        """
+        ttl = self.cache_ttls.get(table, 0)
+        if self.cache is None or ttl <= 0:
+            return loader()
+        
+        cache_key = f'supabase:{table}:{self._version(table)}:{key}'
+        value = self.cache.get(cache_key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.cache.set(cache_key, value, timeout=ttl)
+        return value
+    
+    def invalidate(self, *tables):
+        """Drop cached reads of the given tables (all tables if none given)"""
+        if self.cache is None:
+            return
+        for table in tables or self.cache_ttls:
+            # A fresh stamp (not a counter) never collides with an expired one
+            self.cache.set(self._version_key(table), uuid.uuid4().hex, timeout=0)
+    
+    # ============ QUERIES ============
+    
+    def select(self, table, columns=None, filters=None, order=None, desc=False, limit=None, cached=True):
+        """Cached SELECT with projection, filters, ordering and limit done by PostgREST
+        
+        `filters` maps a column to a value (equality; a list/tuple/set means IN)
+        or `column__op` to a value, with op in eq, neq, gt, gte, lt, lte, in, is.
+        None values are ignored, so optional arguments can be passed straight through.
+        `cached=False`, or a projection with an UNCACHED_COLUMNS column, reads
+        straight from Supabase.
+        """
+        conditions = []
+        for key, value in (filters or {}).items():
+            if value is None:
+                continue
+            column, _, op = key.partition('__')
+            op = op or ('in' if isinstance(value, (list, tuple, set)) else 'eq')
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator: {key}")
+            if op == 'in':
+                value = sorted(value)
+                if not value:
+                    return []  # IN () never matches: skip the request
+            conditions.append((column, op, value))
+        conditions.sort(key=lambda condition: condition[:2])
         
-        if not self.url or not self.key:
-            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+        def load():
+            query = self.client.table(table).select(','.join(columns) if columns else '*')
+            for column, op, value in conditions:
+                query = getattr(query, FILTER_OPERATORS[op])(column, value)
+            if order:
+                query = query.order(order, desc=desc)
+            if limit:
+                query = query.limit(limit)
+            return query.execute().data
         
-        self.client: Client = create_client(self.url, self.key)
-        logger.info("Supabase client initialized successfully")
+        uncached = UNCACHED_COLUMNS.get(table, set())
+        if not cached or (uncached and (not columns or uncached & set(columns))):
+            return load()
+        key = repr((sorted(columns) if columns else '*', conditions, order, desc, limit))
+        return self._cached(table, key, load)
     
     # ============ USERS ============
     
-    def get_users(self):
-        """Get all users"""
+    def get_users(self, role=None, email=None, columns=None, **filters):
+        """Get users, optionally filtered by role/email (e.g. get_users(role='motorista'))"""
         try:
-            response = self.client.table('usuarios').select('*').execute()
-            return response.data
+            return self.select('usuarios', columns, {'role': role, 'email': email, **filters})
         except Exception as e:
             logger.error(f"Error getting users: {e}")
             return []
     
     def get_user_by_email(self, email):
-        """Get user by email"""
+        """Get user by email, always from Supabase (the login checks the password against it)"""
         try:
-            response = self.client.table('usuarios').select('*').eq('email', email).execute()
-            if response.data:
-                return response.data[0]
+            if not email:
+                return None
+            data = self.select('usuarios', filters={'email__eq': email}, limit=1, cached=False)
+            if data:
+                return data[0]
             return None
         except Exception as e:
             logger.error(f"Error getting user by email: {e}")
             return None
     
+    @invalidates('usuarios')
     def create_user(self, user_data):
         """Create a new user"""
         try:
@@ -62,12 +249,13 @@ class SupabaseDB:
     
     # ============ VEICULOS ============
     
-    def get_veiculos(self):
-        """Get all vehicles"""
+    def get_veiculos(self, status=None, placa=None, columns=None, **filters):
+        """Get vehicles, optionally filtered by status/placa (a list of placas means IN)"""
         try:
-            response = self.client.table('veiculos').select('*').execute()
+            data = self.select('veiculos', columns, {'status': status, 'placa': placa, **filters},
+                               order='placa')
             # Convert to dict format for compatibility
-            return [dict(v) for v in response.data]
+            return [dict(v) for v in data]
         except Exception as e:
             logger.error(f"Error getting vehicles: {e}")
             return []
@@ -75,14 +263,17 @@ class SupabaseDB:
     def get_veiculo_by_placa(self, placa):
         """Get vehicle by placa"""
         try:
-            response = self.client.table('veiculos').select('*').eq('placa', placa).execute()
-            if response.data:
-                return response.data[0]
+            if not placa:
+                return None
+            data = self.select('veiculos', filters={'placa__eq': placa}, limit=1)
+            if data:
+                return data[0]
             return None
         except Exception as e:
             logger.error(f"Error getting vehicle: {e}")
             return None
     
+    @invalidates('veiculos')
     def update_veiculo_status(self, placa, novo_status):
         """Update vehicle status"""
         try:
@@ -96,34 +287,25 @@ class SupabaseDB:
     
     # ============ AGENDAMENTOS ============
     
-    def get_agendamentos(self):
-        """Get all agendamentos"""
+    def get_agendamentos(self, status=None, placa=None, usuario_email=None, columns=None, limit=None, **filters):
+        """Get agendamentos (newest first), in Google Sheets format
+        
+        Filters run in PostgREST, e.g. get_agendamentos(status=['Agendado', 'Confirmado'])
+        or get_agendamentos(data_solicitada__gte='2024-01-01').
+        """
         try:
-            response = self.client.table('agendamentos').select('*').order('created_at', desc=True).execute()
-            # Convert to dict format for compatibility
-            result = []
-            for item in response.data:
-                # Convert to match Google Sheets format
-                formatted = {
-                    'Usuario Email': item.get('usuario_email'),
-                    'Placa': item.get('placa'),
-                    'Data Agendamento': item.get('data_agendamento'),
-                    'Data Solicitada': item.get('data_solicitada'),
-                    'Hora Inicio': item.get('hora_inicio'),
-                    'Hora Fim': item.get('hora_fim'),
-                    'Passageiros': item.get('passageiros'),
-                    'Destinos': item.get('destinos'),
-                    'Observações': item.get('observacoes'),
-                    'Status': item.get('status'),
-                    'Motivo Cancelamento': item.get('motivo_cancelamento'),
-                    '_id': item.get('id')  # Keep UUID for reference
-                }
-                result.append(formatted)
-            return result
+            data = self.select(
+                'agendamentos', columns,
+                {'status': status, 'placa': placa, 'usuario_email': usuario_email, **filters},
+                order='created_at', desc=True, limit=limit
+            )
+            # Convert to match Google Sheets format
+            return [format_row(item, AGENDAMENTO_LABELS) for item in data]
         except Exception as e:
             logger.error(f"Error getting agendamentos: {e}")
             return []
     
+    @invalidates('agendamentos')
     def create_agendamento(self, data):
         """Create new agendamento"""
         try:
@@ -144,33 +326,59 @@ class SupabaseDB:
             logger.error(f"Error creating agendamento: {e}")
             return False
     
-    def update_agendamento_status(self, agendamento_id, new_status):
-        """Update agendamento status by ID"""
+    def resolve_agendamento_id(self, agendamento_id):
+        """UUID of an agendamento
+        
+        Old links and forms used the 1-based position in the list ordered by
+        created_at desc. Those still resolve, with a single-row range query
+        instead of downloading the table, but positions shift whenever a new
+        agendamento is created, so they are deprecated.
+        """
+        if agendamento_id is None:
+            return None
+        text = str(agendamento_id).strip()
+        if not text.isdigit():
+            return text or None
+        position = int(text) - 1
+        if position < 0:
+            return None
+        logger.warning(f"Deprecated positional agendamento id {text}, use the UUID instead")
+        response = self.client.table('agendamentos').select('id')\
+            .order('created_at', desc=True)\
+            .range(position, position)\
+            .execute()
+        return response.data[0]['id'] if response.data else None
+    
+    def get_agendamento(self, agendamento_id):
+        """Get one agendamento by UUID (or legacy position), in Google Sheets format"""
         try:
-            # If agendamento_id is numeric (from old system), get by index
-            # Otherwise treat as UUID
-            if isinstance(agendamento_id, int) or (isinstance(agendamento_id, str) and agendamento_id.isdigit()):
-                # Get by position (for backwards compatibility)
-                all_agendamentos = self.get_agendamentos()
-                idx = int(agendamento_id) - 1  # Convert to 0-based
-                if 0 <= idx < len(all_agendamentos):
-                    uuid = all_agendamentos[idx].get('_id')
-                    if uuid:
-                        response = self.client.table('agendamentos').update({
-                            'status': new_status
-                        }).eq('id', uuid).execute()
-                        return True if response.data else False
-            else:
-                # Direct UUID update
-                response = self.client.table('agendamentos').update({
-                    'status': new_status
-                }).eq('id', agendamento_id).execute()
-                return True if response.data else False
-            return False
+            agendamento_uuid = self.resolve_agendamento_id(agendamento_id)
+            if not agendamento_uuid:
+                return None
+            data = self.select('agendamentos', filters={'id__eq': agendamento_uuid}, limit=1)
+            return format_row(data[0], AGENDAMENTO_LABELS) if data else None
+        except Exception as e:
+            logger.error(f"Error getting agendamento: {e}")
+            return None
+    
+    @invalidates('agendamentos')
+    def update_agendamento(self, agendamento_id, update_data):
+        """Update a single agendamento addressed by UUID (one PATCH ... WHERE id = uuid)"""
+        try:
+            agendamento_uuid = self.resolve_agendamento_id(agendamento_id)
+            if not agendamento_uuid:
+                return False
+            response = self.client.table('agendamentos').update(update_data).eq('id', agendamento_uuid).execute()
+            return True if response.data else False
         except Exception as e:
-            logger.error(f"Error updating agendamento status: {e}")
+            logger.error(f"Error updating agendamento: {e}")
             return False
     
+    def update_agendamento_status(self, agendamento_id, new_status):
+        """Update agendamento status by ID"""
+        return self.update_agendamento(agendamento_id, {'status': new_status})
+    
+    @invalidates('agendamentos')
     def update_agendamento_status_by_placa(self, placa, new_status):
         """Update most recent agendamento for a placa"""
         try:
@@ -196,122 +404,73 @@ class SupabaseDB:
     
     def cancelar_agendamento(self, agendamento_id, motivo=None):
         """Cancel agendamento"""
-        try:
-            update_data = {'status': 'Cancelado'}
-            if motivo:
-                update_data['motivo_cancelamento'] = motivo
-            
-            # Handle numeric ID (backwards compatibility)
-            if isinstance(agendamento_id, int) or (isinstance(agendamento_id, str) and agendamento_id.isdigit()):
-                all_agendamentos = self.get_agendamentos()
-                idx = int(agendamento_id) - 1
-                if 0 <= idx < len(all_agendamentos):
-                    uuid = all_agendamentos[idx].get('_id')
-                    if uuid:
-                        response = self.client.table('agendamentos').update(update_data).eq('id', uuid).execute()
-                        return True if response.data else False
-            else:
-                response = self.client.table('agendamentos').update(update_data).eq('id', agendamento_id).execute()
-                return True if response.data else False
-            return False
-        except Exception as e:
-            logger.error(f"Error cancelling agendamento: {e}")
-            return False
+        update_data = {'status': 'Cancelado'}
+        if motivo:
+            update_data['motivo_cancelamento'] = motivo
+        return self.update_agendamento(agendamento_id, update_data)
     
     # ============ VIAGENS ============
     
-    def get_viagens(self):
-        """Get all trips"""
+    def get_viagens(self, status=None, placa=None, motorista_email=None, columns=None, limit=None, **filters):
+        """Get trips (newest first), in Google Sheets format
+        
+        Filters run in PostgREST, e.g. get_viagens(status='Em Andamento', columns=['placa'])
+        or get_viagens(data_saida__gte='2024-01-31').
+        """
         try:
-            response = self.client.table('viagens').select('*').order('created_at', desc=True).execute()
-            # Convert to dict format for compatibility
-            result = []
-            for item in response.data:
-                formatted = {
-                    'Motorista Email': item.get('motorista_email'),
-                    'Placa': item.get('placa'),
-                    'Data Saida': item.get('data_saida'),
-                    'Data Chegada': item.get('data_chegada'),
-                    'KM Saida': item.get('km_saida'),
-                    'KM Chegada': item.get('km_chegada'),
-                    'Destino': item.get('destino'),
-                    'Observações': item.get('observacoes'),
-                    'Status': item.get('status'),
-                    '_id': item.get('id')
-                }
-                result.append(formatted)
-            return result
+            data = self.select(
+                'viagens', columns,
+                {'status': status, 'placa': placa, 'motorista_email': motorista_email, **filters},
+                order='created_at', desc=True, limit=limit
+            )
+            return [format_row(item, VIAGEM_LABELS) for item in data]
         except Exception as e:
             logger.error(f"Error getting viagens: {e}")
             return []
     
+    @invalidates('viagens', 'veiculos', 'agendamentos')
     def create_viagem(self, data):
-        """Create new trip"""
+        """Create new trip (check-out)
+        
+        The insert and the vehicle/agendamento status changes run inside the
+        registrar_saida_viagem function (schema.sql): one round-trip and one
+        transaction, so a failure leaves nothing half-updated.
+        """
         try:
-            viagem_data = {
-                'motorista_email': data.get('motorista_email'),
-                'placa': data.get('placa'),
-                'data_saida': data.get('data_saida'),
-                'km_saida': data.get('km_saida'),
-                'destino': data.get('destino'),
-                'observacoes': data.get('observacoes'),
-                'status': 'Em Andamento'
-            }
+            agendamento_id = data.get('agendamento_id')
+            if agendamento_id:
+                agendamento_id = self.resolve_agendamento_id(agendamento_id)
             
-            response = self.client.table('viagens').insert(viagem_data).execute()
-            
-            if response.data:
-                # Update vehicle status
-                placa = data.get('placa')
-                if placa:
-                    self.update_veiculo_status(placa, 'Em Uso')
-                
-                # Update agendamento status if provided
-                agendamento_id = data.get('agendamento_id')
-                if agendamento_id:
-                    self.update_agendamento_status(int(agendamento_id), 'Em Uso')
-                
-                return True
-            return False
+            response = self.client.rpc('registrar_saida_viagem', {
+                'p_motorista_email': data.get('motorista_email'),
+                'p_placa': data.get('placa'),
+                'p_data_saida': data.get('data_saida') or datetime.now(TZ).isoformat(),
+                'p_km_saida': data.get('km_saida'),
+                'p_destino': data.get('destino'),
+                'p_observacoes': data.get('observacoes'),
+                'p_agendamento_id': agendamento_id or None,
+            }).execute()
+            return True if response.data else False
         except Exception as e:
             logger.error(f"Error creating viagem: {e}")
             return False
     
+    @invalidates('viagens', 'veiculos', 'agendamentos')
     def finaliza_viagem(self, placa, km_chegada, observacoes=None):
-        """Finalize trip"""
+        """Finalize trip (check-in)
+        
+        Closing the trip, freeing the vehicle and marking the agendamento as
+        'Realizado' happen atomically in the finalizar_viagem function (schema.sql).
+        Returns False when the vehicle has no trip in progress.
+        """
         try:
-            # Find active trip for this vehicle
-            response = self.client.table('viagens')\
-                .select('*')\
-                .eq('placa', placa)\
-                .eq('status', 'Em Andamento')\
-                .order('created_at', desc=True)\
-                .limit(1)\
-                .execute()
-            
-            if response.data and len(response.data) > 0:
-                viagem_id = response.data[0]['id']
-                
-                # Update trip
-                update_data = {
-                    'status': 'Finalizada',
-                    'data_chegada': datetime.now(TZ).isoformat(),
-                    'km_chegada': km_chegada
-                }
-                if observacoes:
-                    update_data['observacoes'] = observacoes
-                
-                update_response = self.client.table('viagens').update(update_data).eq('id', viagem_id).execute()
-                
-                if update_response.data:
-                    # Update vehicle status back to available
-                    self.update_veiculo_status(placa, 'Disponível')
-                    
-                    # Update agendamento status
-                    self.update_agendamento_status_by_placa(placa, 'Realizado')
-                    
-                    return True
-            return False
+            response = self.client.rpc('finalizar_viagem', {
+                'p_placa': placa,
+                'p_km_chegada': km_chegada,
+                'p_observacoes': observacoes or None,
+                'p_data_chegada': datetime.now(TZ).isoformat(),
+            }).execute()
+            return True if response.data else False
         except Exception as e:
             logger.error(f"Error finalizing viagem: {e}")
             return False
@@ -0,0 +1,54 @@
+"""
+Fixtures compartilhadas dos testes automatizados (pytest)
+
+Os testes usam um app Flask mínimo com SQLite em memória, sem depender de
+PostgreSQL, Redis ou Google Sheets.
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ['FLASK_ENV'] = 'testing'
+
+from models import db, Usuario  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """App Flask com banco SQLite em memória e tabelas criadas"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def cliente():
+    """Cliente de testes do app.py (TestingConfig) logado como admin"""
+    from app import app as flask_app
+
+    with flask_app.app_context():
+        db.create_all()
+        admin = Usuario(id='ADMIN', nome='Admin', email='admin@globo.com', role='admin', ativo=True)
+        admin.set_senha('senha123')
+        db.session.add(admin)
+        db.session.commit()
+
+    client = flask_app.test_client()
+    client.post('/login', data={'username': 'admin@globo.com', 'password': 'senha123'})
+    with flask_app.app_context():
+        yield client
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,123 @@
+"""
+🧪 Planilha Google Sheets falsa (em memória) para os testes do SheetsDB
+
+Implementa as chamadas do gspread usadas pelo sistema: worksheet,
+add_worksheet e values_batch_update na planilha; get_all_values,
+get_all_records, get (intervalo A1, leitura em blocos da migração),
+row_values e append_row nas abas. Cada chamada conta como uma
+requisição à API em `requisicoes`, como (aba, operação).
+"""
+
+import copy
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+
+
+def _numerico(valor):
+    """Conversão de get_all_records: '10' -> 10, '1.5' -> 1.5"""
+    for tipo in (int, float):
+        try:
+            return tipo(valor)
+        except (TypeError, ValueError):
+            pass
+    return valor
+
+
+class FakeWorksheet:
+    def __init__(self, planilha, title, linhas=None):
+        self.planilha = planilha
+        self.title = title
+        self.linhas = [[str(v) for v in linha] for linha in (linhas or [])]
+
+    def _registrar(self, operacao):
+        self.planilha.registrar(self.title, operacao)
+
+    def _gravar(self, linha, coluna, valor):
+        while len(self.linhas) < linha:
+            self.linhas.append([])
+        celulas = self.linhas[linha - 1]
+        while len(celulas) < coluna:
+            celulas.append('')
+        celulas[coluna - 1] = '' if valor is None else str(valor)
+
+    # ---------- leitura ----------
+
+    def get_all_values(self):
+        self._registrar('get_all_values')
+        return copy.deepcopy(self.linhas)
+
+    def get_all_records(self):
+        self._registrar('get_all_records')
+        if not self.linhas:
+            return []
+        cabecalho = self.linhas[0]
+        return [
+            {nome: _numerico(linha[i]) if i < len(linha) else '' for i, nome in enumerate(cabecalho)}
+            for linha in self.linhas[1:]
+        ]
+
+    def row_values(self, linha):
+        self._registrar('row_values')
+        return list(self.linhas[linha - 1]) if linha <= len(self.linhas) else []
+
+    def get(self, intervalo):
+        """Valores do intervalo A1, sem linhas e células vazias no final (como a API)"""
+        self._registrar('get')
+        inicio, _, fim = intervalo.partition(':')
+        linha_ini, coluna_ini = a1_to_rowcol(inicio)
+        linha_fim, coluna_fim = a1_to_rowcol(fim or inicio)
+        valores = []
+        for linha in self.linhas[linha_ini - 1:linha_fim]:
+            celulas = linha[coluna_ini - 1:coluna_fim]
+            while celulas and celulas[-1] == '':
+                celulas = celulas[:-1]
+            valores.append(list(celulas))
+        while valores and not valores[-1]:
+            valores.pop()
+        return valores
+
+    # ---------- escrita ----------
+
+    def append_row(self, valores):
+        self._registrar('append_row')
+        self.linhas.append(['' if v is None else str(v) for v in valores])
+
+    def _gravar_intervalo(self, a1, valores):
+        linha, coluna = a1_to_rowcol(a1.split(':')[0])
+        for i, linha_valores in enumerate(valores):
+            for j, valor in enumerate(linha_valores):
+                self._gravar(linha + i, coluna + j, valor)
+
+
+class FakeSpreadsheet:
+    """Substituto de gspread.Spreadsheet, com abas em memória"""
+
+    def __init__(self, abas=None):
+        self.requisicoes = []
+        self.abas = {titulo: FakeWorksheet(self, titulo, linhas) for titulo, linhas in (abas or {}).items()}
+
+    def registrar(self, aba, operacao):
+        self.requisicoes.append((aba, operacao))
+
+    def contar(self, aba=None, operacao=None):
+        return sum(1 for a, o in self.requisicoes
+                   if (aba is None or a == aba) and (operacao is None or o == operacao))
+
+    def worksheet(self, titulo):
+        self.registrar(titulo, 'worksheet')
+        if titulo not in self.abas:
+            raise WorksheetNotFound(titulo)
+        return self.abas[titulo]
+
+    def add_worksheet(self, title, rows=1000, cols=26):
+        self.registrar(title, 'add_worksheet')
+        self.abas[title] = FakeWorksheet(self, title)
+        return self.abas[title]
+
+    def values_batch_update(self, body):
+        self.registrar(None, 'values_batch_update')
+        for item in body['data']:
+            aba, _, a1 = item['range'].rpartition('!')
+            self.abas[aba.strip("'")]._gravar_intervalo(a1, item['values'])
+        return {'totalUpdatedCells': sum(len(v) for item in body['data'] for v in item['values'])}
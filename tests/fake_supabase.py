@@ -0,0 +1,282 @@
+"""
+🧪 Cliente Supabase falso (em memória) para os testes do SupabaseDB
+
+Implementa o subconjunto do query builder do supabase-py/PostgREST usado
+pelo sistema: select/insert/update/upsert/delete com filtros eq, neq,
+in_, gt, gte, lt, lte, is_, order, limit e range, e as funções RPC do
+schema.sql (registrar_saida_viagem, finalizar_viagem). Cada execute()
+conta como uma requisição HTTP em `requisicoes`.
+
+Como no PL/pgSQL, cada rpc() é uma transação: se algo falhar no meio,
+as tabelas voltam ao estado anterior. `travadas` simula falhas: updates
+nessas tabelas levantam erro.
+"""
+
+import copy
+import uuid
+from datetime import datetime, timezone
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, client, tabela):
+        self.client = client
+        self.tabela = tabela
+        self.operacao = 'select'
+        self.colunas = None
+        self.payload = None
+        self.on_conflict = None
+        self.ignorar_duplicadas = False
+        self.filtros = []
+        self.ordem = []
+        self.limite = None
+        self.inicio = 0
+        self.contar = None
+
+    # ---------- operações ----------
+
+    def select(self, colunas='*', count=None):
+        self.operacao = 'select'
+        self.colunas = None if colunas.strip() == '*' else [c.strip() for c in colunas.split(',')]
+        self.contar = count
+        return self
+
+    def insert(self, dados):
+        self.operacao, self.payload = 'insert', dados
+        return self
+
+    def upsert(self, dados, on_conflict='id', ignore_duplicates=False):
+        self.operacao, self.payload, self.on_conflict = 'upsert', dados, on_conflict
+        self.ignorar_duplicadas = ignore_duplicates
+        return self
+
+    def update(self, dados):
+        self.operacao, self.payload = 'update', dados
+        return self
+
+    def delete(self):
+        self.operacao = 'delete'
+        return self
+
+    # ---------- filtros ----------
+
+    def _filtro(self, coluna, teste):
+        self.filtros.append((coluna, teste))
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v == valor)
+
+    def neq(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v != valor)
+
+    def in_(self, coluna, valores):
+        valores = list(valores)
+        return self._filtro(coluna, lambda v: v in valores)
+
+    def gt(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v > valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v >= valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v < valor)
+
+    def lte(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v <= valor)
+
+    def is_(self, coluna, valor):
+        esperado = None if valor in (None, 'null') else valor
+        return self._filtro(coluna, lambda v: v is esperado or v == esperado)
+
+    def order(self, coluna, desc=False):
+        self.ordem.append((coluna, desc))
+        return self
+
+    def limit(self, quantidade):
+        self.limite = quantidade
+        return self
+
+    def range(self, inicio, fim):
+        self.inicio, self.limite = inicio, fim - inicio + 1
+        return self
+
+    # ---------- execução ----------
+
+    def _combina(self, linha):
+        return all(teste(linha.get(coluna)) for coluna, teste in self.filtros)
+
+    def _projetar(self, linha):
+        if self.colunas is None:
+            return copy.deepcopy(linha)
+        return {coluna: copy.deepcopy(linha.get(coluna)) for coluna in self.colunas}
+
+    def _novo(self, dados):
+        linha = {'id': str(uuid.uuid4()), 'created_at': self.client.agora()}
+        linha.update(copy.deepcopy(dados))
+        return linha
+
+    def execute(self):
+        self.client.requisicoes.append((self.tabela, self.operacao))
+        if self.client.falhar:
+            raise RuntimeError('Supabase indisponível')
+        if self.operacao == 'update' and self.tabela in self.client.travadas:
+            raise RuntimeError(f'{self.tabela} travada (falha simulada)')
+        linhas = self.client.tabelas.setdefault(self.tabela, [])
+        lote = self.payload if isinstance(self.payload, list) else [self.payload]
+
+        if self.operacao == 'insert':
+            novas = [self._novo(dados) for dados in lote]
+            linhas.extend(novas)
+            return FakeResponse(copy.deepcopy(novas))
+
+        if self.operacao == 'upsert':
+            chaves = [c.strip() for c in self.on_conflict.split(',')]
+            gravadas = []
+            for dados in lote:
+                existente = next((l for l in linhas if all(l.get(c) == dados.get(c) for c in chaves)), None)
+                if existente is None:
+                    existente = self._novo(dados)
+                    linhas.append(existente)
+                elif self.ignorar_duplicadas:
+                    continue  # ON CONFLICT DO NOTHING: a linha não volta na resposta
+                else:
+                    existente.update(copy.deepcopy(dados))
+                gravadas.append(copy.deepcopy(existente))
+            return FakeResponse(gravadas)
+
+        selecionadas = [linha for linha in linhas if self._combina(linha)]
+
+        if self.operacao == 'update':
+            for linha in selecionadas:
+                linha.update(copy.deepcopy(self.payload))
+            return FakeResponse(copy.deepcopy(selecionadas))
+
+        if self.operacao == 'delete':
+            self.client.tabelas[self.tabela] = [l for l in linhas if not self._combina(l)]
+            return FakeResponse(copy.deepcopy(selecionadas))
+
+        for coluna, desc in reversed(self.ordem):
+            selecionadas.sort(key=lambda l: (l.get(coluna) is None, l.get(coluna)), reverse=desc)
+        total = len(selecionadas)
+        fim = None if self.limite is None else self.inicio + self.limite
+        selecionadas = selecionadas[self.inicio:fim]
+        return FakeResponse([self._projetar(l) for l in selecionadas], count=total if self.contar else None)
+
+
+class FakeRPC:
+    def __init__(self, client, funcao, parametros):
+        self.client = client
+        self.funcao = funcao
+        self.parametros = parametros or {}
+
+    def execute(self):
+        self.client.requisicoes.append((self.funcao, 'rpc'))
+        if self.client.falhar:
+            raise RuntimeError('Supabase indisponível')
+        if self.funcao not in FUNCOES_RPC:
+            raise ValueError(f'Could not find the function {self.funcao}')
+        antes = copy.deepcopy(self.client.tabelas)
+        try:
+            return FakeResponse(FUNCOES_RPC[self.funcao](self.client, **self.parametros))
+        except Exception:
+            self.client.tabelas = antes  # rollback
+            raise
+
+
+class FakeSupabase:
+    """Substituto de supabase.Client com tabelas em memória"""
+
+    def __init__(self, tabelas=None):
+        self.tabelas = {nome: [dict(l) for l in linhas] for nome, linhas in (tabelas or {}).items()}
+        self.requisicoes = []
+        self.falhar = False
+        self.travadas = set()
+        self._relogio = 0
+
+    def agora(self):
+        # created_at estritamente crescente, para ordenações determinísticas
+        self._relogio += 1
+        return datetime.fromtimestamp(1_700_000_000 + self._relogio, timezone.utc).isoformat()
+
+    def table(self, nome):
+        return FakeQuery(self, nome)
+
+    def rpc(self, funcao, parametros=None):
+        return FakeRPC(self, funcao, parametros)
+
+    # ---------- apoio às funções RPC (sem contar requisições) ----------
+
+    def _linhas(self, tabela, **iguais):
+        return [l for l in self.tabelas.setdefault(tabela, [])
+                if all(l.get(c) == v for c, v in iguais.items())]
+
+    def _atualizar(self, tabela, linha, **valores):
+        if tabela in self.travadas:
+            raise RuntimeError(f'{tabela} travada (falha simulada)')
+        linha.update(valores)
+
+    def contar(self, tabela=None, operacao=None):
+        return sum(1 for t, o in self.requisicoes
+                   if (tabela is None or t == tabela) and (operacao is None or o == operacao))
+
+
+# ==================== FUNÇÕES RPC (espelham o schema.sql) ====================
+
+def _inteiro(valor):
+    return None if valor in (None, '') else int(float(valor))
+
+
+def registrar_saida_viagem(client, p_motorista_email, p_placa, p_data_saida, p_km_saida,
+                           p_destino=None, p_observacoes=None, p_agendamento_id=None):
+    """Saída: insere a viagem e marca veículo e agendamento como 'Em Uso'"""
+    veiculos = client._linhas('veiculos', placa=p_placa)
+    if not veiculos:
+        raise ValueError(f'Vehicle {p_placa} not found')
+    if client._linhas('viagens', placa=p_placa, status='Em Andamento'):
+        raise ValueError(f'Vehicle {p_placa} already has a trip in progress')
+
+    viagem = {'id': str(uuid.uuid4()), 'created_at': client.agora(), 'motorista_email': p_motorista_email,
+              'placa': p_placa, 'data_saida': p_data_saida, 'data_chegada': None,
+              'km_saida': _inteiro(p_km_saida), 'km_chegada': None, 'destino': p_destino,
+              'observacoes': p_observacoes, 'status': 'Em Andamento'}
+    client.tabelas.setdefault('viagens', []).append(viagem)
+    for veiculo in veiculos:
+        client._atualizar('veiculos', veiculo, status='Em Uso')
+    if p_agendamento_id:
+        for agendamento in client._linhas('agendamentos', id=p_agendamento_id):
+            client._atualizar('agendamentos', agendamento, status='Em Uso')
+    return [copy.deepcopy(viagem)]
+
+
+def finalizar_viagem(client, p_placa, p_km_chegada, p_observacoes=None, p_data_chegada=None):
+    """Chegada: fecha a viagem em aberto, libera o veículo e marca o agendamento 'Realizado'"""
+    abertas = sorted(client._linhas('viagens', placa=p_placa, status='Em Andamento'),
+                     key=lambda l: l['created_at'], reverse=True)
+    if not abertas:
+        return []
+    viagem = abertas[0]
+    client._atualizar('viagens', viagem, status='Finalizada', data_chegada=p_data_chegada or client.agora(),
+                      km_chegada=_inteiro(p_km_chegada),
+                      observacoes=p_observacoes or viagem.get('observacoes'))
+    for veiculo in client._linhas('veiculos', placa=p_placa):
+        client._atualizar('veiculos', veiculo, status='Disponível')
+
+    agendamentos = sorted((a for a in client._linhas('agendamentos', placa=p_placa)
+                           if a.get('status') in ('Em Uso', 'Confirmado')),
+                          key=lambda l: l['created_at'], reverse=True)
+    if agendamentos:
+        client._atualizar('agendamentos', agendamentos[0], status='Realizado')
+    return [copy.deepcopy(viagem)]
+
+
+FUNCOES_RPC = {
+    'registrar_saida_viagem': registrar_saida_viagem,
+    'finalizar_viagem': finalizar_viagem,
+}
@@ -0,0 +1,94 @@
+"""
+🧪 Testes das agregações de relatórios (agregacoes.py)
+"""
+
+from datetime import date, datetime, timedelta
+
+import agregacoes
+from agregacoes import Periodo
+from models import db, Usuario, Veiculo, Viagem
+from status import StatusViagem
+
+
+def _viagem(motorista_id, placa, saida, km, evento=None, finalizada=True):
+    return Viagem(motorista_id=motorista_id, placa=placa, data_saida=saida,
+                  data_chegada=saida + timedelta(hours=1) if finalizada else None,
+                  km_saida=100, km_chegada=100 + km if finalizada else None, producao_evento=evento,
+                  status=StatusViagem.FINALIZADA if finalizada else StatusViagem.EM_ANDAMENTO)
+
+
+def _popular():
+    for uid, nome in [('M1', 'Ana'), ('M2', 'Bruno')]:
+        usuario = Usuario(id=uid, nome=nome, email=f'{uid.lower()}@globo.com', role='motorista')
+        usuario.password_hash = 'x'
+        db.session.add(usuario)
+    db.session.add_all([Veiculo(placa='AAA0001', marca='Fiat', modelo='Uno'),
+                        Veiculo(placa='BBB0002', marca='Fiat', modelo='Uno')])
+    dia = datetime(2026, 10, 14, 9, 0)  # quarta-feira
+    db.session.add_all([
+        _viagem('M1', 'AAA0001', dia, 10, evento='Novela'),
+        _viagem('M1', 'AAA0001', dia + timedelta(hours=3), 5),
+        _viagem('M2', 'BBB0002', dia, 20, evento='Novela'),
+        _viagem('M2', 'BBB0002', dia + timedelta(days=2), 40),
+        _viagem('M2', 'BBB0002', dia + timedelta(days=10), 80),
+        _viagem('M1', 'AAA0001', dia, 0, finalizada=False),
+    ])
+    db.session.commit()
+
+
+def test_periodos():
+    quarta = date(2026, 10, 14)
+    assert Periodo.da_semana(quarta) == Periodo(date(2026, 10, 12), date(2026, 10, 18))
+    assert Periodo.do_mes(date(2026, 2, 10)) == Periodo(date(2026, 2, 1), date(2026, 2, 28))
+    assert agregacoes.resolver_periodo('intervalo', de=date(2026, 10, 5), ate=date(2026, 10, 1)) == \
+        Periodo(date(2026, 10, 1), date(2026, 10, 5))
+
+
+def test_agrega_no_banco_com_filtros(app):
+    _popular()
+    dia = agregacoes.calcular_relatorio_km(Periodo.do_dia(date(2026, 10, 14)))
+    assert dia == {'viagens_total': 3,
+                   'km_por_veiculo': {'AAA0001': 15.0, 'BBB0002': 20.0},
+                   'km_por_motorista': {'Ana': 15.0, 'Bruno': 20.0}}
+
+    semana = agregacoes.calcular_relatorio_km(Periodo.da_semana(date(2026, 10, 14)), placa='bbb0002')
+    assert semana['km_por_veiculo'] == {'BBB0002': 60.0}
+
+    mes = agregacoes.calcular_relatorio_km(Periodo.do_mes(date(2026, 10, 14)), motorista='bru')
+    assert mes['viagens_total'] == 3 and mes['km_por_motorista'] == {'Bruno': 140.0}
+
+    evento = agregacoes.calcular_relatorio_km(Periodo.do_mes(date(2026, 10, 14)), evento='novela')
+    assert evento['km_por_veiculo'] == {'AAA0001': 10.0, 'BBB0002': 20.0}
+
+
+def test_cache_invalidado_ao_finalizar_viagem(app):
+    from flask_caching import Cache
+    Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+    _popular()
+    periodo = Periodo.do_dia(date(2026, 10, 14))
+    assert agregacoes.relatorio_km(periodo)['viagens_total'] == 3
+
+    aberta = db.session.execute(db.select(Viagem).where(Viagem.data_chegada == None)).scalar_one()
+    aberta.data_chegada, aberta.km_chegada = aberta.data_saida + timedelta(hours=2), 130
+    db.session.commit()
+    assert agregacoes.relatorio_km(periodo)['viagens_total'] == 3  # ainda em cache
+
+    agregacoes.invalidar_relatorios()
+    resultado = agregacoes.relatorio_km(periodo)
+    assert resultado['viagens_total'] == 4 and resultado['km_por_veiculo']['AAA0001'] == 45.0
+
+
+def test_relatorio_sem_filtros_le_os_rollups(app):
+    import rollups
+
+    _popular()
+    rollups.backfill()
+    periodo = Periodo.do_mes(date(2026, 10, 14))
+    assert agregacoes.relatorio_dos_rollups(periodo) == agregacoes.calcular_relatorio_km(periodo)
+
+    app.config['RELATORIOS_ROLLUPS'] = True
+    db.session.execute(db.update(rollups.RollupDiario).where(rollups.RollupDiario.chave == 'AAA0001')
+                       .values(km=rollups.RollupDiario.km + 1000))
+    assert agregacoes.relatorio_km(periodo)['km_por_veiculo']['AAA0001'] == 1015.0
+    # Com filtro, as viagens continuam sendo agregadas
+    assert agregacoes.relatorio_km(periodo, placa='AAA0001')['km_por_veiculo'] == {'AAA0001': 15.0}
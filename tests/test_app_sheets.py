@@ -0,0 +1,93 @@
+"""
+🧪 Testes das rotas do app_sheets.py, com o cliente Supabase falso
+"""
+
+import re
+
+import pytest
+
+import supabase_db
+from fake_supabase import FakeSupabase
+
+
+@pytest.fixture
+def sheets(monkeypatch):
+    """app_sheets importado com o FakeSupabase no lugar do cliente real, logado como admin"""
+    cliente = FakeSupabase({
+        'usuarios': [
+            {'id': '6f1c0e0a-0000-4000-8000-000000000001', 'email': 'chefe@globo.com', 'nome': 'Chefe',
+             'role': 'admin', 'senha': 'segredo'},
+            {'id': '6f1c0e0a-0000-4000-8000-000000000002', 'email': 'ana@globo.com', 'nome': 'Ana',
+             'role': 'motorista', 'senha': '$2b$12$hash-da-ana'},
+        ],
+        'veiculos': [{'id': 'v1', 'placa': 'AAA0001', 'marca': 'Fiat', 'modelo': 'Uno', 'status': 'Disponível'}],
+    })
+    cliente.table('agendamentos').insert({'usuario_email': 'chefe@globo.com', 'placa': 'AAA0001',
+                                          'data_solicitada': '2026-10-20', 'hora_inicio': '08:00',
+                                          'hora_fim': '12:00', 'status': 'Confirmado'}).execute()
+    monkeypatch.setenv('SUPABASE_URL', 'http://supabase.local')
+    monkeypatch.setenv('SUPABASE_KEY', 'chave-de-testes')
+    monkeypatch.setenv('VERCEL', '1')  # logs no stdout, sem criar logs/
+    monkeypatch.setattr(supabase_db, 'create_client', lambda url, key: cliente)
+    # Importado uma vez só, como em produção: reimportar registraria os limites
+    # de /login e /register de novo no limiter global, e cada POST contaria em dobro
+    import app_sheets
+
+    monkeypatch.setattr(app_sheets, 'db', supabase_db.SupabaseDB())
+    app_sheets.usuarios_cache.limpar()
+    app_sheets.app.config['TESTING'] = True
+    client = app_sheets.app.test_client()
+    assert client.post('/login', data={'username': 'chefe@globo.com', 'password': 'segredo'}).status_code == 302
+    yield cliente, client
+    app_sheets.usuarios_cache.limpar()
+
+
+def test_saida_grava_o_email_do_motorista_escolhido(sheets):
+    cliente, client = sheets
+    pagina = client.get('/registrar-saida').get_data(as_text=True)
+    seletor = re.search(r'<select[^>]*name="motorista_id".*?</select>', pagina, re.S).group(0)
+    opcoes = re.findall(r'<option value="([^"]+)"', seletor)
+    assert opcoes == ['ana@globo.com']
+    assert 'hash-da-ana' not in pagina
+
+    agendamento = cliente.tabelas['agendamentos'][0]['id']
+    resposta = client.post('/registrar-saida', data={'agendamento_id': agendamento, 'motorista_id': opcoes[0],
+                                                      'km_inicial': '100'})
+    assert resposta.status_code == 302
+    viagem, = cliente.tabelas['viagens']
+    assert (viagem['motorista_email'], viagem['placa'], viagem['km_saida']) == ('ana@globo.com', 'AAA0001', 100)
+
+
+def test_cache_de_usuarios_nao_guarda_a_senha(sheets):
+    import app_sheets
+
+    cliente, client = sheets
+    assert client.get('/registrar-saida').status_code == 200
+    dados = app_sheets.usuarios_cache.obter('chefe@globo.com', lambda: pytest.fail('deveria estar no cache'))
+    assert dados == {'email': 'chefe@globo.com', 'nome': 'Chefe', 'role': 'admin'}
+
+
+def test_cadastro_limitado_por_email_e_pelo_ip_real_atras_do_proxy(sheets, monkeypatch):
+    import app_sheets
+    import limites
+
+    _, client = sheets
+    client.get('/logout')
+    # SupabaseDB ainda não grava leads: aqui só importam os limites antes da view
+    monkeypatch.setattr(app_sheets.db, 'create_lead', lambda dados: True, raising=False)
+    monkeypatch.setitem(app_sheets.app.config, 'REGISTRO_LIMITE_IP', '2 per hour')
+    monkeypatch.setitem(app_sheets.app.config, 'REGISTRO_LIMITE_CONTA', '2 per hour')
+    limites.limiter.reset()
+
+    def cadastrar(email, ip):
+        return client.post('/register', data={'nome': 'X', 'email': email, 'password': 'x'},
+                           headers={'X-Forwarded-For': ip}).status_code
+
+    # Na Vercel (PROXY_CONFIAVEIS=1) cada IP do X-Forwarded-For tem o seu limite
+    assert [cadastrar('a@x.com', '203.0.113.1'), cadastrar('b@x.com', '203.0.113.1')] == [302, 302]
+    assert cadastrar('c@x.com', '203.0.113.1') == 429
+    # O mesmo email, trocando de IP, também para
+    assert [cadastrar('d@x.com', '203.0.113.2'), cadastrar(' D@x.com', '203.0.113.3')] == [302, 302]
+    assert cadastrar('d@x.com', '203.0.113.4') == 429
+    assert limites.metricas()['recusas']['registro_conta'] >= 1
+    limites.limiter.reset()
@@ -0,0 +1,107 @@
+"""
+🧪 Testes da trilha de auditoria (auditoria.py)
+"""
+
+import json
+
+from flask import Flask
+from sqlalchemy import select
+
+from auditoria import EscritorAuditoria
+from models import db, Auditoria, Veiculo
+from status import StatusVeiculo
+
+
+def _trilha(entidade='Veiculo'):
+    db.session.remove()
+    return db.session.execute(
+        select(Auditoria).where(Auditoria.entidade == entidade).order_by(Auditoria.id)
+    ).scalars().all()
+
+
+def test_rotas_registram_antes_e_depois(cliente):
+    cliente.post('/veiculo/novo', data={'placa': 'abc1d23', 'marca': 'Fiat', 'modelo': 'Strada'},
+                 headers={'User-Agent': 'pytest'})
+    veiculo = db.session.execute(select(Veiculo)).scalar_one()
+    cliente.post(f'/veiculo/{veiculo.id}/editar', data={'modelo': 'Toro', 'status': StatusVeiculo.EM_MANUTENCAO.value})
+    cliente.post(f'/veiculo/{veiculo.id}/deletar')
+
+    criar, editar, excluir = _trilha()
+    assert [r.acao for r in (criar, editar, excluir)] == ['Criar Veiculo', 'Editar Veiculo', 'Excluir Veiculo']
+    assert {r.usuario_id for r in (criar, editar, excluir)} == {'ADMIN'}
+    assert {r.entidade_id for r in (criar, editar, excluir)} == {veiculo.id}
+    assert criar.user_agent == 'pytest' and criar.ip_address == '127.0.0.1'
+
+    detalhes = json.loads(criar.detalhes)
+    assert detalhes['antes'] is None and detalhes['depois']['placa'] == 'ABC1D23'
+
+    detalhes = json.loads(editar.detalhes)
+    assert detalhes['antes']['modelo'] == 'Strada' and detalhes['depois']['modelo'] == 'Toro'
+    assert detalhes['depois']['status'] == StatusVeiculo.EM_MANUTENCAO.value
+    assert 'marca' not in detalhes['depois']  # só o que mudou
+
+    detalhes = json.loads(excluir.detalhes)
+    assert detalhes['antes']['modelo'] == 'Toro' and detalhes['depois'] is None
+
+
+def test_rollback_nao_deixa_rastro(cliente):
+    db.session.add(Veiculo(placa='XYZ9A87'))
+    db.session.flush()
+    db.session.rollback()
+    db.session.add(Veiculo(placa='XYZ9A88'))
+    db.session.commit()
+
+    registros = _trilha()
+    assert len(registros) == 1
+    assert json.loads(registros[0].detalhes)['depois']['placa'] == 'XYZ9A88'
+    assert registros[0].usuario_id is None  # fora de requisição: ação do sistema
+
+
+def _escritor(tmp_path, **opcoes):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "auditoria.db"}')
+    db.init_app(app)
+    with app.app_context():
+        Auditoria.__table__.create(db.engine)
+        engine = db.engine
+    opcoes.setdefault('arquivo_pendentes', str(tmp_path / 'pendentes.jsonl'))
+    return engine, EscritorAuditoria(lambda: engine, Auditoria.__table__, **opcoes)
+
+
+def _registro(n):
+    from datetime import datetime
+    return {'timestamp': datetime(2026, 10, 18, 12, 0), 'usuario_id': None, 'acao': 'Editar Viagem',
+            'entidade': 'Viagem', 'entidade_id': n, 'detalhes': '{}', 'ip_address': None, 'user_agent': None}
+
+
+def _contar(engine):
+    with engine.connect() as conn:
+        return len(conn.execute(select(Auditoria.__table__.c.id)).all())
+
+
+def test_grava_em_lotes_e_esvazia_no_encerramento(tmp_path):
+    engine, escritor = _escritor(tmp_path, tamanho_lote=100, intervalo=0.05)
+    escritor.registrar([_registro(n) for n in range(250)])
+    escritor.esvaziar()
+    assert _contar(engine) == 250
+    metricas = escritor.metricas()
+    assert (metricas['enfileirados'], metricas['gravados'], metricas['fila']) == (250, 250, 0)
+    assert metricas['lotes'] <= 5  # INSERTs de várias linhas, não um por registro
+
+    escritor.intervalo = 60  # o lote só sairia por tamanho ou pelo encerramento
+    escritor.registrar([_registro(n) for n in range(3)])
+    escritor.encerrar()
+    assert _contar(engine) == 253
+
+
+def test_falha_vai_para_arquivo_e_e_reenviada(tmp_path):
+    engine, escritor = _escritor(tmp_path, modo='sincrono', tentativas=2)
+    escritor.obter_engine = lambda: (_ for _ in ()).throw(ConnectionError('banco fora do ar'))
+    escritor.registrar([_registro(1), _registro(2)])
+    assert _contar(engine) == 0
+    assert escritor.metricas()['pendentes_em_arquivo'] == 2
+
+    escritor.obter_engine = lambda: engine
+    assert escritor.reenviar_pendentes() == 2
+    assert _contar(engine) == 2
+    assert escritor.reenviar_pendentes() == 0
@@ -0,0 +1,88 @@
+"""
+🧪 Testes do cache de usuários do Flask-Login (cache_usuarios.py)
+"""
+
+from cachelib import SimpleCache
+from flask import g
+from sqlalchemy import event
+
+from cache_usuarios import CacheUsuarios
+from models import db, Usuario
+
+
+def test_lru_com_ttl_e_nivel_remoto(monkeypatch):
+    relogio = [100.0]
+    monkeypatch.setattr('cache_usuarios.time.monotonic', lambda: relogio[0])
+    cargas = []
+
+    def carregar(chave):
+        return lambda: cargas.append(chave) or {'id': chave}
+
+    remoto = SimpleCache()
+    cache = CacheUsuarios(max_itens=2, ttl=60, remoto=remoto)
+    assert cache.ttl_local == 5
+    for chave in ('a', 'b', 'a', 'c'):
+        cache.obter(chave, carregar(chave))
+    assert cargas == ['a', 'b', 'c'] and len(cache) == 2  # 'b' saiu do LRU
+
+    cache.obter('b', carregar('b'))  # ainda no nível remoto
+    relogio[0] += 10  # expira o nível local
+    cache.obter('a', carregar('a'))
+    assert cargas == ['a', 'b', 'c']
+
+    cache.invalidar('a')
+    cache.obter('a', carregar('a'))
+    assert cargas == ['a', 'b', 'c', 'a']
+    assert cache.obter('x', lambda: None) is None and 'x' not in cache._itens
+
+
+def _nova_requisicao():
+    """O fixture `cliente` mantém um app context aberto: limpa o que seria descartado"""
+    db.session.remove()
+    g.pop('_login_user', None)
+
+
+def _selects_de_usuario(cliente, rota='/'):
+    _nova_requisicao()
+    comandos = []
+
+    def contar(conn, cursor, statement, *args):
+        if 'FROM usuarios' in statement and 'WHERE usuarios.id' in statement:
+            comandos.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        assert cliente.get(rota).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+    return len(comandos)
+
+
+def test_load_user_usa_cache_e_editar_perfil_invalida(cliente):
+    _selects_de_usuario(cliente)
+    assert _selects_de_usuario(cliente) == 0
+
+    _nova_requisicao()
+    resposta = cliente.post('/perfil/editar', data={'nome': 'Administrador Novo', 'telefone': ''})
+    assert resposta.status_code == 302
+    from app import usuarios_cache
+    assert 'ADMIN' not in usuarios_cache._itens
+    # O principal da sessão foi regravado no commit: nem o cache nem o banco são consultados
+    assert _selects_de_usuario(cliente, '/perfil/editar') == 0
+    assert 'Administrador Novo' in cliente.get('/perfil/editar').get_data(as_text=True)
+
+
+def test_desativacao_invalida_o_cache(cliente):
+    from app import usuarios_cache
+    import cache_usuarios
+
+    _nova_requisicao()
+    cache_usuarios.carregar_usuario(usuarios_cache, 'ADMIN')
+    assert 'ADMIN' in usuarios_cache._itens
+    usuario = db.session.execute(db.select(Usuario).where(Usuario.email == 'admin@globo.com')).scalar_one()
+    usuario.ativo = False
+    db.session.commit()
+    assert 'ADMIN' not in usuarios_cache._itens
+
+    _nova_requisicao()
+    assert cache_usuarios.carregar_usuario(usuarios_cache, 'ADMIN').ativo is False
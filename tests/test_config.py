@@ -0,0 +1,54 @@
+"""
+🧪 Testes das opções de engine e da verificação de banco (config.py)
+"""
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
+
+import config
+
+PG = 'postgresql://frota:senha@db:5432/frota_globo'
+
+
+def test_pool_e_timeouts_para_postgres(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '8')
+    monkeypatch.setenv('DB_POOL_RECYCLE', '600')
+    opcoes = config.opcoes_engine(PG, pgbouncer=False, statement_timeout_ms=5000)
+
+    assert (opcoes['pool_size'], opcoes['max_overflow'], opcoes['pool_recycle']) == (8, 10, 600)
+    assert opcoes['pool_pre_ping'] is True
+    assert opcoes['connect_args']['options'] == '-c statement_timeout=5000'
+
+    # As opções são aceitas pelo create_engine (sem conectar)
+    engine = create_engine(PG, **opcoes)
+    assert engine.pool.size() == 8
+
+
+def test_modo_pgbouncer_sem_parametros_de_inicializacao():
+    opcoes = config.opcoes_engine(PG, pgbouncer=True, statement_timeout_ms=5000)
+    assert opcoes['poolclass'] is NullPool
+    assert 'pool_size' not in opcoes
+    assert 'options' not in opcoes['connect_args']  # PgBouncer recusa startup parameters
+    assert 'application_name' not in opcoes['connect_args']
+
+    psycopg3 = config.opcoes_engine('postgresql+psycopg://u:s@pgbouncer:6432/frota', pgbouncer=True)
+    assert psycopg3['connect_args']['prepare_threshold'] is None
+
+    engine = create_engine(PG, **opcoes)
+    ouvinte = config.registrar_timeout_por_transacao(engine, 5000)
+    assert event.contains(engine, 'begin', ouvinte)
+
+
+def test_sqlite_e_urls_do_heroku():
+    assert config.opcoes_engine('sqlite:///frota.db') == {}
+    assert config.normalizar_url('postgres://u:s@h/db') == 'postgresql://u:s@h/db'
+    assert config.normalizar_url(PG) == PG
+
+
+@pytest.mark.parametrize('url', [None, '', 'sqlite://', 'sqlite:///:memory:', 'sqlite:///file:x?mode=memory&uri=true'])
+def test_producao_nao_sobe_com_banco_em_memoria(url):
+    with pytest.raises(RuntimeError, match='DATABASE_URL'):
+        config.verificar_banco({'SQLALCHEMY_DATABASE_URI': url}, 'production')
+    config.verificar_banco({'SQLALCHEMY_DATABASE_URI': url}, 'testing')
+    config.verificar_banco({'SQLALCHEMY_DATABASE_URI': PG}, 'production')
@@ -0,0 +1,96 @@
+"""
+🧪 Testes da detecção de conflitos de agendamento (conflitos.py)
+"""
+
+import random
+from datetime import date, time
+
+import conflitos
+from conflitos import IntervalosDoDia, PedidoAgendamento
+from models import db, Agendamento
+from status import StatusAgendamento
+
+DIA = date(2026, 3, 10)
+
+
+def _agendar(placa, inicio, fim, status=StatusAgendamento.CONFIRMADO):
+    agendamento = Agendamento(usuario_id='U1', placa=placa, data_solicitada=DIA,
+                              hora_inicio=time(*inicio), hora_fim=time(*fim), status=status)
+    db.session.add(agendamento)
+    db.session.commit()
+    return agendamento
+
+
+def test_intervalos_adjacentes_nao_conflitam():
+    dia = IntervalosDoDia()
+    dia.adicionar(8 * 60, 12 * 60, 'manha')
+    assert dia.conflito(12 * 60, 16 * 60) is None
+    assert dia.conflito(6 * 60, 8 * 60) is None
+    assert dia.conflito(11 * 60, 13 * 60) == 'manha'
+    assert dia.conflito(9 * 60, 10 * 60) == 'manha'
+    assert dia.conflito(7 * 60, 13 * 60) == 'manha'
+
+
+def test_intervalos_equivale_a_busca_linear():
+    gerador = random.Random(7)
+    dia = IntervalosDoDia()
+    existentes = []
+    for i in range(200):
+        inicio = gerador.randrange(0, 1380)
+        fim = inicio + gerador.randrange(1, 60)
+        dia.adicionar(inicio, fim, i)
+        existentes.append((inicio, fim, i))
+
+    for _ in range(500):
+        inicio = gerador.randrange(0, 1400)
+        fim = inicio + gerador.randrange(1, 90)
+        esperado = {ref for a, b, ref in existentes if a < fim and inicio < b}
+        encontrado = dia.conflito(inicio, fim)
+        assert (encontrado is None) == (not esperado)
+        if encontrado is not None:
+            assert encontrado in esperado
+
+
+def test_verificar_conflito_ignora_cancelados_e_outros_veiculos(app):
+    _agendar('AAA1111', (8, 0), (12, 0), status=StatusAgendamento.CANCELADO)
+    _agendar('BBB2222', (8, 0), (12, 0))
+    assert conflitos.verificar_conflito('AAA1111', DIA, time(9, 0), time(10, 0)).valido
+
+    existente = _agendar('AAA1111', (9, 30), (11, 0))
+    resultado = conflitos.verificar_conflito('AAA1111', DIA, time(9, 0), time(10, 0))
+    assert resultado.conflito.id == existente.id
+
+
+def test_verificar_conflito_rejeita_horario_invertido(app):
+    resultado = conflitos.verificar_conflito('AAA1111', DIA, time(10, 0), time(9, 0))
+    assert not resultado.valido
+    assert resultado.erro
+
+
+def test_validar_lote_detecta_conflitos_internos_e_com_banco(app):
+    _agendar('AAA1111', (14, 0), (16, 0))
+    pedidos = [
+        PedidoAgendamento('AAA1111', DIA, time(8, 0), time(10, 0), referencia='p1'),
+        PedidoAgendamento('AAA1111', DIA, time(9, 0), time(11, 0), referencia='p2'),
+        PedidoAgendamento('AAA1111', DIA, time(15, 0), time(17, 0), referencia='p3'),
+        PedidoAgendamento('BBB2222', DIA, time(9, 0), time(11, 0), referencia='p4'),
+    ]
+
+    resultados = conflitos.validar_lote(pedidos)
+
+    assert [r.valido for r in resultados] == [True, False, False, True]
+    assert resultados[1].conflito is pedidos[0]
+    assert isinstance(resultados[2].conflito, Agendamento)
+
+
+def test_rota_de_lote_rejeita_corpo_que_nao_e_objeto_com_lista(cliente):
+    for corpo in ([{'placa': 'AAA1111'}], 'agendamentos', {'agendamentos': 'AAA1111'}, {'agendamentos': None}):
+        resposta = cliente.post('/agendamentos/validar-lote', json=corpo)
+        assert resposta.status_code == 400 and 'agendamentos' in resposta.get_json()['erro']
+
+    resposta = cliente.post('/agendamentos/validar-lote', json={'agendamentos': [
+        {'placa': 'AAA1111', 'data_solicitada': DIA.isoformat(), 'hora_inicio': '08:00', 'hora_fim': '10:00'},
+        'não é um objeto',
+    ]})
+    assert resposta.status_code == 200
+    assert [r['valido'] for r in resposta.get_json()['resultados']] == [True, False]
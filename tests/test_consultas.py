@@ -0,0 +1,111 @@
+"""
+🧪 Testes das consultas com carregamento antecipado (consultas.py)
+
+As rotas rodam com a guarda SQL_MAX_QUERIES_POR_REQUEST da TestingConfig:
+se um template voltar a carregar relacionamentos linha a linha, a
+requisição falha com AssertionError.
+"""
+
+from datetime import datetime, timedelta, date, time
+
+import pytest
+
+import consultas
+from models import db, Usuario, Veiculo, Agendamento, Viagem, TZ
+from status import StatusAgendamento, StatusViagem
+
+QUANTIDADE = 30
+
+
+@pytest.fixture
+def frota(cliente):
+    """Uma viagem finalizada, uma em andamento e um agendamento por motorista"""
+    agora = datetime.now(TZ)
+    for i in range(QUANTIDADE):
+        motorista = Usuario(id=f'MOT{i}', nome=f'Motorista {i}', email=f'mot{i}@globo.com', role='motorista')
+        motorista.password_hash = 'x'
+        placa = f'AAA{i:04d}'
+        db.session.add_all([
+            motorista,
+            Veiculo(placa=placa, marca='Fiat', modelo='Uno', status='disponível'),
+            Viagem(motorista_id=motorista.id, placa=placa, data_saida=agora - timedelta(hours=3),
+                   data_chegada=agora - timedelta(hours=1), km_saida=0, km_chegada=10,
+                   status=StatusViagem.FINALIZADA),
+            Viagem(motorista_id=motorista.id, placa=placa, data_saida=agora, km_saida=10,
+                   status=StatusViagem.EM_ANDAMENTO),
+            Agendamento(usuario_id=motorista.id, placa=placa, data_solicitada=date.today(),
+                        hora_inicio=time(8, 0), hora_fim=time(9, 0), status=StatusAgendamento.AGENDADO),
+        ])
+    db.session.commit()
+    db.session.expunge_all()
+    return cliente
+
+
+@pytest.mark.parametrize('rota', ['/historico', '/cronograma', '/agendamentos', '/', '/relatorios?periodo=mes',
+                                  '/registrar-saida'])
+def test_rotas_nao_fazem_n_mais_um(frota, rota):
+    resposta = frota.get(rota)
+    assert resposta.status_code == 200
+    if rota in ('/historico', '/cronograma', '/', '/registrar-saida'):
+        assert 'Motorista ' in resposta.get_data(as_text=True)
+
+
+def test_guarda_sql_falha_com_consultas_demais(app):
+    consultas.registrar_guarda_sql(app, 3)
+
+    @app.route('/consultas/<int:quantidade>')
+    def executar(quantidade):
+        for _ in range(quantidade):
+            db.session.execute(db.text('SELECT 1'))
+        return 'ok'
+
+    cliente = app.test_client()
+    assert cliente.get('/consultas/3').status_code == 200
+    with pytest.raises(AssertionError):
+        cliente.get('/consultas/4')
+
+
+def _finalizadas(quantidade, placa='BBB0001', motorista_id='MOTH'):
+    """Viagens finalizadas com chegadas espaçadas de uma hora"""
+    motorista = Usuario(id=motorista_id, nome='Motorista Histórico', email=f'{motorista_id.lower()}@globo.com',
+                        role='motorista')
+    motorista.password_hash = 'x'
+    base = datetime(2026, 10, 1, 8, 0)
+    db.session.add(motorista)
+    db.session.add_all(
+        Viagem(motorista_id=motorista_id, placa=placa, data_saida=base + timedelta(hours=i),
+               data_chegada=base + timedelta(hours=i, minutes=30), km_saida=0, km_chegada=10,
+               status=StatusViagem.FINALIZADA)
+        for i in range(quantidade)
+    )
+    db.session.commit()
+
+
+def test_historico_paginado_percorre_todas_as_viagens(app):
+    _finalizadas(45)
+    vistos, cursor = [], None
+    while True:
+        pagina, cursor = consultas.historico_paginado(cursor=cursor, per_page=20)
+        vistos.extend(v.id for v in pagina)
+        if not cursor:
+            break
+    assert len(vistos) == len(set(vistos)) == 45
+    chegadas = [db.session.get(Viagem, i).data_chegada for i in vistos]
+    assert chegadas == sorted(chegadas, reverse=True)
+
+
+def test_historico_paginado_filtra_no_banco(app):
+    _finalizadas(5, placa='BBB0001', motorista_id='MOTA')
+    _finalizadas(3, placa='CCC0002', motorista_id='MOTB')
+    pagina, cursor = consultas.historico_paginado(placa='ccc0002')
+    assert {v.placa for v in pagina} == {'CCC0002'} and cursor is None
+    pagina, _ = consultas.historico_paginado(motorista='mota@')
+    assert len(pagina) == 5
+    pagina, _ = consultas.historico_paginado(de=date(2026, 10, 2))
+    assert pagina == []
+
+
+def test_historico_ignora_cursor_invalido(frota):
+    assert consultas.decodificar_cursor('lixo') is None
+    resposta = frota.get('/historico?apos=lixo')
+    assert resposta.status_code == 200
@@ -0,0 +1,68 @@
+"""
+🧪 Testes do consumo de combustível por função de janela (consumo.py)
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+import consumo
+from models import db, Veiculo, Abastecimento
+
+
+def _abastecimentos(placa, kms, litros=40, inicio=datetime(2026, 10, 1, 8, 0)):
+    db.session.add(Veiculo(placa=placa, marca='Fiat', modelo='Uno'))
+    for i, km in enumerate(kms):
+        db.session.add(Abastecimento(placa=placa, data_abastecimento=inicio + timedelta(days=i),
+                                     litros=litros, valor_total=litros * 6, km_atual=km))
+    db.session.commit()
+
+
+def test_consumo_da_frota_em_uma_consulta(app):
+    _abastecimentos('AAA0001', [1000, 1400, 1800, 2200, 2600, 2700])
+    _abastecimentos('BBB0002', [500, 900])
+
+    comandos = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *a: comandos.append(a[2]))
+    itens = consumo.consumo_abastecimentos()
+    assert len(comandos) == 1
+
+    frota = {}
+    for item in itens:
+        frota.setdefault(item.placa, []).append(item)
+    assert [i.km_por_litro for i in frota['AAA0001']] == [None, 10, 10, 10, 10, 2.5]
+    assert [i.outlier for i in frota['AAA0001']] == [False] * 5 + [True]
+    assert 'abaixo' in frota['AAA0001'][-1].motivo
+    assert frota['BBB0002'][1].km_por_litro == 10 and frota['BBB0002'][1].media_movel is None
+
+
+def test_filtro_de_data_mantem_o_abastecimento_anterior(app):
+    _abastecimentos('AAA0001', [1000, 1400, 1300])
+    itens = consumo.consumo_abastecimentos(de=date(2026, 10, 2))
+    assert [i.km_por_litro for i in itens] == [10, -2.5]
+    assert itens[1].outlier and 'Hodômetro' in itens[1].motivo
+
+    resumo = consumo.resumo_por_veiculo()
+    assert resumo['AAA0001'] == {'abastecimentos': 3, 'outliers': 1, 'km_por_litro_medio': 10}
+
+
+def test_metodo_do_modelo_le_so_o_abastecimento_anterior(app):
+    _abastecimentos('AAA0001', [1000, 1300, 1500, 1900])
+    _abastecimentos('BBB0002', [100])
+    primeiro, segundo, terceiro, _ = db.session.execute(
+        db.select(Abastecimento).where(Abastecimento.placa == 'AAA0001').order_by(Abastecimento.id)).scalars()
+    assert primeiro.get_consumo_km_litro() is None
+
+    comandos = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *a: comandos.append(a[2]))
+    assert terceiro.get_consumo_km_litro() == 5
+    assert len(comandos) == 1 and 'LIMIT' in comandos[0] and 'OVER' not in comandos[0]
+    # Mesma ordem do LAG: empate na data é decidido pelo id
+    db.session.add(Abastecimento(placa='AAA0001', data_abastecimento=segundo.data_abastecimento,
+                                 litros=20, valor_total=120, km_atual=1400))
+    db.session.commit()
+    empate = db.session.execute(db.select(Abastecimento).order_by(Abastecimento.id.desc())).scalars().first()
+    assert empate.get_consumo_km_litro() == consumo.consumo_do_abastecimento(empate.id) == 5
+    janela = consumo.consumo_abastecimentos(placa='AAA0001')
+    assert [i.km_por_litro for i in janela] == [None, 7.5, 5, 2.5, 10]
+    assert [consumo.consumo_do_abastecimento(i.id) for i in janela] == [i.km_por_litro for i in janela]
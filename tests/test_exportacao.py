@@ -0,0 +1,104 @@
+"""
+🧪 Testes da exportação Parquet/Arrow (exportacao.py)
+"""
+
+from datetime import datetime
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.dataset as ds  # noqa: E402
+
+import exportacao  # noqa: E402
+from models import db, Veiculo, Viagem  # noqa: E402
+
+
+def _viagem(saida, chegada=None):
+    viagem = Viagem(motorista_id='ADMIN', placa='ABC1D23', data_saida=saida, km_saida=100,
+                    data_chegada=chegada, km_chegada=150 if chegada else None)
+    db.session.add(viagem)
+    db.session.commit()
+    return viagem
+
+
+@pytest.fixture
+def frota(cliente):
+    db.session.add(Veiculo(placa='ABC1D23'))
+    db.session.commit()
+    return cliente
+
+
+def _ler(pasta, formato='parquet'):
+    return ds.dataset(str(pasta / 'viagens'), format='ipc' if formato == 'arrow' else formato,
+                      partitioning='hive').to_table()
+
+
+@pytest.mark.parametrize('formato', exportacao.FORMATOS)
+def test_exportacao_incremental_por_id(frota, tmp_path, formato):
+    _viagem(datetime(2016, 8, 5, 8))
+    _viagem(datetime(2016, 8, 20, 8))
+    _viagem(datetime(2016, 9, 1, 8))
+
+    resumo = exportacao.exportar('viagens', str(tmp_path), formato=formato, lote=2)
+    assert resumo['linhas'] == 3 and len(resumo['arquivos']) == 2
+    tabela = _ler(tmp_path, formato)
+    assert sorted(zip(tabela['ano'].to_pylist(), tabela['mes'].to_pylist())) == [(2016, 8), (2016, 8), (2016, 9)]
+    assert tabela.schema.field('data_saida').type == pa.timestamp('us')
+    assert set(tabela['status'].to_pylist()) == {'Em Andamento'}
+
+    nova = _viagem(datetime(2016, 9, 2, 8))
+    resumo = exportacao.exportar('viagens', str(tmp_path), formato=formato)
+    assert (resumo['linhas'], resumo['marca']) == (1, nova.id)
+    assert exportacao.exportar('viagens', str(tmp_path), formato=formato)['arquivos'] == []
+    assert sorted(_ler(tmp_path, formato)['id'].to_pylist()) == [1, 2, 3, 4]
+
+    assert exportacao.exportar('viagens', str(tmp_path), formato=formato, completa=True)['linhas'] == 4
+
+
+def test_marca_por_data_chegada(frota, tmp_path):
+    em_rota = _viagem(datetime(2026, 10, 1, 8))
+    _viagem(datetime(2026, 10, 1, 9), datetime(2026, 10, 1, 12))
+
+    assert exportacao.exportar('viagens', str(tmp_path), marca='data_chegada')['linhas'] == 1
+
+    em_rota.data_chegada = datetime(2026, 10, 2, 18)
+    em_rota.km_chegada = 300
+    db.session.commit()
+    resumo = exportacao.exportar('viagens', str(tmp_path), marca='data_chegada')
+    assert resumo['linhas'] == 1
+    assert resumo['marca'] == {'data_chegada': '2026-10-02T18:00:00', 'id': em_rota.id}
+
+    with pytest.raises(ValueError):
+        exportacao.exportar('agendamentos', str(tmp_path), marca='data_chegada')
+
+
+def test_falha_nao_publica_arquivos_nem_avanca_marca(frota, tmp_path, monkeypatch):
+    for dia in range(1, 5):
+        _viagem(datetime(2026, 10, dia, 8))
+
+    lotes = exportacao.lotes
+
+    def lotes_com_falha(*args, **kwargs):
+        yield next(lotes(*args, **kwargs))  # o primeiro lote chega a ser gravado
+        raise ConnectionError('conexão perdida')
+
+    monkeypatch.setattr(exportacao, 'lotes', lotes_com_falha)
+    with pytest.raises(ConnectionError):
+        exportacao.exportar('viagens', str(tmp_path), lote=2)
+    assert not list((tmp_path / 'viagens').rglob('*.parquet'))
+    assert exportacao.ler_marcas(str(tmp_path)) == {}
+
+
+def test_rota_stream_arrow(frota):
+    _viagem(datetime(2026, 10, 1, 8))
+    segunda = _viagem(datetime(2026, 10, 2, 8))
+
+    resposta = frota.get('/exportar/viagens?desde=1')
+    assert resposta.status_code == 200 and resposta.mimetype == exportacao.MIMETYPE_ARROW
+    assert pa.ipc.open_stream(resposta.data).read_all()['id'].to_pylist() == [segunda.id]
+
+    vazia = pa.ipc.open_stream(frota.get('/exportar/agendamentos').data).read_all()
+    assert vazia.num_rows == 0 and 'data_solicitada' in vazia.schema.names
+
+    assert frota.get('/exportar/usuarios').status_code == 400
+    assert frota.get('/exportar/viagens?desde=abc').status_code == 400
@@ -0,0 +1,84 @@
+"""
+🧪 Testes dos limites de tentativas de login (limites.py)
+"""
+
+import pytest
+from flask import g
+from sqlalchemy import event
+
+import limites
+import senhas
+from models import db, Usuario
+
+
+@pytest.fixture
+def limitado(cliente, monkeypatch):
+    """Cliente deslogado, limites pequenos e contagem de bcrypts e SELECTs de usuário"""
+    from app import app as flask_app
+
+    monkeypatch.setitem(flask_app.config, 'LOGIN_LIMITE_IP', '6 per minute')
+    monkeypatch.setitem(flask_app.config, 'LOGIN_LIMITE_CONTA', '3 per minute')
+    limites.limiter.reset()
+    cliente.get('/logout')
+
+    chamadas = {'bcrypt': 0, 'select': 0}
+    verificar = senhas.servico.verificar
+
+    def contar_bcrypt(*args):
+        chamadas['bcrypt'] += 1
+        return verificar(*args)
+
+    def contar_select(conn, cursor, statement, *args):
+        if 'FROM usuarios' in statement:
+            chamadas['select'] += 1
+
+    monkeypatch.setattr(senhas.servico, 'verificar', contar_bcrypt)
+    event.listen(db.engine, 'before_cursor_execute', contar_select)
+    yield cliente, chamadas
+    event.remove(db.engine, 'before_cursor_execute', contar_select)
+    limites.limiter.reset()
+
+
+def _login(cliente, email, senha):
+    g.pop('_login_user', None)
+    return cliente.post('/login', data={'username': email, 'password': senha}).status_code
+
+
+def test_conta_travada_apos_falhas_sem_tocar_banco_nem_bcrypt(limitado):
+    cliente, chamadas = limitado
+    recusas = limites.metricas()['recusas'].get('login_conta', 0)
+
+    assert [_login(cliente, 'admin@globo.com', 'errada') for _ in range(3)] == [200, 200, 200]
+    assert chamadas == {'bcrypt': 3, 'select': 3}
+
+    # Quarta tentativa na mesma conta (com outra caixa): recusada antes da view
+    resposta = cliente.post('/login', data={'username': ' ADMIN@globo.com', 'password': 'senha123'})
+    assert resposta.status_code == 429
+    assert 0 < int(resposta.headers['Retry-After']) <= 60
+    assert chamadas == {'bcrypt': 3, 'select': 3}
+    assert limites.metricas()['recusas']['login_conta'] == recusas + 1
+
+    # Outra conta, do mesmo IP, segue normal
+    assert _login(cliente, 'outra@globo.com', 'x') == 200
+
+
+def test_limite_por_ip_conta_todas_as_tentativas(limitado):
+    cliente, chamadas = limitado
+    motorista = Usuario(id='MOT1', nome='Motorista', email='mot@globo.com', role='motorista', ativo=True)
+    motorista.set_senha('senha456')
+    db.session.add(motorista)
+    db.session.commit()
+
+    # Logins certos não contam para o limite da conta...
+    for _ in range(4):
+        assert _login(cliente, 'mot@globo.com', 'senha456') == 302
+        cliente.get('/logout')
+    # ...mas contam para o do IP
+    assert [_login(cliente, f'u{i}@globo.com', 'x') for i in range(3)] == [200, 200, 429]
+    assert limites.metricas()['recusas']['login_ip'] >= 1
+
+
+def test_recusas_aparecem_nas_metricas(cliente):
+    dados = cliente.get('/metricas').get_json()
+    assert set(dados) == {'senhas', 'limites', 'auditoria'}
+    assert 'total_recusas' in dados['limites']
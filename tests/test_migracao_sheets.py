@@ -0,0 +1,124 @@
+"""
+🧪 Testes do pipeline de migração Google Sheets → banco (migrations/migrate_from_sheets.py)
+"""
+
+import importlib.util
+import json
+import os
+from datetime import date
+
+import resumo_frota
+import rollups
+from fake_sheets import FakeSpreadsheet
+from models import db, Usuario, Veiculo, Agendamento, Viagem, ContadorFrota, RollupDiario
+from status import StatusAgendamento, StatusVeiculo
+
+_caminho = os.path.join(os.path.dirname(__file__), '..', 'migrations', 'migrate_from_sheets.py')
+_spec = importlib.util.spec_from_file_location('migrate_from_sheets', _caminho)
+migracao = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(migracao)
+
+N_VIAGENS = 230
+
+
+def _planilha():
+    return FakeSpreadsheet({
+        'Usuários': [
+            ['Email', 'Nome', 'Cargo', 'Telefone', 'Ativo', 'Senha'],
+            ['ana@globo.com', 'Ana', 'motorista', '2199', 'Sim', ''],
+            ['bia@globo.com', 'Bia', 'admin', '', 'Não', ''],
+            ['', 'Sem email', 'motorista', '', 'Sim', ''],
+            ['ana@globo.com', 'Ana repetida', 'motorista', '', 'Sim', ''],
+        ],
+        'Veículos': [
+            ['Placa', 'Marca', 'Modelo', 'Ano', 'Cor', 'KM Atual', 'Status'],
+            ['aaa0001', 'Fiat', 'Uno', '2020', 'Prata', '1.000,0', 'Disponível'],
+            ['BBB0002', 'VW', 'Gol', '', 'Preto', '500', 'Em Uso'],
+            ['CCC0003', 'VW', 'Gol', '2021', 'Preto', '0', 'Voando'],  # status inválido
+        ],
+        'Agendamentos': [
+            ['Email Solicitante', 'Placa', 'Data Solicitada', 'Hora Início', 'Hora Fim',
+             'Destinos', 'Passageiros', 'Observações', 'Produção', 'Status'],
+            ['ana@globo.com', 'AAA0001', '2026-10-20', '08:00', '12:00', 'Projac', '2', '', 'Não', 'Aprovado'],
+            ['ana@globo.com', 'BBB0002', '2026-10-21', '09:00', '10:00', 'Centro', '', '', 'Jornal', ''],
+            ['ninguem@globo.com', 'AAA0001', '2026-10-22', '09:00', '10:00', '', '', '', '', ''],
+        ],
+        'Viagens': [['Motorista', 'Placa', 'Data Saída', 'Data Chegada', 'KM Saída', 'KM Chegada', 'Status']] + [
+            ['ana@globo.com', 'AAA0001', f'2026-01-01T{8 + i // 60:02d}:{i % 60:02d}:00', '',
+             str(i * 10), str(i * 10 + 5), 'Finalizada']
+            for i in range(N_VIAGENS)
+        ] + [['fantasma@globo.com', 'AAA0001', '2026-02-01T08:00:00', '', '1', '', 'Finalizada']],
+    })
+
+
+def test_migracao_em_lotes_com_relatorio_e_reexecucao(app, tmp_path):
+    planilha = _planilha()
+    relatorio_json = tmp_path / 'migracao.json'
+    execucao = migracao.MigracaoGoogleSheets(planilha, tamanho_lote=50, tamanho_bloco=100,
+                                             relatorio=str(relatorio_json))
+    relatorio = execucao.migrar()
+
+    assert db.session.query(Usuario).count() == 2
+    assert db.session.query(Veiculo).count() == 2
+    assert db.session.query(Agendamento).count() == 2
+    assert db.session.query(Viagem).count() == N_VIAGENS
+
+    ana = db.session.query(Usuario).filter_by(email='ana@globo.com').one()
+    assert ana.verificar_senha('123456') and ana.id
+    assert db.session.query(Usuario).filter_by(email='bia@globo.com').one().ativo is False
+    uno = db.session.get(Veiculo, 1)
+    assert (uno.placa, uno.km_atual, uno.status) == ('AAA0001', 1000, StatusVeiculo.DISPONIVEL)
+    gol = db.session.query(Veiculo).filter_by(placa='BBB0002').one()
+    assert (gol.ano, gol.status) == (2020, StatusVeiculo.EM_VIAGEM)
+    jornal = db.session.query(Agendamento).filter_by(placa='BBB0002').one()
+    assert (jornal.producao_evento, jornal.status, jornal.passageiros) == ('Jornal', StatusAgendamento.AGENDADO, 1)
+
+    etapas = {etapa['nome']: etapa for etapa in json.loads(relatorio_json.read_text(encoding='utf-8'))['etapas']}
+    assert etapas == {etapa['nome']: etapa for etapa in relatorio['etapas']}
+    assert (etapas['usuarios']['inseridos'], etapas['usuarios']['erros'], etapas['usuarios']['pulados']) == (2, 1, 1)
+    assert etapas['veiculos']['erros'] == 1
+    assert etapas['agendamentos']['motivos'] == {'usuário não encontrado': 1}
+    assert etapas['viagens']['lidos'] == N_VIAGENS + 1
+    assert etapas['viagens']['motivos'] == {'motorista não encontrado': 1}
+    assert etapas['viagens']['linhas_por_segundo'] > 0
+    # Aba lida em blocos de 100 linhas, sem get_all_records
+    assert planilha.contar('Viagens', 'get') == 3
+    assert planilha.contar(operacao='get_all_records') == 0
+
+    # Segunda execução: tudo já existe, nada é inserido de novo
+    relatorio = migracao.MigracaoGoogleSheets(planilha, relatorio=None).migrar()
+    assert relatorio['total_inseridos'] == 0
+    assert db.session.query(Viagem).count() == N_VIAGENS
+    assert {e['nome']: e['motivos'].get('já existe', 0) for e in relatorio['etapas']} == \
+        {'usuarios': 3, 'veiculos': 2, 'agendamentos': 2, 'viagens': N_VIAGENS}
+
+
+def test_migracao_atualiza_contadores_e_rollups(app):
+    # Agregados materializados antes da carga (ex: por uma execução anterior)
+    dia = date(2026, 1, 1)
+    db.session.add_all([
+        ContadorFrota(chave=resumo_frota.CHAVE_VEICULOS_DISPONIVEIS, valor=0),
+        ContadorFrota(chave=resumo_frota.chave_viagens_dia(dia), valor=0),
+        RollupDiario(dimensao=rollups.VEICULO, chave='AAA0001', dia=dia, viagens=99, km=1),
+    ])
+    db.session.commit()
+
+    relatorio = migracao.MigracaoGoogleSheets(_planilha(), relatorio=None).migrar()
+
+    agregados = relatorio['agregados']
+    assert agregados['periodo_viagens'] == ['2026-01-01', '2026-01-01']
+    assert agregados['contadores']['veiculos_disponiveis'] == 1
+    assert db.session.get(ContadorFrota, resumo_frota.CHAVE_VEICULOS_DISPONIVEIS).valor == 1
+    # O contador do dia é recriado pela contagem na próxima leitura
+    assert db.session.get(ContadorFrota, resumo_frota.chave_viagens_dia(dia)) is None
+    assert resumo_frota.obter_resumo(dia)['viagens_hoje'] == N_VIAGENS
+    # Rollups do período recalculados (as viagens da planilha não têm chegada)
+    assert db.session.get(RollupDiario, (rollups.VEICULO, 'AAA0001', dia)) is None
+
+
+def test_lote_com_linha_ruim_e_inserido_linha_a_linha(app):
+    execucao = migracao.MigracaoGoogleSheets(FakeSpreadsheet(), relatorio=None)
+    metricas = migracao.MetricasEtapa('veiculos')
+    execucao._inserir_lote(Veiculo, [{'placa': 'AAA0001'}, {'placa': None}, {'placa': 'BBB0002'}], metricas)
+    assert (metricas.inseridos, metricas.erros) == (2, 1)
+    assert sorted(db.session.scalars(db.select(Veiculo.placa))) == ['AAA0001', 'BBB0002']
@@ -0,0 +1,120 @@
+"""
+🧪 Testes da migração Sheets → Supabase (lotes, checkpoints e dry-run), com clientes falsos
+"""
+
+import pytest
+
+from fake_sheets import FakeSpreadsheet
+from fake_supabase import FakeSupabase
+from migrate_to_supabase import MigrationEngine
+from sheets_db import SheetsDB
+
+N_VIAGENS = 7
+
+
+def _origem():
+    return SheetsDB(spreadsheet=FakeSpreadsheet({
+        'Usuários': [
+            ['Email', 'Nome', 'Cargo', 'Telefone', 'Ativo', 'Senha'],
+            ['ana@globo.com', 'Ana', 'motorista', '2199', 'Sim', '123456'],
+            ['bia@globo.com', 'Bia', 'admin', '', 'Sim', 'abc'],
+            ['sem.senha@globo.com', 'Sem senha', 'motorista', '', 'Sim', ''],
+            ['ana@globo.com', 'Ana Lima', 'motorista', '', 'Sim', '123456'],  # repetida
+        ],
+        'Veículos': [
+            ['Placa', 'Marca', 'Modelo', 'Ano', 'Cor', 'KM Atual', 'Status'],
+            ['AAA0001', 'Fiat', 'Uno', '2020', 'Prata', '1000', 'Disponível'],
+        ],
+        'Agendamentos': [
+            ['Usuario Email', 'Placa', 'Data Solicitada', 'Hora Inicio', 'Hora Fim', 'Status', 'Data Criação'],
+            ['ana@globo.com', 'AAA0001', '2026-10-20', '08:00', '12:00', 'Agendado', '2026-10-01T10:00:00'],
+        ],
+        'Viagens': [['Motorista Email', 'Placa', 'Data Saida', 'KM Saida', 'KM Chegada', 'Status']] + [
+            ['ana@globo.com', 'AAA0001', f'2026-10-0{i + 1}T08:00:00', str(i * 100), '', 'Finalizada']
+            for i in range(N_VIAGENS)
+        ],
+    }), ttl=0)
+
+
+class ClienteInstavel(FakeSupabase):
+    """Falha a partir da requisição número `limite`"""
+    limite = None
+
+    @property
+    def falhar(self):
+        return self.limite is not None and len(self.requisicoes) > self.limite
+
+    @falhar.setter
+    def falhar(self, valor):
+        pass
+
+
+def _engine(cliente, tmp_path, origem=None):
+    return MigrationEngine(origem or _origem(), cliente, batch_size=3,
+                           checkpoint_dir=str(tmp_path / 'checkpoints'), log=lambda *a: None)
+
+
+def test_upserts_em_lote_e_reexecucao_sem_duplicar(tmp_path):
+    cliente = FakeSupabase()
+    resultados = _engine(cliente, tmp_path).run()
+
+    assert {r['table']: (r['source'], r['skipped']) for r in resultados} == {
+        'usuarios': (2, 1), 'veiculos': (1, 0), 'agendamentos': (1, 0), 'viagens': (N_VIAGENS, 0)}
+    assert cliente.contar('viagens', 'upsert') == 3  # 7 linhas em lotes de 3
+    assert cliente.contar(operacao='insert') == 0
+    ana = next(u for u in cliente.tabelas['usuarios'] if u['email'] == 'ana@globo.com')
+    assert (ana['nome'], ana['senha']) == ('Ana Lima', '123456')  # texto, não número
+
+    # Com checkpoints completos nada é reenviado; com --restart, o upsert não duplica
+    cliente.requisicoes.clear()
+    _engine(cliente, tmp_path).run()
+    assert cliente.requisicoes == []
+    _engine(cliente, tmp_path).run(restart=True)
+    assert len(cliente.tabelas['viagens']) == N_VIAGENS
+    assert len(cliente.tabelas['agendamentos']) == 1
+
+
+def test_reexecucao_nao_sobrescreve_linhas_vivas_no_supabase(tmp_path):
+    # Depois da virada, a Ana trocou a senha e o Uno saiu em viagem pelo app
+    cliente = FakeSupabase({
+        'usuarios': [{'id': 'u1', 'email': 'ana@globo.com', 'nome': 'Ana Lima', 'senha': '$2b$12$nova'}],
+        'veiculos': [{'id': 'v1', 'placa': 'AAA0001', 'marca': 'Fiat', 'modelo': 'Uno', 'status': 'Em Uso'}],
+    })
+    _engine(cliente, tmp_path).run(restart=True)
+    ana = next(u for u in cliente.tabelas['usuarios'] if u['email'] == 'ana@globo.com')
+    assert ana['senha'] == '$2b$12$nova'
+    assert cliente.tabelas['veiculos'] == [{'id': 'v1', 'placa': 'AAA0001', 'marca': 'Fiat', 'modelo': 'Uno',
+                                            'status': 'Em Uso'}]
+    assert {u['email'] for u in cliente.tabelas['usuarios']} == {'ana@globo.com', 'bia@globo.com'}
+
+    # Só com --overwrite a planilha vence
+    MigrationEngine(_origem(), cliente, checkpoint_dir=str(tmp_path / 'checkpoints'), log=lambda *a: None,
+                    overwrite=True).run(restart=True)
+    assert cliente.tabelas['veiculos'][0]['status'] == 'Disponível'
+    assert next(u for u in cliente.tabelas['usuarios'] if u['email'] == 'ana@globo.com')['senha'] == '123456'
+
+
+def test_retoma_do_checkpoint_depois_de_uma_falha(tmp_path):
+    cliente = ClienteInstavel()
+    cliente.limite = 4  # usuarios, veiculos, agendamentos e o 1º lote de viagens
+    with pytest.raises(RuntimeError):
+        _engine(cliente, tmp_path).run()
+    assert len(cliente.tabelas['viagens']) == 3
+
+    cliente.limite = None
+    cliente.requisicoes.clear()
+    resultados = _engine(cliente, tmp_path).run()
+    assert cliente.requisicoes == [('viagens', 'upsert'), ('viagens', 'upsert')]
+    assert resultados[-1]['sent'] == N_VIAGENS - 3
+    assert len(cliente.tabelas['viagens']) == N_VIAGENS
+
+
+def test_dry_run_compara_contagens_sem_escrever(tmp_path):
+    cliente = FakeSupabase({'veiculos': [{'id': 'v1', 'placa': 'AAA0001'}]})
+    resultados = {r['table']: r for r in _engine(cliente, tmp_path).run(dry_run=True)}
+
+    assert (resultados['viagens']['source'], resultados['viagens']['target']) == (N_VIAGENS, 0)
+    assert resultados['veiculos']['difference'] == 0
+    assert resultados['usuarios']['difference'] == 2
+    assert cliente.contar(operacao='upsert') == 0
+    assert not (tmp_path / 'checkpoints').exists()
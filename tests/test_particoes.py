@@ -0,0 +1,41 @@
+"""
+🧪 Testes das partições mensais (particoes.py)
+
+As partições só existem no PostgreSQL; aqui ficam os cálculos de meses e
+nomes e a recusa em outros bancos.
+"""
+
+from datetime import date
+
+import pytest
+
+import particoes
+from models import db
+
+
+def test_meses_e_nomes():
+    assert particoes.somar_meses(date(2026, 11, 30), 2) == date(2027, 1, 1)
+    assert particoes.somar_meses(date(2026, 1, 15), -13) == date(2024, 12, 1)
+    assert particoes.nome_particao('viagens', date(2016, 8, 1)) == 'viagens_p2016_08'
+    assert particoes.mes_da_particao('viagens', 'viagens_p2016_08') == date(2016, 8, 1)
+    assert particoes.mes_da_particao('viagens', 'viagens_default') is None
+    assert particoes.mes_da_particao('viagens', 'auditoria_p2016_08') is None
+
+
+def test_particoes_vencidas():
+    nomes = ['auditoria_p2026_07', 'auditoria_default', 'auditoria_p2026_04',
+             'auditoria_p2026_05', 'auditoria_p2026_08']
+    hoje = date(2026, 10, 18)
+    # 4 meses de retenção: fica de junho em diante
+    assert particoes.particoes_vencidas('auditoria', nomes, 4, hoje) == ['auditoria_p2026_04', 'auditoria_p2026_05']
+    assert particoes.particoes_vencidas('auditoria', nomes, 0, hoje) == []
+    assert particoes.particoes_vencidas('viagens', nomes, 1, hoje) == []
+
+
+def test_recusa_fora_do_postgres(app, tmp_path):
+    with pytest.raises(RuntimeError, match='PostgreSQL'):
+        particoes.criar_particoes(db.engine, 'viagens')
+    with pytest.raises(RuntimeError, match='PostgreSQL'):
+        particoes.arquivar_particoes(db.engine, 'auditoria', 12, str(tmp_path))
+    with pytest.raises(ValueError):
+        particoes.criar_particoes(db.engine, 'usuarios')
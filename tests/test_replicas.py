@@ -0,0 +1,117 @@
+"""
+🧪 Testes do roteamento de leituras para a réplica, com dois arquivos SQLite
+"""
+
+import pytest
+from flask import Flask, jsonify
+
+import replicas
+from models import db, Veiculo
+from replicas import CHAVE_PRIMARIO_ATE, RoteadorReplica, somente_leitura
+from status import StatusVeiculo
+
+
+@pytest.fixture
+def roteado(tmp_path):
+    """App com primário e réplica em arquivos separados; a réplica tem um veículo a mais"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='teste',
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "primario.db"}',
+        DATABASE_REPLICA_URL=f'sqlite:///{tmp_path / "replica.db"}',
+    )
+    db.init_app(app)
+    atrasos = []
+    roteador = RoteadorReplica(app, db, medir=lambda engine: atrasos.pop(0) if atrasos else 0.0)
+    app.config['DB_REPLICA_INTERVALO_VERIFICACAO'] = 0
+
+    @app.route('/placas')
+    @somente_leitura
+    def placas():
+        return jsonify(sorted(v.placa for v in db.session.execute(db.select(Veiculo)).scalars()))
+
+    @app.route('/placas-com-escrita')
+    @somente_leitura
+    def placas_com_escrita():
+        db.session.add(Veiculo(placa='NOV0003', marca='Fiat', modelo='Mobi', status=StatusVeiculo.DISPONIVEL))
+        db.session.commit()
+        return jsonify(sorted(v.placa for v in db.session.execute(db.select(Veiculo)).scalars()))
+
+    @app.route('/veiculos', methods=['POST'])
+    def criar():
+        db.session.add(Veiculo(placa='NOV0002', marca='VW', modelo='Gol', status=StatusVeiculo.DISPONIVEL))
+        db.session.commit()
+        return '', 201
+
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(roteador.engine)
+        db.session.add(Veiculo(placa='AAA0001', marca='Fiat', modelo='Uno', status=StatusVeiculo.DISPONIVEL))
+        db.session.commit()
+        with roteador.engine.begin() as conn:
+            conn.execute(db.insert(Veiculo), [
+                {'placa': 'AAA0001', 'marca': 'Fiat', 'modelo': 'Uno', 'status': StatusVeiculo.DISPONIVEL},
+                {'placa': 'REP0001', 'marca': 'VW', 'modelo': 'Gol', 'status': StatusVeiculo.DISPONIVEL},
+            ])
+        replica = roteador.engine
+        yield app, roteador, atrasos
+        db.session.remove()
+        replica.dispose()
+
+
+def test_rota_somente_leitura_le_da_replica(roteado):
+    app, roteador, _ = roteado
+    cliente = app.test_client()
+    assert cliente.get('/placas').json == ['AAA0001', 'REP0001']
+
+    # Sem réplica configurada, tudo continua no primário
+    roteador.engine = None
+    assert cliente.get('/placas').json == ['AAA0001']
+
+
+def test_escrita_fixa_as_leituras_no_primario(roteado):
+    app, _, _ = roteado
+    cliente = app.test_client()
+    assert cliente.post('/veiculos').status_code == 201
+    # Logo após escrever, o mesmo navegador lê o que escreveu
+    assert cliente.get('/placas').json == ['AAA0001', 'NOV0002']
+    # Outro navegador continua na réplica
+    assert app.test_client().get('/placas').json == ['AAA0001', 'REP0001']
+
+    with cliente.session_transaction() as sessao:
+        sessao[CHAVE_PRIMARIO_ATE] = 0  # janela expirada
+    assert cliente.get('/placas').json == ['AAA0001', 'REP0001']
+
+
+def test_escrita_dentro_da_rota_vai_ao_primario(roteado):
+    app, roteador, _ = roteado
+    # O INSERT vai ao primário e o resto da requisição também lê de lá
+    assert app.test_client().get('/placas-com-escrita').json == ['AAA0001', 'NOV0003']
+    with app.app_context():
+        with roteador.engine.connect() as conn:
+            assert conn.execute(db.select(db.func.count()).select_from(Veiculo)).scalar() == 2
+
+
+def test_atraso_ou_falha_da_replica_usam_o_primario(roteado, caplog):
+    app, roteador, atrasos = roteado
+    cliente = app.test_client()
+
+    atrasos.append(60.0)  # réplica um minuto atrasada
+    assert cliente.get('/placas').json == ['AAA0001']
+
+    def falhar(engine):
+        raise ConnectionError('réplica fora do ar')
+
+    roteador.medir = falhar
+    assert cliente.get('/placas').json == ['AAA0001']
+    assert 'Réplica de leitura indisponível' in caplog.text
+
+    roteador.medir = replicas.medir_atraso  # SQLite: sem atraso
+    assert cliente.get('/placas').json == ['AAA0001', 'REP0001']
+
+    # A medição fica em cache pelo intervalo de verificação
+    app.config['DB_REPLICA_INTERVALO_VERIFICACAO'] = 60
+    cliente.get('/placas')
+    roteador.medir = falhar
+    assert cliente.get('/placas').json == ['AAA0001', 'REP0001']
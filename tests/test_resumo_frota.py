@@ -0,0 +1,142 @@
+"""
+🧪 Testes dos contadores materializados do dashboard (resumo_frota.py)
+"""
+
+from datetime import datetime, timedelta
+
+import resumo_frota
+from models import db, Usuario, Veiculo, Viagem, ContadorFrota, RollupDiario, TZ
+from status import StatusVeiculo, StatusViagem
+
+
+def _criar_motorista():
+    motorista = Usuario(id='MOT1', nome='Motorista', email='mot@globo.com', role='motorista')
+    motorista.password_hash = 'x'
+    db.session.add(motorista)
+    db.session.commit()
+    return motorista
+
+
+def test_resumo_materializa_contadores_no_primeiro_acesso(app):
+    db.session.add_all([
+        Veiculo(placa='AAA1111', status='Disponível'),
+        Veiculo(placa='BBB2222', status='disponível'),
+        Veiculo(placa='CCC3333', status='Em Uso'),
+    ])
+    db.session.commit()
+
+    resumo = resumo_frota.obter_resumo()
+
+    assert resumo == {'veiculos_disponiveis': 2, 'viagens_em_rota': 0, 'viagens_hoje': 0}
+    assert db.session.get(ContadorFrota, resumo_frota.CHAVE_VEICULOS_DISPONIVEIS).valor == 2
+
+
+def test_saida_e_chegada_atualizam_contadores(app):
+    _criar_motorista()
+    veiculo = Veiculo(placa='AAA1111', status='disponível')
+    db.session.add(veiculo)
+    resumo_frota.alterar_status_veiculo(None, veiculo.status)
+    db.session.commit()
+    assert resumo_frota.obter_resumo()['veiculos_disponiveis'] == 1
+
+    viagem = Viagem(motorista_id='MOT1', placa='AAA1111', data_saida=datetime.now(TZ), km_saida=100,
+                    status='Em Andamento')
+    db.session.add(viagem)
+    resumo_frota.registrar_saida_viagem(viagem)
+    db.session.commit()
+
+    resumo = resumo_frota.obter_resumo()
+    assert resumo['viagens_em_rota'] == 1
+    assert resumo['viagens_hoje'] == 1
+
+    viagem.data_chegada = datetime.now(TZ)
+    viagem.status = 'Finalizada'
+    resumo_frota.registrar_chegada_viagem(viagem)
+    resumo_frota.alterar_status_veiculo('disponível', 'Manutenção')
+    veiculo.status = 'Manutenção'
+    db.session.commit()
+
+    resumo = resumo_frota.obter_resumo()
+    assert resumo['viagens_em_rota'] == 0
+    assert resumo['viagens_hoje'] == 1
+    assert resumo['veiculos_disponiveis'] == 0
+
+
+def test_recalcular_corrige_contadores_divergentes(app):
+    _criar_motorista()
+    ontem = datetime.now(TZ) - timedelta(days=1)
+    db.session.add(Viagem(motorista_id='MOT1', placa='AAA1111', data_saida=ontem, km_saida=0,
+                          status='Em Andamento'))
+    db.session.add(ContadorFrota(chave=resumo_frota.CHAVE_VIAGENS_EM_ROTA, valor=42))
+    db.session.commit()
+
+    resumo = resumo_frota.recalcular_resumo()
+
+    assert resumo['viagens_em_rota'] == 1
+    assert resumo['viagens_hoje'] == 0
+    assert resumo_frota.obter_resumo(ontem.date())['viagens_hoje'] == 1
+
+
+def test_contador_criado_por_outro_worker_nao_derruba_a_saida(app, monkeypatch):
+    _criar_motorista()
+    db.session.add(Veiculo(placa='AAA1111', status='Em Uso'))
+    db.session.commit()
+    resumo_frota.obter_resumo()  # contadores globais já existem; o do dia ainda não
+    chave_dia = resumo_frota.chave_viagens_dia(datetime.now(TZ).date())
+    db.session.execute(db.delete(ContadorFrota).where(ContadorFrota.chave == chave_dia))
+    db.session.commit()
+
+    contar = resumo_frota._contar
+
+    def contar_perdendo_a_corrida(chave):
+        # Outro worker grava o contador do dia entre o UPDATE (0 linhas) e o INSERT
+        db.session.execute(db.insert(ContadorFrota).values(chave=chave, valor=5))
+        return contar(chave)
+
+    monkeypatch.setattr(resumo_frota, '_contar', contar_perdendo_a_corrida)
+    viagem = Viagem(motorista_id='MOT1', placa='AAA1111', data_saida=datetime.now(TZ), km_saida=100,
+                    status='Em Andamento')
+    db.session.add(viagem)
+    resumo_frota.registrar_saida_viagem(viagem)
+    db.session.commit()
+
+    assert db.session.get(Viagem, viagem.id) is not None
+    assert db.session.get(ContadorFrota, chave_dia).valor == 6
+
+
+def _apagar_contador_de_disponiveis():
+    db.session.execute(db.delete(ContadorFrota).where(ContadorFrota.chave == resumo_frota.CHAVE_VEICULOS_DISPONIVEIS))
+
+
+def _disponiveis():
+    db.session.expire_all()
+    return db.session.get(ContadorFrota, resumo_frota.CHAVE_VEICULOS_DISPONIVEIS).valor
+
+
+def test_rotas_criam_o_contador_com_o_status_ja_aplicado(cliente):
+    _criar_motorista()
+    db.session.add_all([
+        Veiculo(placa='AAA1111', status=StatusVeiculo.EM_VIAGEM),
+        Veiculo(placa='BBB2222', status=StatusVeiculo.DISPONIVEL),
+        Viagem(motorista_id='MOT1', placa='AAA1111', data_saida=datetime.now(TZ), km_saida=100,
+               status=StatusViagem.EM_ANDAMENTO),
+    ])
+    db.session.commit()
+    # Só o contador de veículos disponíveis falta (os demais e os rollups do dia já existem)
+    resumo_frota.obter_resumo()
+    hoje = datetime.now(TZ).date()
+    db.session.add_all([RollupDiario(dimensao='veiculo', chave='AAA1111', dia=hoje),
+                        RollupDiario(dimensao='motorista', chave='MOT1', dia=hoje)])
+    _apagar_contador_de_disponiveis()
+    db.session.commit()
+
+    # Chegada sem contador: ele nasce contando o veículo que acabou de voltar
+    cliente.post('/registrar-chegada', data={'veiculo': 'AAA1111', 'km_final': '130'})
+    assert _disponiveis() == 2
+
+    # Remoção sem contador: ele nasce sem o veículo removido
+    _apagar_contador_de_disponiveis()
+    db.session.commit()
+    veiculo = db.session.execute(db.select(Veiculo).where(Veiculo.placa == 'BBB2222')).scalar_one()
+    cliente.post(f'/veiculo/{veiculo.id}/deletar')
+    assert _disponiveis() == 1
@@ -0,0 +1,104 @@
+"""
+🧪 Testes dos rollups diários (rollups.py)
+"""
+
+from datetime import date, datetime, timedelta
+
+import rollups
+from models import db, Usuario, Veiculo, Viagem, Abastecimento, Manutencao, RollupDiario, TZ
+from status import StatusViagem
+
+DIA = date(2026, 10, 14)
+
+
+def _base():
+    motorista = Usuario(id='M1', nome='Ana', email='m1@globo.com', role='motorista')
+    motorista.password_hash = 'x'
+    db.session.add_all([motorista, Veiculo(placa='AAA0001', marca='Fiat', modelo='Uno')])
+
+
+def _viagem(saida, km, horas, evento=None):
+    return Viagem(motorista_id='M1', placa='AAA0001', data_saida=saida,
+                  data_chegada=saida + timedelta(hours=horas), km_saida=100, km_chegada=100 + km,
+                  producao_evento=evento, status=StatusViagem.FINALIZADA)
+
+
+def _linha(dimensao, chave, dia=DIA):
+    return db.session.get(RollupDiario, (dimensao, chave, dia))
+
+
+def test_backfill_agrega_viagens_combustivel_e_manutencao(app):
+    _base()
+    saida = datetime(2026, 10, 14, 8, 0)
+    db.session.add_all([
+        _viagem(saida, 30, 2, evento='Jornal'),
+        _viagem(saida + timedelta(hours=4), 10, 1),
+        _viagem(saida + timedelta(days=1), 50, 3),
+        Abastecimento(placa='AAA0001', data_abastecimento=saida, litros=40, valor_total=240, km_atual=130),
+        Manutencao(placa='AAA0001', data_manutencao=DIA, tipo='Preventiva', descricao='Óleo', custo=350),
+    ])
+    db.session.commit()
+
+    assert rollups.backfill() == 5  # veículo e motorista em dois dias + evento
+    veiculo = _linha(rollups.VEICULO, 'AAA0001')
+    assert (veiculo.viagens, veiculo.km, veiculo.horas) == (2, 40, 3)
+    assert (veiculo.litros, veiculo.custo_combustivel, veiculo.custo_manutencao) == (40, 240, 350)
+    assert _linha(rollups.EVENTO, 'Jornal').km == 30
+    assert _linha(rollups.MOTORISTA, 'M1').custo_combustivel == 0
+
+    mes = rollups.totais(rollups.VEICULO, date(2026, 10, 1), date(2026, 10, 31))
+    assert mes['AAA0001']['viagens'] == 3 and mes['AAA0001']['km'] == 90
+
+
+def test_chegada_atualiza_rollups_incrementalmente(app):
+    _base()
+    saida = datetime(2026, 10, 14, 8, 0)
+    anterior = _viagem(saida, 20, 1)
+    aberta = Viagem(motorista_id='M1', placa='AAA0001', data_saida=saida + timedelta(hours=2), km_saida=120,
+                    status=StatusViagem.EM_ANDAMENTO)
+    db.session.add_all([anterior, aberta])
+    db.session.commit()
+
+    # Primeira chegada do dia para a chave: a linha nasce das tabelas de origem
+    db.session.delete(anterior)
+    db.session.commit()
+    rollups.backfill()
+    assert _linha(rollups.VEICULO, 'AAA0001') is None
+
+    aberta.data_chegada = (saida + timedelta(hours=3, minutes=30)).replace(tzinfo=TZ)
+    aberta.km_chegada = 135
+    rollups.registrar_viagem_finalizada(aberta)
+    db.session.commit()
+    assert (_linha(rollups.VEICULO, 'AAA0001').viagens, _linha(rollups.VEICULO, 'AAA0001').km) == (1, 15)
+
+    # Linha já existente: soma atômica
+    outra = _viagem(saida + timedelta(hours=5), 5, 0.5)
+    db.session.add(outra)
+    rollups.registrar_viagem_finalizada(outra)
+    db.session.commit()
+    linha = _linha(rollups.MOTORISTA, 'M1')
+    assert (linha.viagens, linha.km, linha.horas) == (2, 20, 2.0)
+
+
+def test_linha_criada_por_outro_worker_nao_derruba_a_chegada(app, monkeypatch):
+    _base()
+    saida = datetime(2026, 10, 14, 8, 0)
+    viagem = _viagem(saida, 25, 1)
+    db.session.add(viagem)
+
+    calcular = rollups._calcular
+
+    def calcular_perdendo_a_corrida(inicio, fim, dimensao, chave):
+        # Outro worker grava a linha do dia entre o UPDATE (0 linhas) e o INSERT
+        db.session.execute(db.insert(RollupDiario).values(dimensao=dimensao, chave=chave, dia=inicio,
+                                                          viagens=3, km=100, horas=4, litros=0,
+                                                          custo_combustivel=0, custo_manutencao=0))
+        return calcular(inicio, fim, dimensao, chave)
+
+    monkeypatch.setattr(rollups, '_calcular', calcular_perdendo_a_corrida)
+    rollups.registrar_viagem_finalizada(viagem)
+    db.session.commit()
+
+    assert db.session.get(Viagem, viagem.id) is not None
+    linha = _linha(rollups.VEICULO, 'AAA0001')
+    assert (linha.viagens, linha.km, linha.horas) == (4, 125, 5)
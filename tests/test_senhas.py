@@ -0,0 +1,88 @@
+"""
+🧪 Testes do serviço de hash de senhas (senhas.py)
+"""
+
+import threading
+
+import pytest
+from flask_bcrypt import Bcrypt
+
+import senhas
+from models import db, Usuario
+from senhas import FilaSenhasCheia, ServicoSenhas
+
+
+def test_rehash_quando_o_custo_muda():
+    antigo = ServicoSenhas(custo_bcrypt=4)
+    senha_hash = antigo.gerar_hash('segredo')
+    assert senha_hash.startswith('$2b$04$')
+    assert antigo.verificar(senha_hash, 'segredo') and not antigo.verificar(senha_hash, 'errada')
+    assert not antigo.precisa_rehash(senha_hash)
+
+    novo = ServicoSenhas(custo_bcrypt=5)
+    assert novo.verificar(senha_hash, 'segredo')  # hashes antigos continuam valendo
+    assert novo.precisa_rehash(senha_hash)
+
+    # Hashes do Flask-Bcrypt (o formato gravado até aqui) são compatíveis
+    legado = Bcrypt().generate_password_hash('segredo', rounds=4).decode('utf-8')
+    assert novo.verificar(legado, 'segredo')
+    assert not novo.verificar('', 'segredo') and not novo.verificar('texto-puro', 'segredo')
+
+    with pytest.raises(ValueError):
+        ServicoSenhas(algoritmo='md5')
+
+
+def test_login_regrava_hash_antigo(cliente, monkeypatch):
+    usuario = db.session.get(Usuario, 'ADMIN')
+    hash_antigo = usuario.password_hash
+    assert hash_antigo.startswith('$2b$04$')  # TestingConfig: custo 4
+
+    monkeypatch.setattr(senhas, 'servico', ServicoSenhas(custo_bcrypt=5))
+    cliente.get('/logout')
+    assert cliente.post('/login', data={'username': 'admin@globo.com', 'password': 'senha123'}).status_code == 302
+
+    db.session.remove()
+    hash_novo = db.session.get(Usuario, 'ADMIN').password_hash
+    assert hash_novo.startswith('$2b$05$')
+    assert senhas.servico.verificar(hash_novo, 'senha123')
+
+
+def test_fila_limitada_recusa_e_mede():
+    servico = ServicoSenhas(custo_bcrypt=4, threads=1, max_fila=1)
+    liberar = threading.Event()
+    ocupando = threading.Event()
+
+    def lento():
+        ocupando.set()
+        liberar.wait(5)
+        return True
+
+    em_execucao = threading.Thread(target=servico._executar, args=(lento,))
+    em_execucao.start()
+    ocupando.wait(5)
+    na_fila = threading.Thread(target=servico._executar, args=(lento,))
+    na_fila.start()
+    while servico.metricas()['fila'] < 1:
+        pass
+
+    assert servico.metricas()['em_execucao'] == 1
+    with pytest.raises(FilaSenhasCheia):
+        servico.gerar_hash('segredo')
+
+    liberar.set()
+    em_execucao.join(5)
+    na_fila.join(5)
+    metricas = servico.metricas()
+    assert (metricas['fila'], metricas['em_execucao'], metricas['concluidos'], metricas['recusados']) == (0, 0, 2, 1)
+    servico.encerrar()
+
+
+def test_login_com_fila_cheia_responde_503(cliente, monkeypatch):
+    def cheia(*args):
+        raise FilaSenhasCheia('64 hashes de senha na fila')
+
+    monkeypatch.setattr(senhas.servico, 'verificar', cheia)
+    cliente.get('/logout')
+    resposta = cliente.post('/login', data={'username': 'admin@globo.com', 'password': 'senha123'})
+    assert resposta.status_code == 503
+    assert resposta.headers['Retry-After'] == '5'
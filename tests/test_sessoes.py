@@ -0,0 +1,168 @@
+"""
+🧪 Testes das sessões no servidor e do principal do Flask-Login (sessoes.py)
+"""
+
+import pytest
+from cachelib import SimpleCache
+from flask import Flask, g, session
+from flask.sessions import SecureCookieSessionInterface
+from sqlalchemy import event
+
+import config
+import sessoes
+from models import db, Usuario
+from sessoes import CHAVE_PRINCIPAL, InterfaceSessaoServidor
+
+
+def _worker(armazenamento):
+    """App mínimo, como um worker do gunicorn, com as sessões no armazenamento dado"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'chave-compartilhada'
+    app.session_interface = InterfaceSessaoServidor(armazenamento)
+
+    @app.route('/gravar/<valor>')
+    def gravar(valor):
+        session['valor'] = valor
+        return 'ok'
+
+    @app.route('/ler')
+    def ler():
+        return session.get('valor', '-')
+
+    @app.route('/entrar')
+    def entrar():
+        session.renovar_sid()
+        return 'ok'
+
+    return app
+
+
+def test_sessao_fica_no_servidor_e_vale_em_qualquer_worker():
+    redis_falso = SimpleCache()
+    worker_a, worker_b = _worker(redis_falso), _worker(redis_falso)
+    cliente = worker_a.test_client()
+
+    cliente.get('/gravar/frota')
+    cookie = cliente.get_cookie('session')
+    assert 'frota' not in cookie.value  # o cookie só leva o id assinado
+
+    # Mesmo cookie, outro worker
+    cliente_b = worker_b.test_client()
+    cliente_b.set_cookie('session', cookie.value)
+    assert cliente_b.get('/ler').get_data(as_text=True) == 'frota'
+
+    # Leituras não regravam a sessão a cada requisição
+    assert cliente.get('/ler').headers.get('Set-Cookie') is None
+
+    # Cookie adulterado: sessão nova, vazia
+    cliente_b.set_cookie('session', cookie.value[:-2] + 'xx')
+    assert cliente_b.get('/ler').get_data(as_text=True) == '-'
+
+    # No login o id muda e o anterior deixa de valer
+    cliente.get('/entrar')
+    assert cliente.get_cookie('session').value != cookie.value
+    assert cliente.get('/ler').get_data(as_text=True) == 'frota'
+    cliente_b.set_cookie('session', cookie.value)
+    assert cliente_b.get('/ler').get_data(as_text=True) == '-'
+
+
+def _nova_requisicao():
+    """O fixture `cliente` mantém um app context aberto: limpa o que seria descartado"""
+    db.session.remove()
+    g.pop('_login_user', None)
+
+
+def test_principal_evita_consultas_e_expira(cliente):
+    from app import usuarios_cache
+
+    with cliente.session_transaction() as sessao:
+        assert sessao[CHAVE_PRINCIPAL]['dados']['email'] == 'admin@globo.com'
+
+    comandos = []
+
+    def contar(conn, cursor, statement, *args):
+        if 'FROM usuarios' in statement:
+            comandos.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        usuarios_cache.limpar()
+        _nova_requisicao()
+        assert cliente.get('/perfil/editar').status_code == 200
+        assert comandos == [] and len(usuarios_cache) == 0
+
+        # Principal vencido: recarregado (do banco, com o cache vazio) e regravado
+        with cliente.session_transaction() as sessao:
+            sessao[CHAVE_PRINCIPAL] = {**sessao[CHAVE_PRINCIPAL], 'em': 0}
+        _nova_requisicao()
+        assert cliente.get('/perfil/editar').status_code == 200
+        assert len(comandos) == 1
+        with cliente.session_transaction() as sessao:
+            assert sessao[CHAVE_PRINCIPAL]['em'] > 0
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+
+    # Usuário desativado perde o login quando o principal vence
+    db.session.get(Usuario, 'ADMIN').ativo = False
+    db.session.commit()
+    with cliente.session_transaction() as sessao:
+        sessao[CHAVE_PRINCIPAL] = {**sessao[CHAVE_PRINCIPAL], 'em': 0}
+    _nova_requisicao()
+    assert cliente.get('/perfil/editar').status_code == 302
+
+
+def test_secret_key_estavel_entre_workers(tmp_path):
+    workers = [Flask(__name__, instance_path=str(tmp_path / 'instance')) for _ in range(2)]
+    for app in workers:
+        app.config['SECRET_KEY'] = None
+        config.definir_secret_key(app, 'development')
+    assert workers[0].config['SECRET_KEY'] == workers[1].config['SECRET_KEY']
+    assert len(workers[0].config['SECRET_KEY']) == 64
+
+    producao = Flask(__name__, instance_path=str(tmp_path / 'prod'))
+    producao.config['SECRET_KEY'] = None
+    with pytest.raises(RuntimeError, match='SECRET_KEY'):
+        config.definir_secret_key(producao, 'production')
+
+    producao.config['SECRET_KEY'] = 'definida'
+    config.definir_secret_key(producao, 'production')
+    assert producao.config['SECRET_KEY'] == 'definida'
+
+
+def test_sessao_sem_redis_segue_sem_erro(caplog):
+    class RedisFora(SimpleCache):
+        def get(self, chave):
+            raise ConnectionError('redis fora do ar')
+
+        def set(self, chave, valor, timeout=None):
+            raise ConnectionError('redis fora do ar')
+
+    cliente = _worker(RedisFora()).test_client()
+    assert cliente.get('/gravar/x').status_code == 200
+    assert cliente.get('/ler').get_data(as_text=True) == '-'
+    assert 'Armazenamento de sessões indisponível' in caplog.text
+
+
+def test_sem_redis_producao_recusa_subir_e_outros_ambientes_usam_cookie(app):
+    with pytest.raises(RuntimeError, match='SESSION_REDIS_URL'):
+        sessoes.criar_interface(None, 'production')
+    assert isinstance(sessoes.criar_interface(None, 'testing').armazenamento, SimpleCache)
+    assert isinstance(sessoes.criar_interface(None, 'development').armazenamento, SimpleCache)
+
+    # Em homologação sem Redis, a sessão em cookie do Flask leva o principal
+    app.config['SECRET_KEY'] = 'chave-compartilhada'
+    app.session_interface = sessoes.criar_interface(None, 'staging')
+    assert isinstance(app.session_interface, SecureCookieSessionInterface)
+
+    @app.route('/entrar')
+    def entrar():
+        sessoes.entrar(Usuario(id='MOT1', nome='Motorista', role='motorista', email='m@globo.com', ativo=True))
+        return 'ok'
+
+    @app.route('/quem')
+    def quem():
+        return sessoes.carregar_principal(cache=None, user_id='MOT1').email
+
+    cliente = app.test_client()
+    cliente.get('/entrar')
+    assert cliente.get('/quem').get_data(as_text=True) == 'm@globo.com'
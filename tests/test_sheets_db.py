@@ -0,0 +1,122 @@
+"""
+🧪 Testes das escritas em lote do SheetsDB, com planilha falsa em memória
+"""
+
+from fake_sheets import FakeSpreadsheet
+from sheets_db import SheetsDB
+
+CABECALHO_VIAGENS = ['Motorista Email', 'Placa', 'Data Saida', 'Data Chegada', 'KM Saida',
+                     'KM Chegada', 'Destino', 'Observações', 'Status']
+CABECALHO_AGENDAMENTOS = ['Usuario Email', 'Placa', 'Data Solicitada', 'Hora Inicio', 'Hora Fim',
+                          'Destinos', 'Passageiros', 'Observações', 'Produção', 'Status', 'Data Criação']
+
+
+def _db():
+    planilha = FakeSpreadsheet({
+        'Usuários': [
+            ['Email', 'Nome', 'Cargo', 'Telefone', 'Ativo', 'Senha'],
+            ['ana@globo.com', 'Ana', 'motorista', '2199', 'Sim', '123456'],
+        ],
+        'Veículos': [
+            ['Placa', 'Marca', 'Modelo', 'Ano', 'Cor', 'KM Atual', 'Status', 'Observações'],
+            ['AAA0001', 'Fiat', 'Uno', '2020', 'Prata', '1000', 'Disponível', ''],
+            # Placa de AAA0001 citada em outra coluna: a busca não pode cair aqui
+            ['BBB0002', 'VW', 'Gol', '2021', 'Preto', '500', 'Disponível', 'Reserva do AAA0001'],
+        ],
+        'Agendamentos': [
+            CABECALHO_AGENDAMENTOS,
+            ['ana@globo.com', 'AAA0001', '2026-10-20', '08:00', '12:00', 'Projac', '2', '', 'Não', 'Confirmado', ''],
+        ],
+        'Viagens': [CABECALHO_VIAGENS],
+    })
+    return planilha, SheetsDB(spreadsheet=planilha)
+
+
+def _celula(planilha, aba, linha, coluna):
+    ws = planilha.abas[aba]
+    return ws.linhas[linha - 1][ws.linhas[0].index(coluna)]
+
+
+def test_saida_e_chegada_gravam_em_um_batch_update():
+    planilha, db = _db()
+    assert db.create_viagem({'motorista_email': 'ana@globo.com', 'placa': 'AAA0001',
+                             'data_saida': '2026-10-20T08:00:00', 'km_saida': 1000,
+                             'destino': 'Projac', 'agendamento_id': '1'})
+    assert planilha.contar(operacao='values_batch_update') == 1
+    assert _celula(planilha, 'Veículos', 2, 'Status') == 'Em Uso'
+    assert _celula(planilha, 'Veículos', 3, 'Status') == 'Disponível'
+    assert _celula(planilha, 'Agendamentos', 2, 'Status') == 'Em Uso'
+
+    planilha.requisicoes.clear()
+    assert db.finaliza_viagem('AAA0001', 1080, 'Sem ocorrências')
+    assert planilha.contar(operacao='values_batch_update') == 1
+    assert planilha.contar(operacao='update_cell') == 0
+    assert planilha.contar(operacao='row_values') == 0  # cabeçalhos em cache
+
+    assert _celula(planilha, 'Viagens', 2, 'Status') == 'Finalizada'
+    assert _celula(planilha, 'Viagens', 2, 'KM Chegada') == '1080'
+    assert _celula(planilha, 'Viagens', 2, 'Observações') == 'Sem ocorrências'
+    assert _celula(planilha, 'Viagens', 2, 'Data Chegada')
+    assert _celula(planilha, 'Veículos', 2, 'Status') == 'Disponível'
+    assert _celula(planilha, 'Agendamentos', 2, 'Status') == 'Realizado'
+
+    assert not db.finaliza_viagem('AAA0001', 1100)
+
+
+def test_atualizacoes_de_cadastro_usam_o_cabecalho():
+    planilha, db = _db()
+    # Colunas fora da ordem original: os índices vêm do cabeçalho, não de posições fixas
+    ws = planilha.abas['Veículos']
+    ws.linhas = [[linha[6], *linha[:6], linha[7]] for linha in ws.linhas]
+
+    assert db.update_veiculo('BBB0002', {'modelo': 'Polo', 'km_atual': 750, 'cor': 'Azul'})
+    assert planilha.contar(operacao='values_batch_update') == 1
+    assert (_celula(planilha, 'Veículos', 3, 'Modelo'), _celula(planilha, 'Veículos', 3, 'KM Atual'),
+            _celula(planilha, 'Veículos', 3, 'Cor')) == ('Polo', '750', 'Azul')
+    assert _celula(planilha, 'Veículos', 3, 'Status') == 'Disponível'
+
+    assert db.update_user('ana@globo.com', {'nome': 'Ana Lima', 'telefone': '2100'})
+    assert db.get_user_by_email('ana@globo.com')['Nome'] == 'Ana Lima'
+    assert planilha.contar(operacao='values_batch_update') == 2
+
+    assert not db.update_veiculo('ZZZ9999', {'modelo': 'X'})
+    assert not db.update_veiculo_status('ZZZ9999', 'Manutenção')
+    assert planilha.contar(operacao='values_batch_update') == 2
+
+
+def test_buscas_saem_do_instantaneo_indexado():
+    planilha, db = _db()
+    for _ in range(5):
+        assert db.get_user_by_email('ana@globo.com')['Nome'] == 'Ana'
+        assert db.get_veiculo_by_placa('BBB0002')['KM Atual'] == 500  # números convertidos
+        assert db.get_veiculo_by_placa('AAA0001')['Modelo'] == 'Uno'
+    assert db.get_user_by_email('ninguem@globo.com') is None
+    assert len(db.get_veiculos()) == 2
+
+    # Uma leitura e um handle por aba, reaproveitados entre as chamadas
+    assert planilha.contar('Usuários', 'get_all_values') == 1
+    assert planilha.contar('Veículos', 'get_all_values') == 1
+    assert planilha.contar(operacao='worksheet') == 2
+    assert planilha.contar(operacao='get_all_records') == 0
+
+
+def test_escritas_invalidam_e_o_ttl_expira():
+    planilha, db = _db()
+    assert db.get_user_by_email('bia@globo.com') is None
+    assert db.create_user({'email': 'bia@globo.com', 'nome': 'Bia'})
+    assert db.get_user_by_email('bia@globo.com')['Nome'] == 'Bia'
+
+    assert db.update_veiculo_status('AAA0001', 'Manutenção')
+    assert db.get_veiculo_by_placa('AAA0001')['Status'] == 'Manutenção'
+
+    # Alteração feita por fora (outro worker, edição manual) aparece quando o instantâneo expira
+    planilha.abas['Veículos'].linhas[2][2] = 'Polo'
+    assert db.get_veiculo_by_placa('BBB0002')['Modelo'] == 'Gol'
+    db._instantaneos['Veículos'].expira_em = 0
+    assert db.get_veiculo_by_placa('BBB0002')['Modelo'] == 'Polo'
+
+    sem_cache = SheetsDB(spreadsheet=planilha, ttl=0)
+    planilha.requisicoes.clear()
+    sem_cache.get_users()
+    sem_cache.get_users()
+    assert planilha.contar('Usuários', 'get_all_values') == 2
@@ -0,0 +1,44 @@
+"""
+🧪 Testes dos status canônicos (status.py)
+"""
+
+import pytest
+
+from models import db, Veiculo, Agendamento
+from status import StatusVeiculo, StatusAgendamento, normalizar
+
+
+def test_normalizar_grafias_legadas():
+    assert normalizar(StatusVeiculo, 'Disponível') == StatusVeiculo.DISPONIVEL
+    assert normalizar(StatusVeiculo, ' disponível ') == StatusVeiculo.DISPONIVEL
+    assert normalizar(StatusVeiculo, 'Em Uso') == StatusVeiculo.EM_VIAGEM
+    assert normalizar(StatusAgendamento, 'Aprovado') == StatusAgendamento.CONFIRMADO
+    assert normalizar(StatusAgendamento, 'Realizado') == StatusAgendamento.FINALIZADO
+    assert normalizar(StatusAgendamento, None) is None
+
+
+def test_normalizar_rejeita_status_desconhecido():
+    with pytest.raises(ValueError):
+        normalizar(StatusVeiculo, 'voando')
+
+
+def test_coluna_grava_e_compara_valor_canonico(app):
+    db.session.add_all([Veiculo(placa='AAA1111', status='Disponível'), Veiculo(placa='BBB2222', status='Em Uso')])
+    db.session.commit()
+
+    gravados = db.session.execute(db.text('SELECT placa, status FROM veiculos ORDER BY placa')).all()
+    assert gravados == [('AAA1111', 'disponível'), ('BBB2222', 'em viagem')]
+
+    # Literais de comparação também são normalizados, sem lower() na coluna
+    placas = db.session.execute(
+        db.select(Veiculo.placa).where(Veiculo.status == 'Disponível')
+    ).scalars().all()
+    assert placas == ['AAA1111']
+
+    veiculo = db.session.execute(db.select(Veiculo).where(Veiculo.placa == 'AAA1111')).scalar_one()
+    assert veiculo.status == 'disponível'
+    assert str(veiculo.status) == 'disponível'
+
+
+def test_status_padrao_do_agendamento(app):
+    assert Agendamento.status.property.columns[0].default.arg == StatusAgendamento.AGENDADO
@@ -0,0 +1,190 @@
+"""
+🧪 Testes do cache de leitura do SupabaseDB, com cliente falso em memória
+"""
+
+import pytest
+from cachelib import SimpleCache
+
+from fake_supabase import FakeSupabase
+from supabase_db import SupabaseDB
+
+
+def _db(**kwargs):
+    cliente = FakeSupabase({
+        'usuarios': [{'id': 'u1', 'email': 'ana@globo.com', 'nome': 'Ana', 'role': 'motorista'}],
+        'veiculos': [{'id': 'v1', 'placa': 'AAA0001', 'status': 'Disponível'}],
+    })
+    return cliente, SupabaseDB(client=cliente, cache=SimpleCache(default_timeout=0), **kwargs)
+
+
+def test_leituras_repetidas_saem_do_cache():
+    cliente, db = _db()
+    for _ in range(3):
+        assert len(db.get_users(columns=['email', 'nome'])) == 1
+        assert db.get_veiculos()[0]['placa'] == 'AAA0001'
+        assert db.get_agendamentos() == []
+    assert cliente.contar('usuarios') == 1
+    assert cliente.contar('veiculos') == 1
+    assert cliente.contar('agendamentos') == 1
+
+
+def test_senha_nunca_fica_no_cache():
+    cliente, db = _db()
+    cliente.tabelas['usuarios'][0]['senha'] = 'antiga'
+    assert db.get_user_by_email('ana@globo.com')['senha'] == 'antiga'
+    db.get_users()
+    db.get_users(columns=['email', 'senha'])
+
+    # Senha trocada (ou usuário desativado) fora do app: o login já vê
+    cliente.tabelas['usuarios'][0].update(senha='nova', ativo=False)
+    assert db.get_user_by_email('ana@globo.com')['senha'] == 'nova'
+    assert db.get_users()[0]['ativo'] is False
+    assert cliente.contar('usuarios') == 5
+    assert not any('antiga' in repr(valor) for valor in db.cache._cache.values())
+
+
+def test_escritas_trocam_a_versao_da_tabela():
+    cliente, db = _db()
+    assert db.get_user_by_email('bia@globo.com') is None
+    db.get_veiculos()
+
+    assert db.create_user({'email': 'bia@globo.com', 'nome': 'Bia', 'role': 'motorista'})
+    assert db.get_user_by_email('bia@globo.com')['nome'] == 'Bia'
+
+    assert db.create_viagem({'motorista_email': 'ana@globo.com', 'placa': 'AAA0001', 'km_saida': 10})
+    assert db.get_veiculos()[0]['status'] == 'Em Uso'  # create_viagem também invalida veículos
+    assert db.get_viagens()[0]['Status'] == 'Em Andamento'
+
+    assert db.finaliza_viagem('AAA0001', 30)
+    assert db.get_viagens()[0]['Status'] == 'Finalizada'
+    assert db.get_veiculos()[0]['status'] == 'Disponível'
+
+    assert db.update_veiculo_status('AAA0001', 'Manutenção')
+    assert db.get_veiculos()[0]['status'] == 'Manutenção'
+
+
+def test_falhas_nao_sao_cacheadas_e_ttl_zero_desliga_o_cache():
+    cliente, db = _db(cache_ttls={'veiculos': 0})
+    cliente.falhar = True
+    assert db.get_users() == []
+    cliente.falhar = False
+    assert len(db.get_users()) == 1
+
+    db.get_veiculos()
+    db.get_veiculos()
+    assert cliente.contar('veiculos') == 2
+
+    _, sem_cache = _db()
+    sem_cache.cache = None
+    assert len(sem_cache.get_users()) == 1
+
+
+def test_filtros_e_colunas_vao_para_o_postgrest():
+    cliente, db = _db()
+    cliente.tabelas['usuarios'].append({'id': 'u2', 'email': 'chefe@globo.com', 'nome': 'Chefe',
+                                        'role': 'admin', 'senha': 'x'})
+    cliente.tabelas['viagens'] = [
+        {'id': f'v{i}', 'placa': f'AAA000{i}', 'motorista_email': 'ana@globo.com',
+         'data_saida': f'2026-10-1{i}T08:00:00', 'status': 'Em Andamento' if i % 2 else 'Finalizada',
+         'created_at': f'2026-10-1{i}T08:00:00'}
+        for i in range(5)
+    ]
+
+    motoristas = db.get_users(role='motorista', columns=['email', 'nome'])
+    assert motoristas == [{'email': 'ana@globo.com', 'nome': 'Ana'}]
+
+    em_andamento = db.get_viagens(status='Em Andamento', columns=['id', 'placa'])
+    assert em_andamento == [{'Placa': 'AAA0003', '_id': 'v3'}, {'Placa': 'AAA0001', '_id': 'v1'}]
+
+    periodo = db.get_viagens(data_saida__gte='2026-10-12', data_saida__lt='2026-10-14', columns=['id'])
+    assert [v['_id'] for v in periodo] == ['v3', 'v2']
+    assert [v['_id'] for v in db.get_viagens(limit=2)] == ['v4', 'v3']
+
+    assert db.get_veiculos(placa=[]) == []
+    assert cliente.contar('veiculos') == 0  # IN () não vai ao servidor
+
+    with pytest.raises(ValueError):
+        db.select('viagens', filters={'km_saida__entre': 1})  # operador desconhecido
+
+
+def test_agendamentos_enderecados_por_uuid_com_compatibilidade_numerica():
+    cliente, db = _db()
+    for hora in ('08:00', '09:00', '10:00'):
+        db.create_agendamento({'usuario_email': 'ana@globo.com', 'placa': 'AAA0001',
+                               'data_solicitada': '2026-10-20', 'hora_inicio': hora, 'hora_fim': hora})
+    recentes = db.get_agendamentos()
+    alvo = recentes[1]['_id']  # 09:00
+
+    cliente.requisicoes.clear()
+    assert db.update_agendamento_status(alvo, 'Confirmado')
+    assert cliente.requisicoes == [('agendamentos', 'update')]  # sem baixar a tabela
+
+    # Link antigo (posição 2 na lista) continua funcionando, com uma consulta de uma linha
+    cliente.requisicoes.clear()
+    assert db.cancelar_agendamento('2', motivo='Chuva')
+    assert cliente.requisicoes == [('agendamentos', 'select'), ('agendamentos', 'update')]
+    cancelado = db.get_agendamento(alvo)
+    assert (cancelado['Status'], cancelado['Motivo Cancelamento']) == ('Cancelado', 'Chuva')
+
+    assert db.get_agendamento('99') is None
+    assert not db.update_agendamento_status('0', 'Confirmado')
+
+
+def _db_rpc():
+    """SupabaseDB sobre o cliente falso, com um veículo e um agendamento confirmado"""
+    cliente = FakeSupabase({
+        'veiculos': [{'id': 'v1', 'placa': 'AAA0001', 'marca': 'Fiat', 'modelo': 'Uno', 'status': 'Disponível'}],
+    })
+    cliente.table('agendamentos').insert({'usuario_email': 'ana@globo.com', 'placa': 'AAA0001',
+                                          'data_solicitada': '2026-10-20', 'status': 'Confirmado'}).execute()
+    cliente.requisicoes.clear()
+    return cliente, SupabaseDB(client=cliente, cache=SimpleCache(default_timeout=0))
+
+
+def _saida(db, agendamento_id=None):
+    return db.create_viagem({'motorista_email': 'ana@globo.com', 'placa': 'AAA0001',
+                             'data_saida': '2026-10-20T08:00:00-03:00', 'km_saida': '10',
+                             'destino': 'Projac', 'agendamento_id': agendamento_id})
+
+
+def test_saida_e_chegada_em_uma_requisicao_cada():
+    cliente, db = _db_rpc()
+    agendamento = db.get_agendamentos()[0]['_id']
+    assert db.get_veiculos()[0]['status'] == 'Disponível'
+
+    cliente.requisicoes.clear()
+    assert _saida(db, agendamento)
+    assert cliente.requisicoes == [('registrar_saida_viagem', 'rpc')]
+    # create_viagem invalida viagens, veículos e agendamentos
+    assert db.get_veiculos()[0]['status'] == 'Em Uso'
+    assert db.get_agendamentos()[0]['Status'] == 'Em Uso'
+    viagem = db.get_viagens()[0]
+    assert (viagem['Status'], viagem['KM Saida']) == ('Em Andamento', 10)
+
+    assert not _saida(db)  # veículo já está em viagem
+
+    cliente.requisicoes.clear()
+    assert db.finaliza_viagem('AAA0001', '30', 'Sem ocorrências')
+    assert cliente.requisicoes == [('finalizar_viagem', 'rpc')]
+    viagem = db.get_viagens()[0]
+    assert (viagem['Status'], viagem['KM Chegada'], viagem['Observações']) == ('Finalizada', 30, 'Sem ocorrências')
+    assert viagem['Data Chegada']
+    assert db.get_veiculos()[0]['status'] == 'Disponível'
+    assert db.get_agendamentos()[0]['Status'] == 'Realizado'
+
+    assert not db.finaliza_viagem('AAA0001', 40)  # nenhuma viagem em andamento
+
+
+def test_falha_no_meio_da_chegada_nao_deixa_estado_parcial():
+    cliente, db = _db_rpc()
+    assert _saida(db, db.get_agendamentos()[0]['_id'])
+    cliente.travadas.add('agendamentos')
+
+    assert not db.finaliza_viagem('AAA0001', 30)
+    # A viagem e o veículo foram alterados antes da falha, e voltaram junto com o rollback
+    assert db.get_viagens()[0]['Status'] == 'Em Andamento'
+    assert db.get_veiculos()[0]['status'] == 'Em Uso'
+    assert db.get_agendamentos()[0]['Status'] == 'Em Uso'
+
+    assert not _saida(db)
+    assert len(db.get_viagens()) == 1